@@ -1,5 +1,6 @@
 from flask import Blueprint, request, jsonify
 from services.agent_service import agent_decision
+from services import tool_router
 
 agent_bp = Blueprint("agent", __name__)
 
@@ -22,3 +23,7 @@ def run_agent_route():
     response = run_agent(query, model=model, temperature=temperature)
 
     return jsonify({"response": response})
+
+@agent_bp.route("/agent/router", methods=["GET"])
+def agent_router_stats():
+    return jsonify(tool_router.stats())
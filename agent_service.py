@@ -1,7 +1,9 @@
 from tools.sales_prediction_tool import predict_sales
 from tools.rag_tool import rag_search
 from tools.image_tool import create_marketing_image
+from tools.churn_tool import churn_report
 from services.llm_service import ask_llm
+from services import tool_router
 
 def agent_decision(user_query):
 
@@ -11,6 +13,7 @@ def agent_decision(user_query):
     
     Available tools:
     - sales_prediction
+    - churn_prediction
     - rag_search
     - image_generation
     - general_chat
@@ -18,15 +21,19 @@ def agent_decision(user_query):
     Respond ONLY with tool name.
     """
 
-    tool = ask_llm(system_prompt + "\nUser: " + user_query)
-
-    tool = tool.strip().lower()
+    # The local router picks the tool when it is confident; otherwise the LLM
+    # does, with the instructions as the system prompt and temperature 0 so
+    # its answers are cached per query and reused for near-identical ones
+    tool = tool_router.decide(user_query, lambda query: ask_llm(query, system=system_prompt, temperature=0))
 
     if "sales_prediction" in tool:
         # Dummy features for now
         result = predict_sales([1000, 200, 1])
         return f"Predicted Sales: {result}"
 
+    elif "churn_prediction" in tool:
+        return churn_report()
+
     elif "rag_search" in tool:
         result = rag_search(user_query)
         return result
@@ -0,0 +1,290 @@
+import argparse
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+from services.forecasting_service import DEFAULT_SEASON_LENGTH, forecast, resolve_model
+
+# Series fitted together in one 2-D block; bounds the (series x grid x season) state
+BATCH_BLOCK_SIZE = int(os.getenv("BATCH_BLOCK_SIZE", "2000"))
+# Equal-length groups smaller than this go to the process pool with the ragged series
+MIN_GROUP_SIZE = 8
+# Series per pool task
+POOL_CHUNK_SIZE = 200
+# Pool size for the HTTP endpoint; the CLI defaults to every core
+FORECAST_WORKERS = int(os.getenv("FORECAST_WORKERS", "1"))
+
+# Smoothing parameters tried for every series in a block
+ALPHAS = [0.05, 0.1, 0.2, 0.3, 0.4, 0.5, 0.7, 0.9]
+BETAS = [0.01, 0.05, 0.1, 0.2, 0.4]
+GAMMAS = [0.01, 0.1, 0.3, 0.5]
+
+
+def _grid(kind):
+    """(alpha, beta, gamma) arrays, one entry per parameter combination."""
+    if kind == "ses":
+        alpha = np.array(ALPHAS)
+        return alpha, np.zeros_like(alpha), np.zeros_like(alpha)
+    if kind == "holt":
+        alpha, beta = np.meshgrid(ALPHAS, BETAS, indexing="ij")
+        return alpha.ravel(), beta.ravel(), np.zeros(alpha.size)
+    alpha, beta, gamma = np.meshgrid(ALPHAS, BETAS, GAMMAS, indexing="ij")
+    return alpha.ravel(), beta.ravel(), gamma.ravel()
+
+
+def smooth_block(kind, Y, periods, z, m=DEFAULT_SEASON_LENGTH):
+    """
+    Fit SES/Holt/Holt-Winters to every row of Y (series x time) at once.
+
+    The recursion runs once over time on (series x parameter grid) arrays,
+    the best grid point is picked per series by one-step squared error, and
+    its final state gives the forecast. Returns point, lower, upper arrays
+    (series x periods) and the chosen parameters.
+    """
+    S, n = Y.shape
+    alpha, beta, gamma = _grid(kind)
+    seasonal = kind == "holt_winters"
+
+    # Same starting state as the single-series fit
+    if kind == "ses":
+        level = Y[:, :1].copy()
+        trend = np.zeros((S, 1))
+    elif kind == "holt":
+        steps = min(n - 1, 4)
+        level = Y[:, :1].copy()
+        trend = (Y[:, steps:steps + 1] - Y[:, :1]) / steps
+    else:
+        first, second = Y[:, :m].mean(axis=1), Y[:, m:2 * m].mean(axis=1)
+        level = (first - (second - first) / 2)[:, None]
+        trend = ((second - first) / m)[:, None]
+    level = np.repeat(level, len(alpha), axis=1)
+    trend = np.repeat(trend, len(alpha), axis=1)
+    season = None
+    if seasonal:
+        # Seasonal term per phase, oldest first, for every grid point
+        season = np.repeat((Y[:, :m] - first[:, None])[:, None, :], len(alpha), axis=1)
+
+    trend_gain = alpha * beta
+    season_gain = (1 - alpha) * gamma
+    sse = np.zeros_like(level)
+    for t in range(n):
+        yhat = level + trend
+        if seasonal:
+            yhat += season[:, :, t % m]
+        e = Y[:, t:t + 1] - yhat
+        sse += e * e
+        level += trend + alpha * e
+        trend += trend_gain * e
+        if seasonal:
+            season[:, :, t % m] += season_gain * e
+
+    best = sse.argmin(axis=1)
+    rows = np.arange(S)
+    a, b, g = alpha[best], beta[best], gamma[best]
+    level, trend = level[rows, best], trend[rows, best]
+
+    steps = np.arange(1, periods + 1)
+    point = level[:, None] + trend[:, None] * steps
+    if seasonal:
+        point += season[rows, best][:, (n + steps - 1) % m]
+
+    # Interval widths: c_j = alpha (1 + beta j) + (1 - alpha) gamma [j % m == 0]
+    j = steps[:-1]
+    c = a[:, None] * (1 + b[:, None] * j)
+    if seasonal:
+        c += ((1 - a) * g)[:, None] * (j % m == 0)
+    variance_factor = 1 + np.concatenate([np.zeros((S, 1)), np.cumsum(c ** 2, axis=1)], axis=1)
+    n_params = {"ses": 1, "holt": 2, "holt_winters": 3}[kind]
+    sigma2 = sse[rows, best] / max(n - n_params, 1)
+    margin = z * np.sqrt(sigma2[:, None] * variance_factor)
+
+    params = {"alpha": a, "beta": b, "gamma": g}
+    return point, point - margin, point + margin, params
+
+
+def _forecast_series_chunk(chunk, periods, model, confidence_level, season_length):
+    """Pool task: forecast a list of (series_id, values) one at a time."""
+    results = []
+    for series_id, values in chunk:
+        try:
+            result = forecast(values, periods, model, confidence_level, season_length)
+            results.append((series_id, result["forecast"], result["lower"], result["upper"],
+                            result["model_used"], None))
+        except Exception as e:
+            results.append((series_id, None, None, None, None, str(e)))
+    return results
+
+
+def split_series(df, id_col="series_id", date_col="date", value_col="value"):
+    """Long-format frame -> (ids, list of value arrays, last dates), ordered by id then date."""
+    df = df.sort_values([id_col, date_col], kind="stable")
+    ids = df[id_col].to_numpy()
+    values = pd.to_numeric(df[value_col], errors="coerce").to_numpy(np.float64)
+    starts = np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]])
+    bounds = np.r_[starts, len(ids)]
+    series = [values[bounds[i]:bounds[i + 1]] for i in range(len(starts))]
+    last_dates = df[date_col].to_numpy()[bounds[1:] - 1]
+    return ids[starts], series, last_dates
+
+
+def forecast_batch(ids, series, periods=12, model="Holt", confidence_level=95,
+                   season_length=DEFAULT_SEASON_LENGTH, workers=None):
+    """
+    Forecast many series at once.
+
+    Smoothing models fit equal-length series together with smooth_block;
+    series of odd lengths, series with gaps and ARIMA/Prophet requests go
+    through a process pool running the single-series forecaster. Returns a
+    long-format DataFrame (series_id, step, forecast, lower, upper,
+    model_used, error) and a stats dict.
+    """
+    start = time.perf_counter()
+    kind = resolve_model(model)
+    if season_length < 1:
+        raise ValueError("season_length must be positive")
+    level = float(confidence_level)
+    level = level / 100 if level > 1 else level
+    z = NormalDist().inv_cdf(0.5 + level / 2)
+
+    frames = []
+    pooled = []
+    if kind in ("ses", "holt", "holt_winters"):
+        by_length = {}
+        for i, values in enumerate(series):
+            if len(values) >= 3 and np.isfinite(values).all():
+                by_length.setdefault(len(values), []).append(i)
+            else:
+                pooled.append(i)
+        for length, members in by_length.items():
+            group_kind = kind
+            if kind == "holt_winters" and length < 2 * season_length:
+                group_kind = "holt"
+            if len(members) < MIN_GROUP_SIZE:
+                pooled.extend(members)
+                continue
+            for block_start in range(0, len(members), BATCH_BLOCK_SIZE):
+                block = members[block_start:block_start + BATCH_BLOCK_SIZE]
+                Y = np.vstack([series[i] for i in block])
+                point, lower, upper, _ = smooth_block(group_kind, Y, periods, z, season_length)
+                frames.append(pd.DataFrame({
+                    "series_id": np.repeat(np.asarray(ids)[block], periods),
+                    "step": np.tile(np.arange(1, periods + 1), len(block)),
+                    "forecast": point.ravel(),
+                    "lower": lower.ravel(),
+                    "upper": upper.ravel(),
+                    "model_used": group_kind,
+                    "error": None,
+                }))
+    else:
+        pooled = list(range(len(series)))
+    vectorized = len(series) - len(pooled)
+
+    if pooled:
+        items = [(ids[i], series[i][np.isfinite(series[i])]) for i in pooled]
+        chunks = [items[k:k + POOL_CHUNK_SIZE] for k in range(0, len(items), POOL_CHUNK_SIZE)]
+        args = (periods, model, confidence_level, season_length)
+        workers = workers or os.cpu_count() or 1
+        if workers > 1 and len(chunks) > 1:
+            # spawn rather than fork: the Flask worker may already be running threads
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+                results = [r for chunk in pool.map(_forecast_series_chunk, chunks, *[[a] * len(chunks) for a in args])
+                           for r in chunk]
+        else:
+            results = [r for chunk in chunks for r in _forecast_series_chunk(chunk, *args)]
+
+        rows = []
+        for series_id, point, lower, upper, model_used, error in results:
+            if error is not None:
+                rows.append({"series_id": series_id, "step": 0, "forecast": np.nan, "lower": np.nan,
+                             "upper": np.nan, "model_used": None, "error": error})
+                continue
+            for h in range(periods):
+                rows.append({"series_id": series_id, "step": h + 1, "forecast": point[h], "lower": lower[h],
+                             "upper": upper[h], "model_used": model_used, "error": None})
+        frames.append(pd.DataFrame(rows))
+
+    result = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+    elapsed = time.perf_counter() - start
+    stats = {
+        "series": len(series),
+        "vectorized": vectorized,
+        "pooled": len(pooled),
+        "failed": int(result["error"].notna().sum()) if len(result) else 0,
+        "seconds": round(elapsed, 3),
+        "series_per_second": round(len(series) / elapsed, 1) if elapsed else None,
+    }
+    return result, stats
+
+
+def add_forecast_dates(result, ids, last_dates, freq):
+    """Add a date column: each series' last date moved on by `step` periods of freq."""
+    if freq is None:
+        return result
+    last = pd.Series(pd.to_datetime(last_dates), index=ids)
+    offset = pd.tseries.frequencies.to_offset(freq)
+    base = pd.DatetimeIndex(last.reindex(result["series_id"]).to_numpy())
+    steps = result["step"].to_numpy()
+    dates = np.full(len(result), np.datetime64("NaT"), dtype="datetime64[ns]")
+    for step in np.unique(steps[steps > 0]):
+        mask = steps == step
+        dates[mask] = (base[mask] + offset * int(step)).to_numpy()
+    result["date"] = dates
+    return result
+
+
+def _npz_column(column):
+    """Column as a NumPy array np.load can read without pickle: text becomes fixed-width str."""
+    if pd.api.types.is_object_dtype(column) or pd.api.types.is_string_dtype(column):
+        return column.astype(str).to_numpy(dtype=str)
+    return column.to_numpy()
+
+
+def write_results(result, output_path):
+    """
+    Parquet for .parquet (needs pyarrow), otherwise a NumPy .npz of columns,
+    read back with allow_pickle=False to check no column was saved as objects.
+    """
+    if output_path.endswith(".parquet"):
+        result.to_parquet(output_path, index=False)
+        return
+    np.savez(output_path, **{col: _npz_column(result[col]) for col in result.columns})
+    saved_path = output_path if output_path.endswith(".npz") else output_path + ".npz"
+    with np.load(saved_path, allow_pickle=False) as saved:
+        for col in result.columns:
+            if len(saved[col]) != len(result):
+                raise ValueError(f"Column {col} of {saved_path} has {len(saved[col])} rows, expected {len(result)}")
+
+
+def run(input_path, output_path, periods=12, model="Holt", confidence_level=95,
+        season_length=DEFAULT_SEASON_LENGTH, workers=None, sep=","):
+    df = pd.read_csv(input_path, sep=sep, parse_dates=["date"])
+    ids, series, last_dates = split_series(df)
+    first = df.loc[df["series_id"] == ids[0], "date"].sort_values() if len(ids) else None
+    freq = pd.infer_freq(first) if first is not None and len(first) >= 3 else None
+
+    result, stats = forecast_batch(ids, series, periods, model, confidence_level, season_length, workers)
+    result = add_forecast_dates(result, ids, last_dates, freq)
+    write_results(result, output_path)
+    stats["output_path"] = output_path
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Forecast every series in a long-format (series_id, date, value) CSV")
+    parser.add_argument("input")
+    parser.add_argument("output", help=".parquet (needs pyarrow) or .npz")
+    parser.add_argument("--periods", type=int, default=12)
+    parser.add_argument("--model", default="Holt")
+    parser.add_argument("--confidence", type=float, default=95)
+    parser.add_argument("--season-length", type=int, default=DEFAULT_SEASON_LENGTH)
+    parser.add_argument("--workers", type=int, default=None, help="Pool size for ragged series (default: all cores)")
+    parser.add_argument("--sep", default=",")
+    args = parser.parse_args()
+
+    print(run(args.input, args.output, args.periods, args.model, args.confidence,
+              args.season_length, args.workers, args.sep))
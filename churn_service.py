@@ -0,0 +1,110 @@
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from services.model_registry import registry
+from services.scoring_pool import score_rows
+from services.scoring_service import numeric_columns, prepare_frame, predict_frame, required_columns
+
+# Customers at or above this probability are reported as high churn risk
+CHURN_THRESHOLD = float(os.getenv("CHURN_THRESHOLD", "0.5"))
+
+# Customer file used when the agent asks about churn without naming one
+CHURN_CUSTOMERS_PATH = os.getenv(
+    "CHURN_CUSTOMERS_PATH", os.path.join(os.path.dirname(__file__), "..", "..", "data", "customers.csv")
+)
+
+BATCH_CHUNK_SIZE = 50000
+
+
+def score_customers(customers):
+    """
+    Score a list of customer dicts with the churn model.
+
+    Returns (predictions, errors, version) with the same shape as the lead
+    scorer, or raises RuntimeError when the churn model can't be loaded.
+    """
+    churn_model = registry.get("churn")
+    if churn_model is None:
+        raise RuntimeError(f"Churn model not loaded: {registry.errors.get('churn', 'unknown error')}")
+    predictions, errors = score_rows(churn_model, customers)
+    return predictions, errors, churn_model.version
+
+
+def _score_chunk(churn_model, chunk):
+    """Probabilities (NaN on failure) and {row: message} for one CSV chunk."""
+    if churn_model.compiled is not None:
+        columns = {col: chunk[col].tolist() for col in chunk.columns}
+        return churn_model.compiled.predict_columns(columns)
+
+    model = churn_model.model
+    df, errors = prepare_frame(chunk.to_dict("records"), required_columns(model), numeric_columns(model))
+    scored, failed = predict_frame(model, df)
+    errors.update(failed)
+    probabilities = np.full(len(chunk), np.nan)
+    for i, p in scored.items():
+        probabilities[i] = p
+    return probabilities, errors
+
+
+def score_customer_file(input_path, output_path=None, sep=",", id_col=None,
+                        chunk_size=BATCH_CHUNK_SIZE):
+    """
+    Score a whole customer CSV offline, chunk by chunk.
+
+    Writes customer id (id_col, or the row number), churn_probability and
+    error columns to output_path - Parquet for .parquet (needs pyarrow),
+    otherwise a NumPy .npz - and returns a summary dict.
+    """
+    churn_model = registry.get("churn")
+    if churn_model is None:
+        raise RuntimeError(f"Churn model not loaded: {registry.errors.get('churn', 'unknown error')}")
+
+    start = time.perf_counter()
+    ids, probabilities, errors = [], [], []
+    offset = 0
+    for chunk in pd.read_csv(input_path, sep=sep, dtype=object, chunksize=chunk_size):
+        chunk = chunk.reset_index(drop=True)
+        scores, failed = _score_chunk(churn_model, chunk)
+        ids.append(chunk[id_col].to_numpy(dtype=str) if id_col else np.arange(offset, offset + len(chunk)))
+        probabilities.append(np.asarray(scores, dtype=np.float64))
+        chunk_errors = np.full(len(chunk), "", dtype=object)
+        for i, message in failed.items():
+            chunk_errors[i] = message
+        errors.append(chunk_errors)
+        offset += len(chunk)
+
+    ids = np.concatenate(ids) if ids else np.array([])
+    probabilities = np.concatenate(probabilities) if probabilities else np.array([])
+    errors = np.concatenate(errors) if errors else np.array([], dtype=object)
+
+    if output_path:
+        columns = {id_col or "row": ids, "churn_probability": probabilities, "error": errors}
+        if output_path.endswith(".parquet"):
+            pd.DataFrame(columns).to_parquet(output_path, index=False)
+        else:
+            np.savez(output_path, **{k: v.astype(str) if v.dtype == object else v for k, v in columns.items()})
+
+    scored = probabilities[~np.isnan(probabilities)]
+    return {
+        "customers": int(len(probabilities)),
+        "scored": int(len(scored)),
+        "errors": int(len(probabilities) - len(scored)),
+        "high_risk": int((scored >= CHURN_THRESHOLD).sum()),
+        "average_probability": float(scored.mean()) if len(scored) else None,
+        "model_version": churn_model.version,
+        "output_path": output_path,
+        "seconds": round(time.perf_counter() - start, 3),
+    }
+
+
+if __name__ == "__main__":
+    # python -m services.churn_service customers.csv churn_scores.parquet [id_col]
+    if len(sys.argv) not in (3, 4):
+        print("Usage: python -m services.churn_service <customers.csv> <output.parquet|.npz> [id_col]")
+        sys.exit(1)
+    summary = score_customer_file(sys.argv[1], sys.argv[2], id_col=sys.argv[3] if len(sys.argv) == 4 else None)
+    print(summary)
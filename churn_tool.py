@@ -0,0 +1,30 @@
+from services.churn_service import CHURN_CUSTOMERS_PATH, score_customer_file, score_customers
+
+def predict_churn(customer):
+    """
+    customer: dict of customer features
+    """
+    predictions, errors, version = score_customers([customer])
+    if errors:
+        return f"Could not score customer: {errors[0]['error']}"
+    return f"Churn probability: {predictions[0]:.1%} (model {version})"
+
+def churn_report(path=None):
+    """
+    Score every customer in a CSV file and summarise churn risk.
+    Defaults to the shared customer file.
+    """
+    try:
+        summary = score_customer_file(path or CHURN_CUSTOMERS_PATH)
+    except Exception as e:
+        return f"Churn scoring unavailable: {e}"
+
+    if not summary["scored"]:
+        return "No customers could be scored for churn."
+
+    return (
+        f"Scored {summary['scored']:,} customers in {summary['seconds']}s: "
+        f"{summary['high_risk']:,} at high churn risk, "
+        f"average churn probability {summary['average_probability']:.1%} "
+        f"(model {summary['model_version']})"
+    )
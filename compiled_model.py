@@ -0,0 +1,283 @@
+import math
+import sys
+
+import numpy as np
+
+# A fitted Pipeline(ColumnTransformer(StandardScaler, OneHotEncoder), LogisticRegression)
+# is just a dot product once it has been trained. compile_pipeline() pulls the
+# fitted parameters out into plain NumPy arrays that can be saved with
+# save_artifact() and scored by CompiledModel without pandas or sklearn.
+
+
+def _is_missing(value):
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
+
+def _sigmoid(z):
+    """Logistic function that doesn't overflow for large |z| (as sklearn's expit)."""
+    if z >= 0:
+        return 1.0 / (1.0 + math.exp(-z))
+    e = math.exp(z)
+    return e / (1.0 + e)
+
+
+def compile_pipeline(pipeline):
+    """Extract scaler, encoder and coefficient arrays from a fitted lead pipeline."""
+    preprocessor = pipeline.named_steps["preprocessor"]
+    classifier = pipeline.named_steps["classifier"]
+
+    if classifier.coef_.shape[0] != 1:
+        raise ValueError("Only binary linear classifiers can be compiled")
+
+    numeric_cols, mean, scale = [], np.zeros(0), np.ones(0)
+    categorical_cols = []
+    category_feature, category_value, category_is_missing, category_column = [], [], [], []
+    unknown_column = []
+    n_category_columns = 0
+
+    for name, transformer, columns in preprocessor.transformers_:
+        if name == "num":
+            numeric_cols = [str(c) for c in columns]
+            n = len(numeric_cols)
+            mean = transformer.mean_ if transformer.mean_ is not None else np.zeros(n)
+            scale = transformer.scale_ if transformer.scale_ is not None else np.ones(n)
+        elif name == "cat":
+            if getattr(transformer, "drop_idx_", None) is not None:
+                raise ValueError("OneHotEncoder with drop is not supported")
+            categorical_cols = [str(c) for c in columns]
+            infrequent = getattr(transformer, "infrequent_categories_", None)
+            for j, categories in enumerate(transformer.categories_):
+                rare = infrequent[j] if infrequent is not None and infrequent[j] is not None else []
+                rare_keys = {"" if _is_missing(v) else str(v) for v in rare}
+                rare_missing = any(_is_missing(v) for v in rare)
+
+                def is_rare(value):
+                    return rare_missing if _is_missing(value) else str(value) in rare_keys
+
+                # The encoder emits the frequent categories in order, then a
+                # single column shared by all infrequent ones
+                ordered = [(v, None) for v in categories if not is_rare(v)]
+                rare_column = len(numeric_cols) + n_category_columns + len(ordered) if len(rare) else -1
+                ordered += [(v, rare_column) for v in categories if is_rare(v)]
+
+                for value, column in ordered:
+                    if column is None:
+                        column = len(numeric_cols) + n_category_columns
+                        n_category_columns += 1
+                    category_feature.append(j)
+                    category_is_missing.append(_is_missing(value))
+                    category_value.append("" if _is_missing(value) else str(value))
+                    category_column.append(column)
+                if len(rare):
+                    n_category_columns += 1
+
+                # handle_unknown="infrequent_if_exist" scores unseen values as infrequent
+                if transformer.handle_unknown == "infrequent_if_exist":
+                    unknown_column.append(rare_column)
+                else:
+                    unknown_column.append(-1)
+        elif transformer != "drop":
+            raise ValueError(f"Unsupported transformer in pipeline: {name}")
+
+    n_features = len(numeric_cols) + n_category_columns
+    if classifier.coef_.shape[1] != n_features:
+        raise ValueError(
+            f"Classifier expects {classifier.coef_.shape[1]} features, "
+            f"preprocessor produces {n_features}"
+        )
+
+    return {
+        "numeric_cols": np.array(numeric_cols, dtype=str),
+        "mean": np.asarray(mean, dtype=np.float64),
+        "scale": np.asarray(scale, dtype=np.float64),
+        "categorical_cols": np.array(categorical_cols, dtype=str),
+        "category_feature": np.array(category_feature, dtype=np.int32),
+        "category_value": np.array(category_value, dtype=str),
+        "category_is_missing": np.array(category_is_missing, dtype=bool),
+        "category_column": np.array(category_column, dtype=np.int32),
+        "unknown_column": np.array(unknown_column, dtype=np.int32),
+        "coef": classifier.coef_[0].astype(np.float64),
+        "intercept": np.float64(classifier.intercept_[0]),
+    }
+
+
+def save_artifact(artifact, path):
+    """Write a compiled artifact as an uncompressed .npz file."""
+    np.savez(path, **artifact)
+
+
+def load_artifact(path):
+    with np.load(path, allow_pickle=False) as data:
+        return {key: data[key] for key in data.files}
+
+
+class CompiledModel:
+    """
+    Scores leads against a compiled artifact.
+
+    The scaler is folded into the numeric weights, so a score is
+    bias + x @ weights + one weight lookup per categorical feature.
+    """
+
+    def __init__(self, artifact):
+        self.numeric_cols = [str(c) for c in artifact["numeric_cols"]]
+        self.categorical_cols = [str(c) for c in artifact["categorical_cols"]]
+
+        coef = np.asarray(artifact["coef"], dtype=np.float64)
+        n_num = len(self.numeric_cols)
+        self.weights = coef[:n_num] / artifact["scale"]
+        self.bias = float(artifact["intercept"] - np.dot(self.weights, artifact["mean"]))
+
+        # One {category: weight} dict per categorical feature; unknown
+        # categories contribute nothing, exactly like handle_unknown="ignore",
+        # unless the encoder maps them to its infrequent column
+        n_cat = len(self.categorical_cols)
+        self.lookups = [{} for _ in self.categorical_cols]
+        self.missing_weights = [0.0] * n_cat
+        self.unknown_weights = [0.0] * n_cat
+        columns = artifact.get("category_column")
+        if columns is None:
+            # Artifacts without explicit columns have one column per category
+            columns = n_num + np.arange(len(artifact["category_feature"]))
+        unknown = artifact.get("unknown_column", np.full(n_cat, -1))
+        for j, column in enumerate(unknown):
+            if column >= 0:
+                self.unknown_weights[j] = float(coef[column])
+        for k, j in enumerate(artifact["category_feature"]):
+            weight = float(coef[columns[k]])
+            if artifact["category_is_missing"][k]:
+                self.missing_weights[j] = weight
+            else:
+                self.lookups[j][str(artifact["category_value"][k])] = weight
+
+    @classmethod
+    def from_pipeline(cls, pipeline):
+        return cls(compile_pipeline(pipeline))
+
+    @classmethod
+    def load(cls, path):
+        return cls(load_artifact(path))
+
+    def _category_weight(self, j, value):
+        if _is_missing(value):
+            return self.missing_weights[j]
+        return self.lookups[j].get(value if isinstance(value, str) else str(value), self.unknown_weights[j])
+
+    def predict_one(self, lead):
+        """Conversion probability for a single lead dict. Raises ValueError on bad input."""
+        z = self.bias
+        for col, weight in zip(self.numeric_cols, self.weights):
+            value = lead.get(col)
+            if _is_missing(value):
+                raise ValueError(f"Missing value for '{col}'")
+            try:
+                z += weight * float(value)
+            except (TypeError, ValueError):
+                raise ValueError(f"Invalid numeric value for '{col}': {value!r}")
+        for j, col in enumerate(self.categorical_cols):
+            z += self._category_weight(j, lead.get(col))
+        return _sigmoid(z)
+
+    def predict_columns(self, columns):
+        """
+        Vectorised scoring of column arrays ({name: sequence}).
+
+        Returns (probabilities, errors) where probabilities is a float array
+        with NaN for rows that failed and errors maps row position to a message.
+        """
+        n = len(next(iter(columns.values()))) if columns else 0
+        z = np.full(n, self.bias)
+        errors = {}
+
+        for col, weight in zip(self.numeric_cols, self.weights):
+            raw = columns.get(col)
+            if raw is None:
+                for i in range(n):
+                    errors.setdefault(i, f"Missing value for '{col}'")
+                continue
+            try:
+                values = np.asarray(raw, dtype=np.float64)
+            except (TypeError, ValueError):
+                values = np.full(n, np.nan)
+                for i, value in enumerate(raw):
+                    try:
+                        values[i] = float(value)
+                    except (TypeError, ValueError):
+                        errors.setdefault(i, f"Invalid numeric value for '{col}': {value!r}")
+            for i in np.flatnonzero(np.isnan(values)):
+                errors.setdefault(int(i), f"Missing value for '{col}'")
+            z += weight * values
+
+        for j, col in enumerate(self.categorical_cols):
+            raw = columns.get(col)
+            if raw is None:
+                z += self.missing_weights[j]
+                continue
+            z += np.fromiter((self._category_weight(j, v) for v in raw), np.float64, n)
+
+        # exp of -|z| only, so large scores don't overflow
+        e = np.exp(-np.abs(z))
+        probabilities = np.where(z >= 0, 1.0 / (1.0 + e), e / (1.0 + e))
+        if errors:
+            probabilities[list(errors)] = np.nan
+        return probabilities, errors
+
+    def score_records(self, records):
+        """Same contract as scoring_service.score_records, without pandas."""
+        errors = {}
+        rows = []
+        positions = []
+        for i, record in enumerate(records):
+            if isinstance(record, dict):
+                positions.append(i)
+                rows.append(record)
+            else:
+                errors[i] = "Row must be a JSON object"
+
+        columns = {
+            col: [row.get(col) for row in rows]
+            for col in self.numeric_cols + self.categorical_cols
+        }
+        probabilities, failed = self.predict_columns(columns) if rows else ([], {})
+        for k, message in failed.items():
+            errors[positions[k]] = message
+
+        predictions = [None] * len(records)
+        for k, i in enumerate(positions):
+            if k not in failed:
+                predictions[i] = float(probabilities[k])
+        return predictions, [{"index": i, "error": errors[i]} for i in sorted(errors)]
+
+
+def max_deviation(pipeline, compiled, df):
+    """Largest absolute difference from pipeline.predict_proba over a frame."""
+    expected = pipeline.predict_proba(df)[:, 1]
+    actual, errors = compiled.predict_columns({col: df[col].tolist() for col in df.columns})
+    if errors:
+        raise ValueError(f"{len(errors)} rows could not be scored by the compiled model")
+    return float(np.max(np.abs(expected - actual))) if len(df) else 0.0
+
+
+if __name__ == "__main__":
+    # Export step: python -m services.compiled_model lead_model.pkl lead_model.npz [bank_marketing.csv]
+    import joblib
+
+    if len(sys.argv) not in (3, 4):
+        print("Usage: python -m services.compiled_model <model.pkl> <artifact.npz> [check.csv]")
+        sys.exit(1)
+
+    pipeline = joblib.load(sys.argv[1])
+    artifact = compile_pipeline(pipeline)
+    save_artifact(artifact, sys.argv[2])
+    print(f"Compiled {sys.argv[1]} to {sys.argv[2]}")
+
+    if len(sys.argv) == 4:
+        import pandas as pd
+        from services.scoring_service import prepare_frame
+
+        raw = pd.read_csv(sys.argv[3], sep=';', dtype=object).drop("y", axis=1, errors="ignore")
+        df, _ = prepare_frame(raw.to_dict("records"), pipeline.feature_names_in_)
+        deviation = max_deviation(pipeline, CompiledModel(artifact), df)
+        print(f"Max deviation from predict_proba on {len(df)} rows: {deviation:.2e}")
+        if deviation > 1e-9:
+            sys.exit(1)
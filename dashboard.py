@@ -3,19 +3,35 @@ import pandas as pd
 import requests
 import plotly.express as px
 import plotly.graph_objects as go
+import os
+import sys
+
+# Read the CSVs through the backend's columnar cache when it's importable
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'backend'))
+try:
+    from services.data_cache import load_csv
+except ImportError:
+    load_csv = None
+
+
+def read_data(path, sep=',', categorical='object'):
+    if load_csv is None:
+        return pd.read_csv(path, sep=sep)
+    return load_csv(path, sep=sep, categorical=categorical)
+
 
 st.title('📊 MarketMind Dashboard')
 
 # Load data
 try:
-    sales_df = pd.read_csv('../../data/sales_data.csv')
+    sales_df = read_data('../../data/sales_data.csv')
     sales_df['date'] = pd.to_datetime(sales_df['date'])
 except Exception as e:
     st.error(f"Error loading sales data: {e}")
     sales_df = pd.DataFrame()
 
 try:
-    leads_df = pd.read_csv('../../data/bank_marketing.csv', sep=';')
+    leads_df = read_data('../../data/bank_marketing.csv', sep=';', categorical='category')
 except Exception as e:
     st.error(f"Error loading leads data: {e}")
     leads_df = pd.DataFrame()
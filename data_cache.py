@@ -0,0 +1,213 @@
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+# Where converted CSVs are kept; defaults to a .cache folder next to each source
+DATA_CACHE_DIR = os.getenv("DATA_CACHE_DIR")
+
+CACHE_FORMAT = 1
+
+
+def source_fingerprint(path):
+    """(mtime, size, sha256) of a source file."""
+    stat = os.stat(path)
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return stat.st_mtime, stat.st_size, digest.hexdigest()
+
+
+def cache_path(path, sep, numeric, cache_dir=None):
+    """Cache file for one (source, separator, numeric columns) combination."""
+    path = os.path.abspath(path)
+    directory = cache_dir or DATA_CACHE_DIR or os.path.join(os.path.dirname(path), ".cache")
+    spec = json.dumps([path, sep, sorted(numeric) if numeric is not None else None])
+    key = hashlib.blake2b(spec.encode(), digest_size=6).hexdigest()
+    return os.path.join(directory, f"{os.path.basename(path)}.{key}.npz")
+
+
+def _read_meta(cached):
+    try:
+        with np.load(cached) as store:
+            return json.loads(str(store["__meta__"]))
+    except Exception:
+        return None
+
+
+def _numeric_column(codes, categories, infer):
+    """
+    Numeric array for a factorised column, or None if it should stay
+    categorical. Only the distinct values are parsed, which is much cheaper
+    than to_numeric over every row.
+    """
+    numbers = pd.to_numeric(pd.Series(categories, dtype=object), errors="coerce")
+    if infer and numbers.isna().any():
+        return None
+    missing = codes < 0
+    if pd.api.types.is_integer_dtype(numbers) and not missing.any():
+        return numbers.to_numpy()[codes]
+    values = numbers.to_numpy(dtype=np.float64)[codes]
+    values[missing] = np.nan
+    return values
+
+
+def build_cache(path, cached, sep=",", numeric=None, fingerprint=None):
+    """
+    Parse the CSV once and write every column to one uncompressed .npz:
+    numeric columns as int64/float64 arrays, the rest as int32 codes into a
+    vocabulary (-1 = missing). numeric lists the columns to convert; None
+    converts every column that parses cleanly, like read_csv does.
+    """
+    mtime, size, checksum = fingerprint or source_fingerprint(path)
+    df = pd.read_csv(path, sep=sep, dtype=object)
+
+    arrays = {}
+    columns = []
+    for i, col in enumerate(df.columns):
+        categorical = pd.Categorical(df[col])
+        codes = categorical.codes.astype(np.int32)
+        categories = np.asarray(categorical.categories, dtype=object)
+
+        converted = None
+        if numeric is None or col in numeric:
+            converted = _numeric_column(codes, categories, infer=numeric is None)
+        if converted is not None:
+            arrays[f"c{i}"] = converted
+            columns.append({"name": col, "kind": "numeric"})
+        else:
+            arrays[f"c{i}"] = codes
+            arrays[f"v{i}"] = categories.astype(str)
+            columns.append({"name": col, "kind": "categorical"})
+
+    meta = {"format": CACHE_FORMAT, "source_mtime": mtime, "source_size": size,
+            "source_sha256": checksum, "rows": len(df), "columns": columns}
+    arrays["__meta__"] = np.array(json.dumps(meta))
+
+    # Write beside the target and rename, so readers never see half a file
+    os.makedirs(os.path.dirname(cached), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(suffix=".npz", dir=os.path.dirname(cached))
+    os.close(fd)
+    try:
+        np.savez(tmp_path, **arrays)
+        os.replace(tmp_path, cached)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+    return meta
+
+
+def _refresh_mtime(cached, meta, mtime):
+    """Source touched but unchanged: record the new mtime so it isn't re-hashed."""
+    with np.load(cached) as store:
+        arrays = {name: store[name] for name in store.files}
+    meta["source_mtime"] = mtime
+    arrays["__meta__"] = np.array(json.dumps(meta))
+    fd, tmp_path = tempfile.mkstemp(suffix=".npz", dir=os.path.dirname(cached))
+    os.close(fd)
+    np.savez(tmp_path, **arrays)
+    os.replace(tmp_path, cached)
+
+
+def ensure_cache(path, sep=",", numeric=None, cache_dir=None):
+    """
+    Path of an up-to-date cache for the CSV, building it if needed.
+
+    A matching mtime and size is trusted as is; otherwise the source is
+    hashed and the cache only rebuilt if the contents really changed.
+    """
+    cached = cache_path(path, sep, numeric, cache_dir)
+    meta = _read_meta(cached) if os.path.exists(cached) else None
+    stat = os.stat(path)
+
+    if meta is not None and meta.get("format") == CACHE_FORMAT:
+        if meta["source_mtime"] == stat.st_mtime and meta["source_size"] == stat.st_size:
+            return cached
+        fingerprint = source_fingerprint(path)
+        if fingerprint[2] == meta["source_sha256"]:
+            _refresh_mtime(cached, meta, fingerprint[0])
+            return cached
+        build_cache(path, cached, sep, numeric, fingerprint)
+        return cached
+
+    build_cache(path, cached, sep, numeric)
+    return cached
+
+
+def load_csv(path, sep=",", numeric=None, categorical="object", cache_dir=None):
+    """
+    Read a CSV through the columnar cache.
+
+    Numeric columns come back as numbers; the rest as object strings (the
+    same values read_csv(dtype=object) gives) or, with categorical="category",
+    as pandas categoricals, which skip building one string per row.
+    """
+    cached = ensure_cache(path, sep, numeric, cache_dir)
+    data = {}
+    with np.load(cached) as store:
+        meta = json.loads(str(store["__meta__"]))
+        for i, column in enumerate(meta["columns"]):
+            values = store[f"c{i}"]
+            if column["kind"] == "categorical":
+                values = pd.Categorical.from_codes(values, categories=store[f"v{i}"].astype(object))
+                if categorical == "object":
+                    values = pd.Series(np.asarray(values, dtype=object), dtype=object)
+            data[column["name"]] = values
+    return pd.DataFrame(data)
+
+
+def clear_cache(path, sep=",", numeric=None, cache_dir=None):
+    cached = cache_path(path, sep, numeric, cache_dir)
+    if os.path.exists(cached):
+        os.remove(cached)
+
+
+def _measure(load):
+    tracemalloc.start()
+    start = time.perf_counter()
+    df = load()
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"seconds": seconds, "peak_mb": peak / 1e6, "frame_mb": df.memory_usage(deep=True).sum() / 1e6}
+
+
+def _read_uncached(path, sep, numeric):
+    """What the callers did before the cache: parse as text, coerce column by column."""
+    if numeric is None:
+        return pd.read_csv(path, sep=sep)
+    df = pd.read_csv(path, sep=sep, dtype=object)
+    for col in numeric:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors="coerce")
+    return df
+
+
+def benchmark(path, sep=",", numeric=None):
+    """Load time, peak allocation and frame size for read_csv vs cold/warm cache."""
+    rows = [{"path": "read_csv", **_measure(lambda: _read_uncached(path, sep, numeric))}]
+    clear_cache(path, sep, numeric)
+    rows.append({"path": "cache cold", **_measure(lambda: load_csv(path, sep, numeric))})
+    rows.append({"path": "cache warm", **_measure(lambda: load_csv(path, sep, numeric))})
+    rows.append({"path": "cache warm (category)",
+                 **_measure(lambda: load_csv(path, sep, numeric, categorical="category"))})
+    return pd.DataFrame(rows)
+
+
+if __name__ == "__main__":
+    # python -m services.data_cache bank_marketing.csv [sep]
+    if len(sys.argv) not in (2, 3):
+        print("Usage: python -m services.data_cache <file.csv> [sep]")
+        sys.exit(1)
+    from services.preprocessing import NUMERIC_COLS
+
+    sep = sys.argv[2] if len(sys.argv) == 3 else ","
+    # ';' files are lead exports typed by preprocessing.load_data
+    print(benchmark(sys.argv[1], sep, NUMERIC_COLS if sep == ";" else None).to_string(index=False))
@@ -1,7 +1,9 @@
 import pandas as pd
 
+from services.data_cache import load_csv
 
-def load_and_clean(path: str) -> pd.DataFrame:
-    df = pd.read_csv(path)
+
+def load_and_clean(path: str, sep: str = ",") -> pd.DataFrame:
+    df = load_csv(path, sep=sep)
     # placeholder cleaning steps
     return df
@@ -0,0 +1,196 @@
+import hashlib
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from services.forecasting_service import (
+    BACKTEST_METRIC, DEFAULT_SEASON_LENGTH, _z_score, extend_fit, fit_model,
+    forecast_from_fit, prepare_request, resolve_model, select_model
+)
+
+# Forecasts kept in memory (0 disables the cache) and how long they stay valid
+FORECAST_CACHE_SIZE = int(os.getenv("FORECAST_CACHE_SIZE", "256"))
+FORECAST_CACHE_TTL = float(os.getenv("FORECAST_CACHE_TTL", "3600"))
+# A cached fit is moved over appended points, keeping its parameters, until
+# they add up to this fraction of the points it was fitted on; then it is refitted
+FORECAST_EXTEND_LIMIT = float(os.getenv("FORECAST_EXTEND_LIMIT", "0.25"))
+
+
+def series_digest(y):
+    """Hash of the float64 values of a series."""
+    return hashlib.blake2b(np.ascontiguousarray(y, dtype=np.float64).tobytes(), digest_size=16).hexdigest()
+
+
+class ForecastCache:
+    """
+    Thread-safe LRU + TTL of forecasts and of the fits behind them.
+
+    Results are keyed by (series hash, model, periods, confidence level,
+    season length, metric), so moving a slider back to a previous setting
+    is a lookup. Fits are keyed by (model, season length, metric, series
+    hash) and serve every periods/confidence combination of a series; when a
+    series is a cached one plus a few appended points the fit is extended
+    rather than refitted.
+    """
+
+    def __init__(self, maxsize=FORECAST_CACHE_SIZE, ttl=FORECAST_CACHE_TTL, extend_limit=FORECAST_EXTEND_LIMIT):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.extend_limit = extend_limit
+        self.results = OrderedDict()
+        self.fits = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.fit_hits = 0
+        self.extended = 0
+        self.evictions = 0
+        self.expired = 0
+
+    def _get(self, store, key):
+        entry = store.get(key)
+        if entry is None:
+            return None
+        expires, value = entry
+        if expires < time.monotonic():
+            del store[key]
+            self.expired += 1
+            return None
+        store.move_to_end(key)
+        return value
+
+    def _put(self, store, key, value):
+        store[key] = (time.monotonic() + self.ttl, value)
+        store.move_to_end(key)
+        while len(store) > self.maxsize:
+            store.popitem(last=False)
+            self.evictions += 1
+
+    def get_result(self, key):
+        with self.lock:
+            result = self._get(self.results, key)
+            if result is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return result
+
+    def set_result(self, key, result):
+        with self.lock:
+            self._put(self.results, key, result)
+
+    def find_fit(self, group, y):
+        """
+        (fit, how) for y: an exact fit ("hit"), a fit of a prefix of y moved
+        over the new points ("extended") or (None, None).
+        """
+        digest = series_digest(y)
+        with self.lock:
+            fitted = self._get(self.fits, group + (digest,))
+            if fitted is not None:
+                self.fit_hits += 1
+                return fitted, "hit"
+            # Longest cached prefix of this series within the extension limit
+            candidates = sorted({fit["n"] for key, (_, fit) in self.fits.items()
+                                 if key[:-1] == group and fit["n"] < len(y)
+                                 and len(y) <= (1 + self.extend_limit) * fit.get("fitted_n", fit["n"])},
+                                reverse=True)
+            for n in candidates:
+                prefix = self._get(self.fits, group + (series_digest(y[:n]),))
+                if prefix is not None:
+                    break
+            else:
+                return None, None
+
+        extended = extend_fit(prefix, y)
+        with self.lock:
+            self.extended += 1
+        return extended, "extended"
+
+    def set_fit(self, group, y, fitted):
+        with self.lock:
+            self._put(self.fits, group + (series_digest(y),), fitted)
+
+    def clear(self):
+        with self.lock:
+            self.results.clear()
+            self.fits.clear()
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self.results),
+                "fits": len(self.fits),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "fit_hits": self.fit_hits,
+                "extended": self.extended,
+                "evictions": self.evictions,
+                "expired": self.expired,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+def cached_forecast(cache, series, periods=12, model="Simple Exponential Smoothing", confidence_level=95,
+                    season_length=DEFAULT_SEASON_LENGTH, metric=BACKTEST_METRIC):
+    """
+    forecast() through the cache. The result carries "cache": "hit" (stored
+    forecast), "fit" (stored fit, new horizon or level), "extended" (stored
+    fit moved over appended points) or "miss".
+    """
+    start = time.perf_counter()
+    y, periods, season_length = prepare_request(series, periods, confidence_level, season_length)
+    kind = resolve_model(model)
+    level = _z_score(confidence_level)[1]
+    metric = metric if kind == "auto" else None
+
+    digest = series_digest(y)
+    key = (digest, kind, periods, level, season_length, metric)
+    result = cache.get_result(key)
+    if result is not None:
+        return {**result, "cache": "hit", "fit_ms": round((time.perf_counter() - start) * 1000, 2)}
+
+    group = (kind, season_length, metric)
+    fitted, how = cache.find_fit(group, y)
+    if how == "extended" and kind == "holt_winters" and fitted["kind"] == "holt" and len(y) >= 2 * season_length:
+        # Short-series fallback that now has two full seasons to fit on
+        fitted = None
+    if fitted is None:
+        how = "miss"
+        if kind == "auto":
+            best, selection = select_model(y, periods, season_length, metric)
+            fitted = fit_model(best, y, season_length)
+            fitted["selection"] = selection
+        else:
+            fitted = fit_model(kind, y, season_length)
+    elif how == "hit":
+        how = "fit"
+    if how != "fit":
+        cache.set_fit(group, y, fitted)
+
+    result = forecast_from_fit(fitted, y, periods, level)
+    cache.set_result(key, result)
+    return {**result, "cache": how, "fit_ms": round((time.perf_counter() - start) * 1000, 2)}
+
+
+if __name__ == "__main__":
+    # python -m services.forecast_cache [n_points] [model] - cold, repeated and appended-point timings
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    model = sys.argv[2] if len(sys.argv) > 2 else "Holt-Winters"
+    rng = np.random.default_rng(0)
+    t = np.arange(n + 3)
+    y = 1000 + 2 * t + 50 * np.sin(2 * np.pi * t / 12) + rng.normal(0, 10, n + 3)
+
+    cache = ForecastCache()
+    for label, series, periods, confidence in [("cold", y[:n], 12, 95), ("repeat", y[:n], 12, 95),
+                                               ("new horizon", y[:n], 24, 90), ("3 appended", y, 12, 95)]:
+        result = cached_forecast(cache, series, periods, model, confidence)
+        print(f"{label:12s} {result['cache']:9s} {result['fit_ms']:8.2f} ms  next={result['forecast'][0]:.1f}")
+    print(cache.stats())
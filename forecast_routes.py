@@ -1,27 +1,88 @@
+import numpy as np
 from flask import Blueprint, request, jsonify
-from services.forecasting import forecast
+from services.forecasting_service import BACKTEST_METRIC, DEFAULT_SEASON_LENGTH, forecast
+from services.batch_forecasting import FORECAST_WORKERS, forecast_batch
+from services.forecast_cache import FORECAST_CACHE_SIZE, ForecastCache, cached_forecast
 
 forecast_bp = Blueprint("forecast", __name__)
 
+# The forecasting page re-posts the whole series on every click; repeated
+# requests are served from here and appended points extend the cached fit
+forecast_cache = ForecastCache(FORECAST_CACHE_SIZE) if FORECAST_CACHE_SIZE > 0 else None
+
 @forecast_bp.route("/forecast", methods=["POST"])
 def run_forecast():
     data = request.json
     series = data.get("data", [])
     periods = data.get("periods", 12)
     model = data.get("model", "simple")
+    confidence_level = data.get("confidence_level", 95)
+    season_length = data.get("season_length", DEFAULT_SEASON_LENGTH)
+    # Only used by model="auto": backtest error to rank the models by
+    metric = str(data.get("metric", BACKTEST_METRIC)).lower()
 
     if not series:
         return jsonify({"error": "No data provided"}), 400
 
     try:
         # Call the forecasting service
-        forecast_result = forecast(series, periods)
+        if forecast_cache is not None:
+            forecast_result = cached_forecast(forecast_cache, series, periods, model, confidence_level,
+                                              season_length, metric)
+        else:
+            forecast_result = forecast(series, periods, model, confidence_level, season_length, metric)
 
         return jsonify({
-            "forecast": forecast_result,
+            **forecast_result,
             "periods": periods,
             "model": model
         })
 
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@forecast_bp.route("/forecast-cache", methods=["GET"])
+def forecast_cache_stats():
+    if forecast_cache is None:
+        return jsonify({"enabled": False})
+    return jsonify({"enabled": True, **forecast_cache.stats()})
+
+@forecast_bp.route("/forecast/batch", methods=["POST"])
+def run_batch_forecast():
+    """
+    Forecast many series in one call.
+
+    Body: {"series": {"<series_id>": [values, ...], ...}, "periods", "model",
+    "confidence_level", "season_length"}. The response is columnar: one
+    list per column (series_id, step, forecast, lower, upper, model_used,
+    error) plus throughput stats.
+    """
+    data = request.json or {}
+    series = data.get("series")
+    if not isinstance(series, dict) or not series:
+        return jsonify({"error": "series must be an object of series_id -> list of values"}), 400
+
+    try:
+        ids = list(series)
+        values = [np.asarray(series[i], dtype=np.float64) for i in ids]
+        result, stats = forecast_batch(
+            ids, values,
+            periods=int(data.get("periods", 12)),
+            model=data.get("model", "Holt"),
+            confidence_level=data.get("confidence_level", 95),
+            season_length=int(data.get("season_length", DEFAULT_SEASON_LENGTH)),
+            workers=FORECAST_WORKERS
+        )
+        # NaN isn't valid JSON
+        result = result.astype(object).where(result.notna(), None)
+        columns = {col: result[col].tolist() for col in result.columns}
+        return jsonify({"results": columns, "stats": stats})
+
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
\ No newline at end of file
+        return jsonify({"error": str(e)}), 500
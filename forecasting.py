@@ -3,6 +3,15 @@ import pandas as pd
 import requests
 import plotly.graph_objects as go
 import numpy as np
+import os
+import sys
+
+# Uploads are read with the backend's streaming reader when it's importable
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'backend'))
+try:
+    from services.ingest import Schema, read_chunks
+except ImportError:
+    read_chunks = None
 
 st.title('📈 Sales Forecasting')
 
@@ -24,24 +33,39 @@ if data_option == 'Upload CSV':
 
     if uploaded_file is not None:
         try:
-            df = pd.read_csv(uploaded_file)
-            st.success(f"Loaded {len(df)} records")
+            # Read just the header first; the file is then streamed in chunks
+            # and only the two selected columns are kept
+            header_df = pd.read_csv(uploaded_file, nrows=5)
+            uploaded_file.seek(0)
 
             # Display data preview
             st.subheader('Data Preview')
-            st.dataframe(df.head())
+            st.dataframe(header_df)
 
             # Column selection
-            date_col = st.selectbox('Select date column', df.columns)
-            value_col = st.selectbox('Select value column to forecast', df.columns)
+            date_col = st.selectbox('Select date column', header_df.columns)
+            value_col = st.selectbox('Select value column to forecast', header_df.columns)
 
             if date_col and value_col:
-                # Convert date column
-                try:
+                if read_chunks is not None:
+                    schema = Schema(numeric=[value_col], dates=[date_col])
+                    chunks = []
+                    stats = {}
+                    error_rows = []
+                    for chunk, errors in read_chunks(uploaded_file, schema, stats=stats):
+                        chunks.append(chunk.drop(index=list(errors)))
+                        error_rows.extend({'row': row, 'error': message} for row, message in errors.items())
+                        del error_rows[100:]
+                    df = pd.concat(chunks).sort_values(date_col)
+                    if stats['invalid_rows']:
+                        st.warning(f"Skipped {stats['invalid_rows']} rows with invalid dates or values")
+                        st.dataframe(pd.DataFrame(error_rows))
+                else:
+                    df = pd.read_csv(uploaded_file, usecols=list({date_col, value_col}))
                     df[date_col] = pd.to_datetime(df[date_col])
                     df = df.sort_values(date_col)
-                except:
-                    st.error("Could not parse date column. Please ensure it contains valid dates.")
+                uploaded_file.seek(0)
+                st.success(f"Loaded {len(df)} records")
 
         except Exception as e:
             st.error(f"Error loading file: {str(e)}")
@@ -75,7 +99,8 @@ if not df.empty:
 
     with col2:
         model_type = st.selectbox('Forecasting model',
-                                ['Simple Exponential Smoothing',
+                                ['Auto',
+                                 'Simple Exponential Smoothing',
                                  'Holt-Winters',
                                  'ARIMA',
                                  'Prophet'])
@@ -94,7 +119,8 @@ if not df.empty:
                     json={
                         'data': historical_data,
                         'periods': periods,
-                        'model': model_type
+                        'model': model_type,
+                        'confidence_level': confidence_level
                     },
                     timeout=30
                 )
@@ -106,6 +132,13 @@ if not df.empty:
                         forecast_values = result['forecast']
 
                         st.success('Forecast generated successfully!')
+                        if result.get('model_used'):
+                            st.caption(f"Model: {result['model_used']} {result.get('params', {})}")
+                        if result.get('selection'):
+                            selection = result['selection']
+                            st.caption(f"Picked by lowest {selection['metric'].upper()} over "
+                                       f"{selection['folds']} backtest folds of {selection['horizon']} periods")
+                            st.dataframe(pd.DataFrame(selection['scores']).T)
 
                         # Create forecast dataframe
                         last_date = df[date_col].max()
@@ -115,6 +148,9 @@ if not df.empty:
                             'date': forecast_dates,
                             'forecasted_sales': forecast_values
                         })
+                        if 'lower' in result and 'upper' in result:
+                            forecast_df['lower'] = result['lower']
+                            forecast_df['upper'] = result['upper']
 
                         # Display results
                         st.subheader('Forecast Results')
@@ -139,7 +175,7 @@ if not df.empty:
                         hist_df.columns = ['date', 'value']
                         hist_df['type'] = 'Historical'
 
-                        forecast_df_plot = forecast_df.copy()
+                        forecast_df_plot = forecast_df[['date', 'forecasted_sales']].copy()
                         forecast_df_plot.columns = ['date', 'value']
                         forecast_df_plot['type'] = 'Forecast'
 
@@ -167,6 +203,17 @@ if not df.empty:
                             line=dict(color='red', dash='dash')
                         ))
 
+                        # Prediction interval
+                        if 'lower' in forecast_df:
+                            fig.add_trace(go.Scatter(
+                                x=list(forecast_df['date']) + list(forecast_df['date'][::-1]),
+                                y=list(forecast_df['upper']) + list(forecast_df['lower'][::-1]),
+                                fill='toself',
+                                fillcolor='rgba(255, 0, 0, 0.1)',
+                                line=dict(color='rgba(255, 0, 0, 0)'),
+                                name=f'{confidence_level}% interval'
+                            ))
+
                         fig.update_layout(
                             title='Sales Forecast',
                             xaxis_title='Date',
@@ -212,10 +259,11 @@ with st.expander('How to use forecasting'):
     - Values should be numeric (sales amounts, quantities, etc.)
 
     **Forecasting Models:**
+    - **Auto**: Backtests every model on the most recent periods and uses the one with the lowest error
     - **Simple Exponential Smoothing**: Good for data with no trend or seasonality
     - **Holt-Winters**: Suitable for data with trend and seasonality
     - **ARIMA**: Advanced statistical model for time series analysis
-    - **Prophet**: Facebook's forecasting tool, good for business data
+    - **Prophet**: Prophet-style trend plus seasonality regression, good for business data
 
     **Tips:**
     - More historical data generally leads to better forecasts
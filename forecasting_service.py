@@ -0,0 +1,543 @@
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from statistics import NormalDist
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy.optimize import minimize
+from scipy.signal import lfilter
+
+# Observations per seasonal cycle (monthly data) unless the request says otherwise
+DEFAULT_SEASON_LENGTH = 12
+
+# Rolling-origin folds for "auto" model selection, and the metric it ranks by
+BACKTEST_FOLDS = int(os.getenv("BACKTEST_FOLDS", "3"))
+BACKTEST_METRIC = os.getenv("BACKTEST_METRIC", "mase")
+
+# Names the forecasting page sends, plus short aliases
+MODEL_ALIASES = {
+    "auto": "auto",
+    "simple exponential smoothing": "ses",
+    "ses": "ses",
+    "simple": "ses",
+    "holt": "holt",
+    "holt linear": "holt",
+    "holt-winters": "holt_winters",
+    "holt_winters": "holt_winters",
+    "arima": "arima",
+    "prophet": "prophet",
+}
+
+
+# ---------- exponential smoothing ----------
+#
+# SES, Holt and additive Holt-Winters are all linear innovations models:
+#   yhat_t = w x_{t-1},  e_t = y_t - yhat_t,  x_t = F x_{t-1} + g e_t
+# so the one-step forecasts are an IIR filter of y and run through
+# scipy's lfilter instead of a Python loop over time. For Holt-Winters the
+# filter has order m+2; its coefficients are written out from the model's
+# structure (they are sparse: lags 0-2 and m..m+2) rather than taken from
+# np.poly of the state matrix, which loses all precision for long seasons.
+
+def _state_space(kind, alpha, beta=0.0, gamma=0.0, m=1):
+    """(F, g, w) of an ETS model with additive errors."""
+    if kind == "ses":
+        return np.array([[1.0]]), np.array([alpha]), np.array([1.0])
+
+    if kind == "holt":
+        F = np.array([[1.0, 1.0], [0.0, 1.0]])
+        return F, np.array([alpha, alpha * beta]), np.array([1.0, 1.0])
+
+    # State: level, trend, then the last m seasonal terms, newest first
+    k = m + 2
+    F = np.zeros((k, k))
+    F[0, 0] = F[0, 1] = F[1, 1] = 1.0
+    F[2, k - 1] = 1.0
+    for j in range(3, k):
+        F[j, j - 1] = 1.0
+    g = np.zeros(k)
+    g[:3] = alpha, alpha * beta, (1 - alpha) * gamma
+    w = np.zeros(k)
+    w[0] = w[1] = w[k - 1] = 1.0
+    return F, g, w
+
+
+def _initial_state(kind, y, m=1):
+    if kind == "ses":
+        return np.array([y[0]])
+    if kind == "holt":
+        steps = min(len(y) - 1, 4)
+        return np.array([y[0], (y[steps] - y[0]) / steps if steps else 0.0])
+
+    first, second = y[:m].mean(), y[m:2 * m].mean()
+    seasonal = (y[:m] - first)[::-1]
+    return np.concatenate([[first - (second - first) / 2], [(second - first) / m], seasonal])
+
+
+def _seasonal_filter(g, x0):
+    """
+    (b, a, zi) with e = lfilter(b, a, y, zi=zi)[0] the Holt-Winters one-step
+    errors. In the lag operator q, with D = (1-q)^2 (1-q^m):
+      b = D
+      a = D + q (alpha(1+beta) - alpha q) (1-q^m) + (1-alpha) gamma q^m (1-q)^2
+    and zi is minus the initial state's contribution to the forecasts,
+    (l0 + b0 - l0 q)(1-q^m) + (1-q)^2 * (seasonal terms, oldest first).
+    """
+    alpha, trend_gain, season_gain = g[:3]
+    m = len(x0) - 2
+    square = np.array([1.0, -2.0, 1.0])
+    season = np.zeros(m + 1)
+    season[0], season[m] = 1.0, -1.0
+    b = np.convolve(square, season)
+    a = b + np.convolve([0.0, alpha + trend_gain, -alpha], season)
+    a[m:] += season_gain * square
+    initial = np.convolve([x0[0] + x0[1], -x0[0]], season)[:m + 2]
+    initial += np.convolve(x0[2:][::-1], square)
+    return b, a, -initial
+
+
+def _one_step_errors(y, F, g, w, x0):
+    """One-step-ahead forecast errors for the whole series."""
+    k = len(x0)
+    if k > 2:
+        b, a, zi = _seasonal_filter(g, x0)
+        return lfilter(b, a, y, zi=zi)[0]
+    D = F - np.outer(g, w)
+    a = np.poly(D)
+
+    # Impulse response from y to yhat, and the response to the initial state
+    impulse = np.zeros(k + 1)
+    free = np.zeros(k)
+    v, u = g.copy(), x0.astype(float)
+    for j in range(k):
+        impulse[j + 1] = w @ v
+        free[j] = w @ u
+        v, u = D @ v, D @ u
+    b = np.convolve(a, impulse)[:k + 1]
+
+    # Initial conditions that make the filter's zero-input response equal
+    # the initial-state response, so one lfilter call covers both
+    zi = np.convolve(a, free)[:k]
+    yhat = lfilter(b, a, y, zi=zi)[0]
+    return y - yhat
+
+
+def _final_state(kind, errors, x0, alpha, beta=0.0, gamma=0.0, m=1):
+    """State after the last observation, from the errors (cumulative sums, no loop)."""
+    n = len(errors)
+    if kind == "ses":
+        return np.array([x0[0] + alpha * errors.sum()])
+
+    trend = x0[1] + alpha * beta * np.cumsum(errors)
+    level = x0[0] + x0[1] + trend[:-1].sum() + alpha * errors.sum()
+    if kind == "holt":
+        return np.array([level, trend[-1]])
+
+    # Seasonal term for each phase moves by (1-alpha)*gamma*e at its own steps
+    initial = x0[2:][::-1]                       # oldest first: phase of t=1 .. t=m
+    updates = np.zeros(m)
+    np.add.at(updates, np.arange(n) % m, errors)
+    phases = initial + (1 - alpha) * gamma * updates
+    # Newest first, ending with the phase that comes next
+    order = (np.arange(n - 1, n - 1 - m, -1)) % m
+    return np.concatenate([[level, trend[-1]], phases[order]])
+
+
+def _fit_smoothing(kind, y, m=1):
+    """Smoothing parameters minimising the one-step squared error."""
+    x0 = _initial_state(kind, y, m)
+    n_params = {"ses": 1, "holt": 2, "holt_winters": 3}[kind]
+
+    def sse(params):
+        errors = _one_step_errors(y, *_state_space(kind, *params, m=m), x0)
+        value = errors @ errors
+        return value if np.isfinite(value) else np.inf
+
+    # Coarse grid for a starting point, then a bounded local search
+    grid = [0.1, 0.4, 0.8]
+    starts = np.array(np.meshgrid(*[grid] * n_params)).reshape(n_params, -1).T
+    start = min(starts, key=sse)
+    result = minimize(sse, start, method="L-BFGS-B", bounds=[(1e-4, 0.9999)] * n_params)
+    params = result.x if result.fun <= sse(start) else start
+
+    F, g, w = _state_space(kind, *params, m=m)
+    errors = _one_step_errors(y, F, g, w, x0)
+    state = _final_state(kind, errors, x0, *params, m=m)
+    return params, F, g, w, state, errors
+
+
+def _project(F, w, state, periods):
+    """Point forecasts from a state: w F^(h-1) x for h = 1..periods."""
+    point = np.empty(periods)
+    for h in range(periods):
+        point[h] = w @ state
+        state = F @ state
+    return point
+
+
+def _smoothing_forecast(fitted, periods):
+    params, state, m = fitted["params"], fitted["state"], fitted["m"]
+    F, g, w = _state_space(fitted["kind"], *params, m=m)
+
+    point = _project(F, w, state, periods)
+    psi = np.empty(periods)          # w F^(h-1) g, for the interval widths
+    v = g
+    for h in range(periods):
+        psi[h] = w @ v
+        v = F @ v
+    variance_factor = 1 + np.concatenate([[0.0], np.cumsum(psi[:-1] ** 2)])
+
+    names = ["alpha", "beta", "gamma"][:len(params)]
+    sigma2 = fitted["sse"] / max(fitted["n"] - len(params), 1)
+    return point, sigma2 * variance_factor, dict(zip(names, np.round(params, 4).tolist()))
+
+
+# ---------- ARIMA ----------
+
+def _fit_ar(z, p):
+    """OLS fit of z_t = c + phi_1 z_{t-1} + ... + phi_p z_{t-p}."""
+    if p == 0:
+        residuals = z - z.mean()
+        return np.array([z.mean()]), residuals
+    lags = sliding_window_view(z, p + 1)[:, ::-1]          # [z_t, z_{t-1}, ..., z_{t-p}]
+    X = np.column_stack([np.ones(len(lags)), lags[:, 1:]])
+    coef, *_ = np.linalg.lstsq(X, lags[:, 0], rcond=None)
+    return coef, lags[:, 0] - X @ coef
+
+
+def _fit_arima(y, max_p=5, d=1):
+    """
+    ARIMA(p, d, 0) with drift: AR(p) on the d-times differenced series,
+    p picked by AIC, fitted by least squares. Returns (p, coef, sigma2).
+    """
+    z = np.diff(y, n=d) if d else y
+    best = None
+    for p in range(min(max_p, len(z) // 3) + 1):
+        coef, residuals = _fit_ar(z, p)
+        sigma2 = residuals @ residuals / len(residuals)
+        aic = len(residuals) * np.log(sigma2 + 1e-12) + 2 * (p + 1)
+        if best is None or aic < best[0]:
+            best = (aic, p, coef, sigma2)
+    return best[1:]
+
+
+def _arima_points(y, p, coef, d, periods):
+    """Forecast the differenced series from the end of y, then integrate back."""
+    z = np.diff(y, n=d) if d else y
+    c, phi = coef[0], coef[1:]
+    history = list(z[-p:]) if p else []
+    diffs = np.empty(periods)
+    for h in range(periods):
+        diffs[h] = c + sum(phi[i] * history[-1 - i] for i in range(p))
+        history.append(diffs[h])
+    point = diffs
+    for level in range(d, 0, -1):
+        point = np.diff(y, n=level - 1)[-1] + np.cumsum(point)
+    return point
+
+
+def _arima_forecast(fitted, y, periods):
+    p, coef, sigma2, d = fitted["p"], fitted["coef"], fitted["sigma2"], fitted["d"]
+    phi = coef[1:]
+    point = _arima_points(y, p, coef, d, periods)
+
+    # psi weights of (1 - phi(B)) (1 - B)^d for the interval widths
+    ar_poly = np.concatenate([[1.0], -phi])
+    for _ in range(d):
+        ar_poly = np.convolve(ar_poly, [1.0, -1.0])
+    impulse = np.zeros(periods)
+    impulse[0] = 1.0
+    psi = lfilter([1.0], ar_poly, impulse)
+    variance = sigma2 * np.cumsum(psi ** 2)
+    return point, variance, {"p": p, "d": d, "ar": np.round(phi, 4).tolist(), "drift": round(float(coef[0]), 4)}
+
+
+# ---------- trend + seasonality regression ----------
+
+def _fit_trend_seasonal(y, m=DEFAULT_SEASON_LENGTH, harmonics=3):
+    """
+    Linear trend plus Fourier seasonality, fitted by least squares - the
+    additive model Prophet uses, without changepoints or holidays.
+    Returns (coef, design, X, sigma2, harmonics); design(t) builds the
+    regressors for any time index.
+    """
+    n = len(y)
+    harmonics = min(harmonics, m // 2) if n >= 2 * m else 0
+
+    def design(t):
+        columns = [np.ones_like(t), t / n]
+        for k in range(1, harmonics + 1):
+            columns += [np.sin(2 * np.pi * k * t / m), np.cos(2 * np.pi * k * t / m)]
+        return np.column_stack(columns)
+
+    X = design(np.arange(n, dtype=float))
+    coef, *_ = np.linalg.lstsq(X, y, rcond=None)
+    residuals = y - X @ coef
+    sigma2 = residuals @ residuals / max(n - X.shape[1], 1)
+    return coef, design, X, sigma2, harmonics
+
+
+def _trend_seasonal_forecast(fitted, periods):
+    n = fitted["n"]
+    future = fitted["design"](np.arange(n, n + periods, dtype=float))
+    # Parameter uncertainty grows as the forecast moves away from the data
+    leverage = np.einsum("ij,jk,ik->i", future, fitted["gram_inv"], future)
+    return (future @ fitted["coef"], fitted["sigma2"] * (1 + leverage),
+            {"harmonics": fitted["harmonics"], "season_length": fitted["m"]})
+
+
+# ---------- fitted models ----------
+#
+# A fit is a plain dict of the model's parameters and its state after the
+# last observation. forecast() is fit_model() + forecast_from_fit(); the
+# forecast cache keeps fits and moves them over appended points with
+# extend_fit() instead of refitting.
+
+def fit_model(kind, y, m=DEFAULT_SEASON_LENGTH):
+    if kind == "holt_winters" and (m < 2 or len(y) < 2 * m):
+        kind = "holt"
+    if kind == "arima":
+        p, coef, sigma2 = _fit_arima(y)
+        return {"kind": kind, "n": len(y), "p": p, "coef": coef, "sigma2": sigma2, "d": 1, "m": m}
+    if kind == "prophet":
+        coef, design, X, sigma2, harmonics = _fit_trend_seasonal(y, m)
+        return {"kind": kind, "n": len(y), "coef": coef, "design": design, "gram_inv": np.linalg.pinv(X.T @ X),
+                "sigma2": sigma2, "harmonics": harmonics, "m": m}
+    params, F, g, w, state, errors = _fit_smoothing(kind, y, m)
+    return {"kind": kind, "n": len(y), "params": params, "state": state, "sse": float(errors @ errors), "m": m}
+
+
+def extend_fit(fitted, y):
+    """
+    The fit moved forward over y[fitted["n"]:], keeping its parameters.
+    Smoothing models run the appended points through their recursion; ARIMA
+    forecasts from the new history with its coefficients. The trend
+    regression has no state to move - it is cheap to refit, so that is what
+    it gets.
+    """
+    appended = y[fitted["n"]:]
+    kind = fitted["kind"]
+    if kind == "prophet":
+        refitted = fit_model(kind, y, fitted["m"])
+        if "selection" in fitted:
+            refitted["selection"] = fitted["selection"]
+        return refitted
+    # fitted_n: points the parameters were estimated on
+    extended = dict(fitted, n=len(y), fitted_n=fitted.get("fitted_n", fitted["n"]))
+    if kind == "arima" or not len(appended):
+        return extended
+
+    params, m = fitted["params"], fitted["m"]
+    F, g, w = _state_space(kind, *params, m=m)
+    errors = _one_step_errors(appended, F, g, w, fitted["state"])
+    extended["state"] = _final_state(kind, errors, fitted["state"], *params, m=m)
+    extended["sse"] = fitted["sse"] + float(errors @ errors)
+    return extended
+
+
+def forecast_from_fit(fitted, y, periods, confidence_level=95):
+    """Forecast and prediction interval from a fit of y (see forecast())."""
+    z, level = _z_score(confidence_level)
+    kind = fitted["kind"]
+    if kind == "arima":
+        point, variance, params = _arima_forecast(fitted, y, periods)
+    elif kind == "prophet":
+        point, variance, params = _trend_seasonal_forecast(fitted, periods)
+    else:
+        point, variance, params = _smoothing_forecast(fitted, periods)
+    if kind == "holt_winters":
+        params["season_length"] = fitted["m"]
+
+    margin = z * np.sqrt(np.maximum(variance, 0))
+    result = {
+        "forecast": point.tolist(),
+        "lower": (point - margin).tolist(),
+        "upper": (point + margin).tolist(),
+        "confidence_level": level,
+        "model_used": kind,
+        "params": params,
+    }
+    if "selection" in fitted:
+        result["selection"] = fitted["selection"]
+    return result
+
+
+# ---------- automatic model selection ----------
+
+_backtest_pool = ThreadPoolExecutor(max_workers=5, thread_name_prefix="backtest")
+
+
+def _backtest(kind, y, origins, horizon, m):
+    """
+    Forecasts of `horizon` steps from every origin. The model is fitted once,
+    on the data before the first origin; later origins only move its state
+    forward rather than refitting.
+    """
+    train = y[:origins[0]]
+    if kind == "arima":
+        p, coef, _ = _fit_arima(train)
+        return [_arima_points(y[:origin], p, coef, 1, horizon) for origin in origins]
+
+    if kind == "prophet":
+        coef, design = _fit_trend_seasonal(train, m)[:2]
+        return [design(np.arange(origin, origin + horizon, dtype=float)) @ coef for origin in origins]
+
+    params, F, g, w, _, _ = _fit_smoothing(kind, train, m)
+    # One filter pass over the whole series with the training parameters;
+    # the state at each origin is then a prefix sum over those errors
+    x0 = _initial_state(kind, train, m)
+    errors = _one_step_errors(y, F, g, w, x0)
+    return [_project(F, w, _final_state(kind, errors[:origin], x0, *params, m=m), horizon)
+            for origin in origins]
+
+
+def forecast_accuracy(actual, predicted, train, m=1):
+    """MAPE and sMAPE (percent) and MASE against a seasonal-naive scale."""
+    actual, predicted = np.asarray(actual), np.asarray(predicted)
+    error = np.abs(actual - predicted)
+    nonzero = actual != 0
+    denominator = np.abs(actual) + np.abs(predicted)
+    lag = m if len(train) > m else 1
+    scale = np.mean(np.abs(train[lag:] - train[:-lag])) if len(train) > lag else 0.0
+    return {
+        "mape": float(np.mean(error[nonzero] / np.abs(actual[nonzero])) * 100) if nonzero.any() else None,
+        "smape": float(np.mean(np.where(denominator > 0, 2 * error / np.where(denominator > 0, denominator, 1), 0)) * 100),
+        "mase": float(error.mean() / scale) if scale > 0 else None,
+    }
+
+
+def select_model(y, periods, season_length=DEFAULT_SEASON_LENGTH, metric=BACKTEST_METRIC,
+                 folds=BACKTEST_FOLDS):
+    """
+    Backtest every model on rolling origins (in parallel) and return the one
+    with the lowest `metric`, plus every model's scores.
+    """
+    if metric not in ("mape", "smape", "mase"):
+        raise ValueError("metric must be one of: mape, smape, mase")
+    start = time.perf_counter()
+    n = len(y)
+    horizon = max(1, min(periods, n // (folds + 2)))
+    origins = [n - horizon * (folds - i) for i in range(folds)]
+    origins = [origin for origin in origins if origin >= 4]
+    if not origins:
+        raise ValueError("Not enough data to backtest; send more points or pick a model")
+
+    candidates = ["ses", "holt", "arima", "prophet"]
+    if season_length >= 2 and origins[0] >= 2 * season_length:
+        candidates.insert(2, "holt_winters")
+
+    actual = np.concatenate([y[origin:origin + horizon] for origin in origins])
+    futures = {kind: _backtest_pool.submit(_backtest, kind, y, origins, horizon, season_length)
+               for kind in candidates}
+    scores = {}
+    for kind, future in futures.items():
+        try:
+            predicted = np.concatenate(future.result())
+            scores[kind] = forecast_accuracy(actual, predicted, y[:origins[0]], season_length)
+        except Exception as e:
+            scores[kind] = {"error": str(e)}
+    backtest_ms = (time.perf_counter() - start) * 1000
+
+    ranked = [kind for kind in candidates if scores[kind].get(metric) is not None]
+    if not ranked:
+        # e.g. MAPE on an all-zero series; fall back to a scale-free metric
+        ranked = [kind for kind in candidates if scores[kind].get("smape") is not None]
+        metric = "smape"
+    best = min(ranked, key=lambda kind: scores[kind][metric])
+    return best, {
+        "metric": metric,
+        "scores": scores,
+        "folds": len(origins),
+        "horizon": horizon,
+        "backtest_ms": round(backtest_ms, 2),
+    }
+
+
+def auto_forecast(y, periods, confidence_level=95, season_length=DEFAULT_SEASON_LENGTH,
+                  metric=BACKTEST_METRIC, folds=BACKTEST_FOLDS):
+    """Forecast with the model select_model() picks, reporting every model's scores."""
+    start = time.perf_counter()
+    best, selection = select_model(y, periods, season_length, metric, folds)
+    fitted = fit_model(best, y, season_length)
+    fitted["selection"] = selection
+    result = forecast_from_fit(fitted, y, periods, confidence_level)
+    result["fit_ms"] = round((time.perf_counter() - start) * 1000, 2)
+    return result
+
+
+# ---------- entry point ----------
+
+def resolve_model(model):
+    key = MODEL_ALIASES.get(str(model).strip().lower())
+    if key is None:
+        raise ValueError(f"Unknown model '{model}'. Choose one of: Auto, Simple Exponential Smoothing, "
+                         f"Holt, Holt-Winters, ARIMA, Prophet")
+    return key
+
+
+def _z_score(confidence_level):
+    level = float(confidence_level)
+    if level > 1:
+        level /= 100
+    if not 0 < level < 1:
+        raise ValueError("confidence_level must be between 0 and 100")
+    return NormalDist().inv_cdf(0.5 + level / 2), level
+
+
+def prepare_request(series, periods, confidence_level, season_length):
+    """Validated (y, periods, season_length) of a forecast request."""
+    y = np.asarray(series, dtype=np.float64)
+    if y.ndim != 1 or len(y) < 3:
+        raise ValueError("Need at least 3 data points")
+    if not np.isfinite(y).all():
+        raise ValueError("Data must only contain numbers")
+    periods = int(periods)
+    if periods < 1:
+        raise ValueError("periods must be positive")
+    _z_score(confidence_level)
+    season_length = int(season_length)
+    if season_length < 1:
+        raise ValueError("season_length must be positive")
+    return y, periods, season_length
+
+
+def forecast(series, periods=12, model="Simple Exponential Smoothing", confidence_level=95,
+             season_length=DEFAULT_SEASON_LENGTH, metric=BACKTEST_METRIC):
+    """
+    Forecast `periods` steps ahead with the named model.
+
+    Returns a dict with the point forecast, lower/upper prediction interval
+    at confidence_level (percent or fraction), the model actually used and
+    its fitted parameters. Holt-Winters needs two full seasons and falls
+    back to Holt on shorter series. model="Auto" picks the model with the
+    lowest backtest `metric` (see auto_forecast).
+    """
+    y, periods, season_length = prepare_request(series, periods, confidence_level, season_length)
+    kind = resolve_model(model)
+    if kind == "auto":
+        return auto_forecast(y, periods, confidence_level, season_length, metric)
+
+    start = time.perf_counter()
+    result = forecast_from_fit(fit_model(kind, y, season_length), y, periods, confidence_level)
+    result["fit_ms"] = round((time.perf_counter() - start) * 1000, 2)
+    return result
+
+
+if __name__ == "__main__":
+    # python -m services.forecasting_service [n_points] - fit time per model on a synthetic series
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 3000
+    rng = np.random.default_rng(0)
+    t = np.arange(n)
+    y = 1000 + 2 * t + 50 * np.sin(2 * np.pi * t / 12) + rng.normal(0, 10, n)
+    fit_ms = {}
+    for name in ["Simple Exponential Smoothing", "Holt", "Holt-Winters", "ARIMA", "Prophet", "Auto"]:
+        result = forecast(y, 12, name)
+        fit_ms[name] = result["fit_ms"]
+        print(f"{name:30s} {result['fit_ms']:8.2f} ms  next={result['forecast'][0]:.1f} "
+              f"[{result['lower'][0]:.1f}, {result['upper'][0]:.1f}]  {result['params']}")
+    print({kind: score.get(BACKTEST_METRIC) for kind, score in result["selection"]["scores"].items()})
+    # Holt-Winters fits in milliseconds only while its errors stay in lfilter
+    if n <= 3000 and fit_ms["Holt-Winters"] > 50:
+        sys.exit(f"Holt-Winters took {fit_ms['Holt-Winters']} ms on {n} points (budget 50 ms)")
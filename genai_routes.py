@@ -1,11 +1,10 @@
 from flask import Blueprint, request, jsonify
-import os
-import requests
+from services.llm_service import GROK_API_KEY, completion_cache, complete
 
 genai_bp = Blueprint("genai", __name__)
 
-GROK_API_KEY = os.getenv("XAI_API_KEY")
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
+# Sampling temperature for generated content (part of the completion cache key)
+CONTENT_TEMPERATURE = 0.7
 
 
 @genai_bp.route("/generate-content", methods=["POST"])
@@ -13,6 +12,8 @@ def generate_content():
     data = request.json
     prompt = data.get("prompt", "")
     provider = data.get("provider", "Grok")
+    # "cache": false asks for a fresh generation
+    use_cache = data.get("cache", True) is not False
 
     # Check if API key is available
     if not GROK_API_KEY:
@@ -23,52 +24,62 @@ def generate_content():
         })
 
     try:
-        response = requests.post(
-            "https://api.x.ai/v1/chat/completions",  # Corrected endpoint for xAI/Grok
-            headers={
-                "Authorization": f"Bearer {GROK_API_KEY}",
-                "Content-Type": "application/json"
-            },
-            json={
-                "model": "grok-beta",
-                "messages": [{"role": "user", "content": prompt}],
-                "temperature": 0.7
-            },
-            timeout=10
-        )
+        # Completion cache, then the gateway (concurrency and rate limits,
+        # queue cap, identical prompts coalesced), so slow generations can't
+        # tie up every Flask thread
+        result, tier = complete(prompt, "Grok", temperature=CONTENT_TEMPERATURE, use_cache=use_cache)
 
-        if response.status_code == 200:
-            result = response.json()
+        if "error" not in result:
             # Extract content from Grok API response
             content = result.get("choices", [{}])[0].get("message", {}).get("content", "")
-            return jsonify({
+            response = {
                 "content": content,
                 "provider": provider,
                 "status": "success"
-            })
-        else:
-            return jsonify({
-                "status": "api_error",
-                "message": f"Grok API returned status {response.status_code}",
-                "content": f"Content suggestions for: {prompt[:100]}..."
-            })
+            }
+            if tier:
+                response["cache"] = tier
+            return jsonify(response)
+        return _error_response(result, prompt)
 
-    except requests.exceptions.ConnectionError as e:
+    except Exception as e:
+        return jsonify({
+            "status": "error",
+            "message": str(e),
+            "content": f"Content ideas for: {prompt[:100]}..."
+        })
+
+
+def _error_response(result, prompt):
+    """Fallback content for a failed generation, by the kind of failure."""
+    status = result.get("status", "error")
+    if status == "api_error":
+        return jsonify({
+            "status": "api_error",
+            "message": f"Grok {result['error']}",
+            "content": f"Content suggestions for: {prompt[:100]}..."
+        })
+    if status == "connection_error":
         return jsonify({
             "status": "connection_error",
             "message": "Cannot connect to Grok API. Please check your internet connection.",
             "content": f"Suggested content for: {prompt[:100]}... (using fallback)"
         })
-    except requests.exceptions.Timeout:
+    if status == "timeout":
         return jsonify({
             "status": "timeout",
             "message": "Grok API request timed out",
             "content": f"Quick response for: {prompt[:100]}..."
         })
-    except Exception as e:
-        return jsonify({
-            "status": "error",
-            "message": str(e),
-            "content": f"Content ideas for: {prompt[:100]}..."
-        })
+    return jsonify({
+        "status": status,
+        "message": result["error"],
+        "content": f"Content ideas for: {prompt[:100]}..."
+    })
+
 
+@genai_bp.route("/llm-cache", methods=["GET"])
+def llm_cache_stats():
+    if completion_cache is None:
+        return jsonify({"enabled": False})
+    return jsonify({"enabled": True, **completion_cache.stats()})
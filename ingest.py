@@ -0,0 +1,182 @@
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+# Lead schema shared with training
+from services.preprocessing import NUMERIC_COLS
+
+# Rows held in memory at once while reading an upload
+INGEST_CHUNK_SIZE = 50000
+
+
+class Schema:
+    """
+    Expected columns of an uploaded CSV.
+
+    numeric columns are parsed as float64, date columns as datetime64 and
+    categorical columns become pandas categoricals. A categorical column can
+    carry its known vocabulary (e.g. the encoder's categories); values
+    outside it are counted, and rejected too when reading in strict mode.
+    """
+
+    def __init__(self, numeric=(), categorical=None, dates=(), required=None):
+        self.numeric = list(numeric)
+        self.categorical = dict(categorical or {})
+        self.dates = list(dates)
+        self.required = list(required) if required is not None else self.columns
+
+    @property
+    def columns(self):
+        return self.numeric + list(self.categorical) + self.dates
+
+    def to_dict(self):
+        return {"numeric": self.numeric, "categorical": self.categorical,
+                "dates": self.dates, "required": self.required}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data.get("numeric", ()), data.get("categorical"), data.get("dates", ()), data.get("required"))
+
+    @classmethod
+    def from_pipeline(cls, pipeline):
+        """Numeric columns and category vocabularies of a fitted lead/churn pipeline."""
+        numeric, categorical = [], {}
+        for name, transformer, columns in pipeline.named_steps["preprocessor"].transformers_:
+            if name == "num":
+                numeric = [str(c) for c in columns]
+            elif name == "cat":
+                for col, values in zip(columns, transformer.categories_):
+                    categorical[str(col)] = [str(v) for v in values if not pd.isna(v)]
+        return cls(numeric, categorical)
+
+
+def lead_schema(model=None):
+    """Schema of the lead model, or just the numeric lead columns if no model is loaded."""
+    if model is not None:
+        try:
+            return Schema.from_pipeline(model)
+        except (AttributeError, KeyError):
+            pass
+    return Schema(NUMERIC_COLS, required=[])
+
+
+def _parse_numbers(raw):
+    """float64 version of a text column, NaN where a value doesn't parse."""
+    try:
+        # Fast path for clean columns
+        return raw.astype(np.float64)
+    except (TypeError, ValueError):
+        pass
+    # Parse each distinct value once rather than every row
+    codes, uniques = pd.factorize(raw)
+    numbers = pd.to_numeric(pd.Series(uniques, dtype=object), errors="coerce").to_numpy(np.float64)
+    values = numbers[codes]
+    values[codes < 0] = np.nan
+    return pd.Series(values, index=raw.index)
+
+
+def _coerce_chunk(chunk, schema, strict, errors, unknown):
+    """Type one raw (all-object) chunk in place of its columns, recording bad rows."""
+    required = set(schema.required)
+
+    for col in schema.numeric + schema.dates:
+        if col not in chunk.columns:
+            continue
+        raw = chunk[col]
+        raw_missing = raw.isna().to_numpy()
+        if col in schema.numeric:
+            chunk[col] = _parse_numbers(raw)
+            message = "Invalid numeric value"
+        else:
+            chunk[col] = pd.to_datetime(raw, errors="coerce")
+            message = "Invalid date"
+        for i in chunk.index[chunk[col].isna().to_numpy() & ~raw_missing]:
+            errors.setdefault(i, f"{message} for '{col}': {raw[i]!r}")
+        if col in required:
+            for i in chunk.index[raw_missing]:
+                errors.setdefault(i, f"Missing value for '{col}'")
+
+    for col, vocabulary in schema.categorical.items():
+        if col not in chunk.columns:
+            continue
+        # Missing categories are fine - the encoder has a slot for them
+        raw = chunk[col]
+        if vocabulary:
+            outside = raw.notna() & ~raw.isin(vocabulary)
+            if outside.any():
+                unknown[col] = unknown.get(col, 0) + int(outside.sum())
+                if strict:
+                    for i in chunk.index[outside]:
+                        errors.setdefault(i, f"Unknown value for '{col}': {raw[i]!r}")
+            # Known values first, so their codes are the same in every chunk
+            extra = sorted(set(raw[outside].unique()))
+            chunk[col] = pd.Categorical(raw, categories=list(vocabulary) + extra)
+        else:
+            chunk[col] = raw.astype("category")
+    return chunk
+
+
+def read_chunks(source, schema, sep=",", chunk_size=INGEST_CHUNK_SIZE, strict=False,
+                keep_extra=False, stats=None):
+    """
+    Read a CSV (path or file object) chunk by chunk against a schema.
+
+    Yields (frame, errors) per chunk: frame holds the typed rows (indexed by
+    row number in the file, invalid rows included) and errors maps the row
+    number of every invalid row to a message. Only one chunk is in memory at
+    a time. Raises ValueError from the first chunk if required columns are
+    missing, before reading the rest of the file. Pass a dict as stats to
+    get running totals (rows, invalid_rows, unknown values per column).
+    """
+    stats = stats if stats is not None else {}
+    stats.update({"rows": 0, "invalid_rows": 0, "unknown": {}, "chunks": 0})
+
+    reader = pd.read_csv(source, sep=sep, dtype=object, chunksize=chunk_size)
+    offset = 0
+    for chunk in reader:
+        if offset == 0:
+            missing = [col for col in schema.required if col not in chunk.columns]
+            if missing:
+                raise ValueError(f"Missing columns: {', '.join(missing)}")
+
+        chunk.index = pd.RangeIndex(offset, offset + len(chunk))
+        if not keep_extra:
+            chunk = chunk[[col for col in chunk.columns if col in schema.columns]]
+
+        errors = {}
+        chunk = _coerce_chunk(chunk.copy(), schema, strict, errors, stats["unknown"])
+
+        offset += len(chunk)
+        stats["rows"] = offset
+        stats["invalid_rows"] += len(errors)
+        stats["chunks"] += 1
+        yield chunk, errors
+
+
+def validate_file(source, schema, sep=",", chunk_size=INGEST_CHUNK_SIZE, strict=False, max_errors=100):
+    """Stream a whole file through the schema; returns stats plus the first max_errors row errors."""
+    stats = {}
+    sample = []
+    for _, errors in read_chunks(source, schema, sep, chunk_size, strict, stats=stats):
+        for row, message in errors.items():
+            if len(sample) < max_errors:
+                sample.append({"row": int(row), "error": message})
+    stats["errors"] = sample
+    return stats
+
+
+if __name__ == "__main__":
+    # python -m services.ingest leads.csv [sep] - validates against the lead model schema
+    if len(sys.argv) not in (2, 3):
+        print("Usage: python -m services.ingest <leads.csv> [sep]")
+        sys.exit(1)
+    from services.model_registry import registry
+
+    lead_model = registry.get("lead")
+    start = time.perf_counter()
+    result = validate_file(sys.argv[1], lead_schema(lead_model.model if lead_model else None),
+                           sep=sys.argv[2] if len(sys.argv) == 3 else ",")
+    result["seconds"] = round(time.perf_counter() - start, 3)
+    print(result)
@@ -1,7 +1,18 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import requests
-import io
+import csv
+import os
+import sys
+import tempfile
+
+# Uploads are checked with the backend's streaming reader when it's importable
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'backend'))
+try:
+    from services.ingest import Schema, read_chunks
+except ImportError:
+    Schema = None
 
 st.title('🎯 Lead Scoring')
 
@@ -13,41 +24,136 @@ The system will analyze each lead and provide a score from 0-1 indicating conver
 # File upload
 uploaded_file = st.file_uploader("Choose a CSV file", type=['csv'])
 
+SCORE_CHUNK_SIZE = 50000
+
+
+def detect_separator(file):
+    """Sniff the delimiter from the start of the file (bank exports use ';')."""
+    sample = file.read(64 * 1024).decode('utf-8', 'replace')
+    file.seek(0)
+    try:
+        return csv.Sniffer().sniff(sample, delimiters=',;\t').delimiter
+    except csv.Error:
+        return ','
+
+
+def validate_upload(file, sep):
+    """
+    Check the upload against the lead model's columns and categories, chunk
+    by chunk, before it is sent for scoring. Returns (stats, error_rows) or
+    None when validation isn't available.
+    """
+    if Schema is None:
+        return None
+    try:
+        schema = Schema.from_dict(requests.get('http://localhost:5000/api/lead-schema', timeout=10).json())
+    except (requests.exceptions.RequestException, ValueError):
+        return None
+
+    progress = st.progress(0.0, text='Validating leads...')
+    stats = {}
+    error_rows = []
+    try:
+        for _, errors in read_chunks(file, schema, sep=sep, chunk_size=SCORE_CHUNK_SIZE, stats=stats):
+            for row, message in errors.items():
+                if len(error_rows) < 100:
+                    error_rows.append({'row': row, 'error': message})
+            progress.progress(min(file.tell() / max(file.size, 1), 1.0),
+                              text=f"Validated {stats['rows']:,} leads, {stats['invalid_rows']:,} invalid")
+    finally:
+        file.seek(0)
+        progress.empty()
+    return stats, error_rows
+
+
 if uploaded_file is not None:
     try:
-        # Read the uploaded file
-        df = pd.read_csv(uploaded_file)
+        # Only parse a preview - the full file is streamed to the API as-is
+        sep = detect_separator(uploaded_file)
+        preview_df = pd.read_csv(uploaded_file, sep=sep, nrows=5)
+        uploaded_file.seek(0)
 
-        st.success(f"Successfully loaded {len(df)} leads")
+        st.success(f"Uploaded {uploaded_file.name} ({uploaded_file.size / 1e6:.1f} MB)")
 
         # Display first few rows
         st.subheader('Preview of Uploaded Data')
-        st.dataframe(df.head())
+        st.dataframe(preview_df)
 
         # Score leads button
         if st.button('Score Leads', type='primary'):
-            with st.spinner('Scoring leads... This may take a moment.'):
+            try:
+                validation = validate_upload(uploaded_file, sep)
+            except ValueError as e:
+                st.error(f"The file doesn't match the lead model: {e}")
+                st.stop()
+
+            if validation is not None:
+                stats, validation_errors = validation
+                if stats['invalid_rows']:
+                    st.warning(f"{stats['invalid_rows']:,} of {stats['rows']:,} leads failed validation and won't be scored")
+                    st.dataframe(pd.DataFrame(validation_errors))
+                for col, count in stats['unknown'].items():
+                    st.info(f"{count:,} leads have a '{col}' value the model hasn't seen")
 
-                # Prepare data for API
-                # Convert DataFrame to dict for JSON serialization
-                leads_data = df.to_dict('records')
+            with st.spinner('Scoring leads... This may take a moment.'):
 
                 try:
-                    # Call the backend API
+                    # Stream the file to the backend and read the scored rows
+                    # back chunk by chunk, so neither side holds the whole file
                     response = requests.post(
-                        'http://localhost:5000/api/predict',
-                        json={'leads': leads_data},
-                        timeout=30
+                        'http://localhost:5000/api/predict-stream',
+                        params={'sep': sep},
+                        data=uploaded_file,
+                        headers={'Content-Type': 'text/csv'},
+                        stream=True,
+                        timeout=(10, 120)
                     )
 
                     if response.status_code == 200:
-                        result = response.json()
-
-                        if 'predictions' in result:
-                            # Add scores to dataframe
-                            df['lead_score'] = result['predictions']
-
-                            st.success('Lead scoring completed!')
+                        response.raw.decode_content = True
+                        scored_file = tempfile.NamedTemporaryFile(
+                            mode='w', suffix='.csv', delete=False, newline=''
+                        )
+
+                        # Running summary statistics over all chunks
+                        total_leads = 0
+                        scored_leads = 0
+                        score_sum = 0.0
+                        high_score_leads = 0
+                        low_score_leads = 0
+                        bins = [0, 0.2, 0.4, 0.6, 0.8, 1.0]
+                        bin_counts = np.zeros(len(bins) - 1, dtype=int)
+                        top_leads = pd.DataFrame()
+                        error_rows = []
+
+                        header = True
+                        for chunk in pd.read_csv(response.raw, sep=sep, chunksize=SCORE_CHUNK_SIZE):
+                            total_leads += len(chunk)
+
+                            scores = chunk['lead_score'].dropna()
+                            scored_leads += len(scores)
+                            score_sum += scores.sum()
+                            high_score_leads += int((scores > 0.7).sum())
+                            low_score_leads += int((scores < 0.3).sum())
+                            bin_counts += np.histogram(scores, bins=bins)[0]
+                            top_leads = pd.concat([top_leads, chunk.nlargest(10, 'lead_score')]).nlargest(10, 'lead_score')
+
+                            if len(error_rows) < 100:
+                                errors = chunk.loc[chunk['error'].notna(), ['error']]
+                                error_rows.extend(errors.reset_index().to_dict('records'))
+
+                            chunk.to_csv(scored_file, index=False, header=header)
+                            header = False
+
+                        scored_file.close()
+
+                        if total_leads:
+                            st.success(f'Lead scoring completed for {total_leads:,} leads!')
+
+                            # Rows the API could not score have no lead_score
+                            if scored_leads < total_leads:
+                                st.warning(f"{total_leads - scored_leads:,} leads could not be scored")
+                                st.dataframe(pd.DataFrame(error_rows[:100]))
 
                             # Display results
                             st.subheader('Scoring Results')
@@ -55,37 +161,36 @@ if uploaded_file is not None:
                             # Summary statistics
                             col1, col2, col3 = st.columns(3)
                             with col1:
-                                st.metric("Average Score", f"{df['lead_score'].mean():.3f}")
+                                avg_score = score_sum / scored_leads if scored_leads else 0.0
+                                st.metric("Average Score", f"{avg_score:.3f}")
                             with col2:
-                                high_score_leads = (df['lead_score'] > 0.7).sum()
                                 st.metric("High Score Leads (>0.7)", high_score_leads)
                             with col3:
-                                low_score_leads = (df['lead_score'] < 0.3).sum()
                                 st.metric("Low Score Leads (<0.3)", low_score_leads)
 
                             # Score distribution
                             st.subheader('Score Distribution')
-                            score_bins = pd.cut(df['lead_score'], bins=[0, 0.2, 0.4, 0.6, 0.8, 1.0],
-                                              labels=['0-0.2', '0.2-0.4', '0.4-0.6', '0.6-0.8', '0.8-1.0'])
-                            score_dist = score_bins.value_counts().sort_index()
+                            score_dist = pd.Series(
+                                bin_counts,
+                                index=['0-0.2', '0.2-0.4', '0.4-0.6', '0.6-0.8', '0.8-1.0']
+                            )
                             st.bar_chart(score_dist)
 
                             # Top scored leads
                             st.subheader('Top 10 Highest Scored Leads')
-                            top_leads = df.nlargest(10, 'lead_score')[['lead_score']]
-                            st.dataframe(top_leads)
+                            st.dataframe(top_leads[['lead_score']])
 
                             # Download results
-                            csv = df.to_csv(index=False)
-                            st.download_button(
-                                label="Download Scored Leads CSV",
-                                data=csv,
-                                file_name='scored_leads.csv',
-                                mime='text/csv'
-                            )
+                            with open(scored_file.name, 'rb') as f:
+                                st.download_button(
+                                    label="Download Scored Leads CSV",
+                                    data=f,
+                                    file_name='scored_leads.csv',
+                                    mime='text/csv'
+                                )
 
                         else:
-                            st.error("Invalid response format from API")
+                            st.error("The scoring API returned no leads")
 
                     else:
                         st.error(f"API request failed with status code {response.status_code}")
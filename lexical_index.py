@@ -0,0 +1,132 @@
+import json
+import os
+import re
+
+import numpy as np
+
+# BM25 term-frequency saturation and length normalisation
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Words, plus identifiers that keep their inner - . / _ (SKU-1042, v2.1, ACME/EU)
+TOKEN_PATTERN = re.compile(r"\w+(?:[-./]\w+)*")
+
+
+def tokenize(text):
+    """Lower-case terms; a compound like sku-1042 is indexed whole and as its parts."""
+    terms = []
+    for token in TOKEN_PATTERN.findall(str(text).lower()):
+        terms.append(token)
+        if not token.isalnum():
+            terms += [part for part in re.split(r"[-./]", token) if part]
+    return terms
+
+
+def is_identifier(term):
+    """SKU codes, order numbers and the like: terms with digits or inner punctuation."""
+    return any(c.isdigit() for c in term) or not term.replace("_", "").isalnum()
+
+
+class LexicalIndex:
+    """
+    Inverted index with BM25 scoring over the store's documents (rows line
+    up with the store). Postings are kept per term as row and term-frequency
+    arrays, so scoring a query touches only the rows containing its terms.
+    """
+
+    def __init__(self, postings, lengths):
+        self.postings = postings
+        self.lengths = lengths
+        self.avg_length = float(lengths.mean()) if len(lengths) else 0.0
+
+    @classmethod
+    def build(cls, documents):
+        rows_by_term = {}
+        lengths = np.empty(len(documents), dtype=np.float32)
+        for row, text in enumerate(documents):
+            terms = tokenize(text)
+            lengths[row] = len(terms)
+            counts = {}
+            for term in terms:
+                counts[term] = counts.get(term, 0) + 1
+            for term, count in counts.items():
+                rows_by_term.setdefault(term, []).append((row, count))
+        postings = {}
+        for term, pairs in rows_by_term.items():
+            pairs = np.array(pairs, dtype=np.int64)
+            postings[term] = (pairs[:, 0], pairs[:, 1].astype(np.float32))
+        return cls(postings, lengths)
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def idf(self, term):
+        df = len(self.postings[term][0]) if term in self.postings else 0
+        return float(np.log(1 + (len(self) - df + 0.5) / (df + 0.5)))
+
+    def scores(self, terms):
+        """BM25 score of every row for the query terms (zero where none occur)."""
+        scores = np.zeros(len(self), dtype=np.float32)
+        for term in dict.fromkeys(terms):
+            if term not in self.postings:
+                continue
+            rows, tf = self.postings[term]
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[rows] / max(self.avg_length, 1e-9))
+            scores[rows] += self.idf(term) * tf * (BM25_K1 + 1) / (tf + norm)
+        return scores
+
+    def rows_with_all(self, terms):
+        """Rows that contain every one of the terms."""
+        rows = None
+        for term in dict.fromkeys(terms):
+            found = self.postings[term][0] if term in self.postings else np.empty(0, dtype=np.int64)
+            rows = found if rows is None else np.intersect1d(rows, found, assume_unique=True)
+        return rows if rows is not None else np.empty(0, dtype=np.int64)
+
+    @staticmethod
+    def top(scores, k):
+        """(rows, scores) of the k highest positive scores, best first."""
+        candidates = np.flatnonzero(scores > 0)
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return candidates, scores[candidates]
+
+    def search(self, terms, k, allowed=None, required=None):
+        """
+        (rows, scores) of the k best BM25 matches for terms, best first.
+        allowed is a boolean row mask; required are terms a row must all contain.
+        """
+        scores = self.scores(terms)
+        if required:
+            mask = np.zeros(len(self), dtype=bool)
+            mask[self.rows_with_all(required)] = True
+            scores[~mask] = 0
+        if allowed is not None:
+            scores[~allowed] = 0
+        return self.top(scores, k)
+
+    def save(self, directory):
+        terms = list(self.postings)
+        counts = np.array([len(self.postings[t][0]) for t in terms], dtype=np.int64)
+        np.savez(os.path.join(directory, "lexical.npz"),
+                 lengths=self.lengths,
+                 offsets=np.concatenate([[0], np.cumsum(counts)]),
+                 rows=np.concatenate([self.postings[t][0] for t in terms]) if terms else np.empty(0, dtype=np.int64),
+                 tf=np.concatenate([self.postings[t][1] for t in terms]) if terms else np.empty(0, dtype=np.float32),
+                 terms=np.array(json.dumps(terms)))
+
+    @classmethod
+    def load(cls, directory, n):
+        """The saved index, or None if there is none for n rows."""
+        path = os.path.join(directory, "lexical.npz")
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as saved:
+            if len(saved["lengths"]) != n:
+                return None
+            terms = json.loads(str(saved["terms"]))
+            offsets, rows, tf = saved["offsets"], saved["rows"], saved["tf"]
+            postings = {term: (rows[offsets[i]:offsets[i + 1]], tf[offsets[i]:offsets[i + 1]])
+                        for i, term in enumerate(terms)}
+            return cls(postings, saved["lengths"])
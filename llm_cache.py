@@ -0,0 +1,243 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+# Completions kept in memory (0 disables the cache) and how long they stay valid
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "2000"))
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", "86400"))
+# SQLite file behind the memory tier ("" keeps the cache in memory only),
+# bounded to LLM_CACHE_DISK_SIZE completions
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join(os.path.dirname(__file__), "..", "llm_cache.db"))
+LLM_CACHE_DISK_SIZE = int(os.getenv("LLM_CACHE_DISK_SIZE", "100000"))
+# Cosine similarity at which a temperature-0 prompt reuses the answer to a
+# cached one (0 disables the semantic tier), and prompts it remembers
+LLM_SEMANTIC_THRESHOLD = float(os.getenv("LLM_SEMANTIC_THRESHOLD", "0.95"))
+LLM_SEMANTIC_SIZE = int(os.getenv("LLM_SEMANTIC_SIZE", "5000"))
+
+
+def normalize_prompt(prompt):
+    """Whitespace-collapsed prompt, so re-indented templates share entries."""
+    return " ".join(str(prompt).split())
+
+
+def completion_key(provider, model, temperature, prompt, system=None):
+    payload = json.dumps([provider, model, temperature, normalize_prompt(system or ""), normalize_prompt(prompt)])
+    return hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+
+
+def _embed(text):
+    """Embedding of text from the RAG encoder (loaded on first use)."""
+    from services.rag_service import encode
+    return encode([text])[0]
+
+
+class CompletionCache:
+    """
+    Two-tier cache of provider responses, thread-safe.
+
+    Exact tier: completion_key() -> response, an LRU in memory in front of
+    an SQLite table, both with a TTL and a size bound (least recently used
+    rows are pruned from disk). Every temperature is cached there, since
+    the temperature is part of the key.
+
+    Semantic tier, temperature 0 only: a ring of prompt embeddings per
+    (provider, model, system prompt). A prompt whose embedding is within
+    semantic_threshold (cosine) of a remembered one gets that prompt's exact
+    entry. Only the variable prompt is embedded, never the system prompt, so
+    a long shared instruction doesn't make every question look alike. It
+    lives in memory and refills as prompts are answered.
+    """
+
+    def __init__(self, maxsize=LLM_CACHE_SIZE, ttl=LLM_CACHE_TTL, path=LLM_CACHE_PATH,
+                 disk_size=LLM_CACHE_DISK_SIZE, semantic_threshold=LLM_SEMANTIC_THRESHOLD,
+                 semantic_size=LLM_SEMANTIC_SIZE):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.disk_size = disk_size
+        self.semantic_threshold = semantic_threshold
+        self.semantic_size = semantic_size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expired = 0
+        self.saved_tokens = 0
+        self.saved_ms = 0.0
+
+        # Semantic ring: slot -> (embedding, group, exact key, expiry)
+        self._vectors = None
+        self._groups = np.zeros(semantic_size, dtype=np.int64)
+        self._expires = np.zeros(semantic_size)
+        self._keys = [None] * semantic_size
+        self._next_slot = 0
+        self._semantic_ok = semantic_threshold > 0 and semantic_size > 0
+
+        self.db = None
+        if path:
+            self.db = sqlite3.connect(path, check_same_thread=False)
+            self.db.execute("CREATE TABLE IF NOT EXISTS completions "
+                            "(key TEXT PRIMARY KEY, entry TEXT, expires REAL, accessed REAL)")
+            self.db.execute("CREATE INDEX IF NOT EXISTS completions_accessed ON completions (accessed)")
+            self.db.commit()
+            self._disk_writes = 0
+
+    def _remember(self, key, entry):
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def _lookup(self, key, now):
+        """Live exact entry for key from memory or disk, or None. Caller holds the lock."""
+        entry = self.entries.get(key)
+        if entry is not None:
+            if entry["expires"] >= now:
+                self.entries.move_to_end(key)
+                return entry
+            del self.entries[key]
+            self.expired += 1
+        if self.db is None:
+            return None
+        row = self.db.execute("SELECT entry, expires FROM completions WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        if row[1] < now:
+            self.db.execute("DELETE FROM completions WHERE key = ?", (key,))
+            self.db.commit()
+            self.expired += 1
+            return None
+        self.db.execute("UPDATE completions SET accessed = ? WHERE key = ?", (now, key))
+        self.db.commit()
+        entry = json.loads(row[0])
+        self._remember(key, entry)
+        self.disk_hits += 1
+        return entry
+
+    def _group(self, provider, model, system):
+        digest = hashlib.blake2b(json.dumps([provider, model, normalize_prompt(system or "")]).encode(),
+                                 digest_size=8).digest()
+        return int.from_bytes(digest, "little", signed=True)
+
+    def _embedding(self, prompt):
+        if not self._semantic_ok:
+            return None
+        try:
+            embedding = _embed(normalize_prompt(prompt))
+            return embedding / max(float(np.linalg.norm(embedding)), 1e-12)
+        except ImportError as e:
+            print(f"Semantic LLM cache disabled, no encoder: {e}")
+            self._semantic_ok = False
+            return None
+
+    def get(self, provider, model, temperature, prompt, system=None):
+        """(response, tier) with tier "exact" or "semantic", or (None, None)."""
+        key = completion_key(provider, model, temperature, prompt, system)
+        with self.lock:
+            entry = self._lookup(key, time.time())
+            if entry is not None:
+                return self._hit(entry, "exact")
+            searchable = temperature == 0 and self._vectors is not None
+
+        # Encoded outside the lock; it takes milliseconds
+        embedding = self._embedding(prompt) if searchable else None
+        if embedding is not None:
+            with self.lock:
+                now = time.time()
+                live = (self._groups == self._group(provider, model, system)) & (self._expires >= now)
+                if live.any():
+                    similarity = np.where(live, self._vectors @ embedding, -np.inf)
+                    slot = int(np.argmax(similarity))
+                    if similarity[slot] >= self.semantic_threshold:
+                        entry = self._lookup(self._keys[slot], now)
+                        if entry is not None:
+                            return self._hit(entry, "semantic")
+        with self.lock:
+            self.misses += 1
+        return None, None
+
+    def _hit(self, entry, tier):
+        if tier == "semantic":
+            self.semantic_hits += 1
+        else:
+            self.hits += 1
+        self.saved_tokens += entry.get("tokens", 0)
+        self.saved_ms += entry.get("latency_ms", 0.0)
+        return entry["response"], tier
+
+    def set(self, provider, model, temperature, prompt, response, system=None, latency_ms=0.0):
+        """Cache a successful response; latency_ms (what the call took) feeds the saved_ms metric."""
+        key = completion_key(provider, model, temperature, prompt, system)
+        usage = response.get("usage") if isinstance(response, dict) else None
+        tokens = usage.get("total_tokens", 0) if isinstance(usage, dict) else 0
+        now = time.time()
+        entry = {"response": response, "expires": now + self.ttl, "tokens": tokens if isinstance(tokens, int) else 0,
+                 "latency_ms": round(latency_ms, 1)}
+        embedding = self._embedding(prompt) if temperature == 0 else None
+
+        with self.lock:
+            self._remember(key, entry)
+            if self.db is not None:
+                self.db.execute("INSERT OR REPLACE INTO completions VALUES (?, ?, ?, ?)",
+                                (key, json.dumps(entry), entry["expires"], now))
+                self._disk_writes += 1
+                # Prune expired and least recently used rows now and then, not on every
+                # write, so the table can run up to 100 rows over disk_size in between
+                if self._disk_writes % 100 == 0:
+                    self._prune(now)
+                self.db.commit()
+            if embedding is not None:
+                if self._vectors is None:
+                    self._vectors = np.zeros((self.semantic_size, len(embedding)), dtype=np.float32)
+                slot = self._next_slot % self.semantic_size
+                self._vectors[slot] = embedding
+                self._groups[slot] = self._group(provider, model, system)
+                self._expires[slot] = entry["expires"]
+                self._keys[slot] = key
+                self._next_slot += 1
+
+    def _prune(self, now):
+        self.db.execute("DELETE FROM completions WHERE expires < ?", (now,))
+        excess = self.db.execute("SELECT COUNT(*) FROM completions").fetchone()[0] - self.disk_size
+        if excess > 0:
+            self.db.execute("DELETE FROM completions WHERE key IN "
+                            "(SELECT key FROM completions ORDER BY accessed LIMIT ?)", (excess,))
+            self.evictions += excess
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self._expires[:] = 0
+            self._keys = [None] * self.semantic_size
+            if self.db is not None:
+                self.db.execute("DELETE FROM completions")
+                self.db.commit()
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.semantic_hits + self.misses
+            return {
+                "size": len(self.entries),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expired": self.expired,
+                "hit_rate": (self.hits + self.semantic_hits) / lookups if lookups else 0.0,
+                "saved_tokens": self.saved_tokens,
+                "saved_ms": round(self.saved_ms, 1),
+                "persistent": self.db is not None,
+                "semantic": self._semantic_ok,
+            }
@@ -0,0 +1,295 @@
+import argparse
+import json
+import os
+import random
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+
+# Seconds to establish a connection, and to wait for the provider's response
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "3.05"))
+LLM_READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT", "10"))
+# Retries on 429/5xx and failed connections, with jittered exponential backoff
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_BACKOFF = float(os.getenv("LLM_BACKOFF", "0.5"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "8"))
+# Keep-alive connections held open per provider
+LLM_POOL_SIZE = int(os.getenv("LLM_POOL_SIZE", "10"))
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Endpoint and API key variable per provider (plus "verify", a CA bundle, for private endpoints)
+PROVIDERS = {
+    "Grok": {"url": os.getenv("XAI_API_URL", "https://api.x.ai/v1/chat/completions"), "key_env": "XAI_API_KEY"},
+    "Doodle": {"url": os.getenv("DOODLE_API_URL", "https://api.doodle.com/v1/chat"), "key_env": "GOOGLE_API_KEY"},
+}
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+def get_session(provider):
+    """
+    The provider's shared Session. Its pool keeps up to LLM_POOL_SIZE
+    connections alive between calls, so only the first call (or one after
+    the provider closed the connection) pays the TCP and TLS handshake.
+    """
+    session = _sessions.get(provider)
+    if session is not None:
+        return session
+    with _sessions_lock:
+        if provider not in _sessions:
+            if provider not in PROVIDERS:
+                raise ValueError(f"Unknown provider: {provider}")
+            config = PROVIDERS[provider]
+            session = requests.Session()
+            # Retries are done in post(), which also retries POSTs and adds jitter
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=LLM_POOL_SIZE, max_retries=0)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers.update({
+                "Authorization": f"Bearer {os.getenv(config['key_env'])}",
+                "Content-Type": "application/json"
+            })
+            _sessions[provider] = session
+            _stats[provider] = {"calls": 0, "retries": 0, "failures": 0}
+        return _sessions[provider]
+
+
+def close_sessions():
+    """Close every pooled connection (sessions are recreated on next use)."""
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+
+
+def _backoff(attempt, retry_after=None):
+    """Full-jitter exponential backoff, or the provider's Retry-After when it sent one."""
+    if retry_after is not None:
+        return min(retry_after, LLM_BACKOFF_MAX)
+    return random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF * 2 ** attempt))
+
+
+def _retry_after(response):
+    try:
+        return float(response.headers["Retry-After"])
+    except (KeyError, ValueError):
+        return None
+
+
+def _count(provider, counter):
+    with _stats_lock:
+        _stats[provider][counter] += 1
+
+
+def post(provider, payload, timeout=None):
+    """
+    POST payload to the provider over its pooled session and return the
+    Response. 429 and 5xx responses and failed connections are retried up
+    to LLM_MAX_RETRIES times; after that the last response is returned, or
+    the connection error raised. A read timeout is raised straight away
+    rather than retried, so a slow provider can't hold a caller for several
+    timeouts in a row.
+    """
+    session = get_session(provider)
+    config = PROVIDERS[provider]
+    timeout = timeout or (LLM_CONNECT_TIMEOUT, LLM_READ_TIMEOUT)
+    # Per request, since REQUESTS_CA_BUNDLE would override a session-level CA bundle
+    verify = {"verify": config["verify"]} if "verify" in config else {}
+    _count(provider, "calls")
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        retry_after = None
+        try:
+            response = session.post(config["url"], json=payload, timeout=timeout, **verify)
+        except (requests.exceptions.ConnectionError, requests.exceptions.ConnectTimeout):
+            if attempt == LLM_MAX_RETRIES:
+                _count(provider, "failures")
+                raise
+        except requests.exceptions.Timeout:
+            _count(provider, "failures")
+            raise
+        else:
+            if response.status_code not in RETRY_STATUSES or attempt == LLM_MAX_RETRIES:
+                if response.status_code >= 400:
+                    _count(provider, "failures")
+                return response
+            retry_after = _retry_after(response)
+        _count(provider, "retries")
+        time.sleep(_backoff(attempt, retry_after))
+
+
+def stats():
+    """Calls, retries and failed calls per provider since startup."""
+    with _stats_lock:
+        return {provider: dict(counts) for provider, counts in _stats.items()}
+
+
+class MockProvider(BaseHTTPRequestHandler):
+    """
+    Chat completions endpoint for benchmarks. Answers after latency_ms,
+    fails every fail_every-th call with a 503 and, like a real provider,
+    answers 429 to calls beyond max_inflight running at once.
+    """
+
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out as separate writes; without this Nagle's
+    # algorithm holds the body until the client's delayed ACK (~40 ms)
+    disable_nagle_algorithm = True
+    latency_ms = 0
+    fail_every = 0
+    max_inflight = 0
+    count = 0
+    inflight = 0
+    throttled = 0
+    count_lock = threading.Lock()
+
+    @classmethod
+    def reset(cls, latency_ms=0, fail_every=0, max_inflight=0):
+        cls.latency_ms, cls.fail_every, cls.max_inflight = latency_ms, fail_every, max_inflight
+        cls.count = cls.inflight = cls.throttled = 0
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        cls = type(self)
+        with cls.count_lock:
+            cls.count += 1
+            fail = self.fail_every and cls.count % self.fail_every == 0
+            throttle = self.max_inflight and cls.inflight >= self.max_inflight
+            if throttle:
+                cls.throttled += 1
+            else:
+                cls.inflight += 1
+        if throttle:
+            self._reply(429, {"error": "rate limited"}, {"Retry-After": "1"})
+            return
+        try:
+            time.sleep(self.latency_ms / 1000)
+            prompt = json.loads(body)["messages"][0]["content"] if body else ""
+            if fail:
+                self._reply(503, {"error": "overloaded"})
+            else:
+                tokens = len(prompt) // 4 + 8
+                self._reply(200, {"choices": [{"message": {"content": f"echo: {prompt[:40]}"}}],
+                                  "usage": {"total_tokens": tokens}})
+        finally:
+            with cls.count_lock:
+                cls.inflight -= 1
+
+    def _reply(self, status, reply, headers=None):
+        data = json.dumps(reply).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+def _self_signed_cert(directory):
+    """(cert, key) paths for localhost, made with the openssl CLI."""
+    cert, key = os.path.join(directory, "cert.pem"), os.path.join(directory, "key.pem")
+    subprocess.run(["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+                    "-subj", "/CN=localhost", "-addext", "subjectAltName=DNS:localhost,IP:127.0.0.1",
+                    "-keyout", key, "-out", cert], check=True, capture_output=True)
+    return cert, key
+
+
+class _MockServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Room for a few hundred clients connecting at once
+    request_queue_size = 1024
+
+
+def start_mock_provider(directory, tls=True):
+    """
+    Serve MockProvider on a free local port in a background thread; with tls
+    over HTTPS with a self-signed cert written to directory. Returns
+    (server, url, verify), verify being what requests needs to trust it.
+    """
+    server = _MockServer(("127.0.0.1", 0), MockProvider)
+    scheme, verify = "http", True
+    if tls:
+        import ssl
+        cert, key = _self_signed_cert(directory)
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(cert, key)
+        server.socket = context.wrap_socket(server.socket, server_side=True)
+        scheme, verify = "https", cert
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"{scheme}://localhost:{server.server_address[1]}/v1/chat/completions", verify
+
+
+def benchmark(calls=200, threads=8, latency_ms=0, tls=True, fail_every=0):
+    """
+    Latency per call against a local mock provider: a new connection per
+    call (requests.post, as before) versus the pooled session, called
+    sequentially and from several threads. With tls the mock serves HTTPS,
+    so each new connection also pays a TLS handshake as it would with a real
+    provider.
+    """
+    MockProvider.reset(latency_ms, fail_every)
+    tmp_dir = tempfile.mkdtemp()
+    server, url, verify = start_mock_provider(tmp_dir, tls)
+    PROVIDERS["Mock"] = {"url": url, "key_env": "MOCK_API_KEY", "verify": verify}
+    payload = {"model": "mock", "messages": [{"role": "user", "content": "Write a tagline"}]}
+
+    def unpooled(_):
+        start = time.perf_counter()
+        requests.post(url, json=payload, timeout=(LLM_CONNECT_TIMEOUT, LLM_READ_TIMEOUT), verify=verify)
+        return (time.perf_counter() - start) * 1000
+
+    def pooled(_):
+        start = time.perf_counter()
+        post("Mock", payload)
+        return (time.perf_counter() - start) * 1000
+
+    report = []
+    try:
+        for label, call in (("new connection per call", unpooled), ("pooled keep-alive", pooled)):
+            for workers in (1, threads):
+                start = time.perf_counter()
+                with ThreadPoolExecutor(workers) as pool:
+                    latencies = list(pool.map(call, range(calls)))
+                report.append({
+                    "client": label,
+                    "threads": workers,
+                    "p50_ms": round(float(np.percentile(latencies, 50)), 2),
+                    "p95_ms": round(float(np.percentile(latencies, 95)), 2),
+                    "calls_per_s": round(calls / (time.perf_counter() - start), 1),
+                })
+        report.append({"pooled_stats": stats().get("Mock")})
+    finally:
+        server.shutdown()
+        server.server_close()
+        close_sessions()
+        PROVIDERS.pop("Mock", None)
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare per-call and pooled LLM connections against a mock provider")
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--latency-ms", type=float, default=0, help="Time the mock provider takes to answer")
+    parser.add_argument("--no-tls", action="store_true", help="Serve plain HTTP instead of HTTPS")
+    parser.add_argument("--fail-every", type=int, default=0, help="Answer every n-th call with a 503")
+    args = parser.parse_args()
+
+    for row in benchmark(args.calls, args.threads, args.latency_ms, not args.no_tls, args.fail_every):
+        print(row)
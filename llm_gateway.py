@@ -0,0 +1,292 @@
+import argparse
+import asyncio
+import concurrent.futures
+import functools
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from services import llm_client
+
+# Upstream calls running at once per provider (keep within LLM_POOL_SIZE)
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+# Provider rate limits, requests and tokens per minute (0 = unlimited);
+# LLM_RPM_GROK, LLM_TPM_DOODLE etc. override them per provider
+LLM_RPM = int(os.getenv("LLM_RPM", "0"))
+LLM_TPM = int(os.getenv("LLM_TPM", "0"))
+# Requests allowed to wait per provider; beyond that new ones are turned away
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "100"))
+# Longest a sync caller waits for its answer, in seconds (no longer than the
+# provider read timeout a direct call used to block for)
+LLM_GATEWAY_TIMEOUT = float(os.getenv("LLM_GATEWAY_TIMEOUT", "10"))
+# Completion tokens assumed when reserving TPM, until the response reports its usage
+LLM_COMPLETION_TOKENS = 256
+
+
+def _provider_limit(name, provider, default):
+    return int(os.getenv(f"{name}_{provider.upper()}", default))
+
+
+def estimate_tokens(prompt):
+    """Rough prompt tokens (4 characters each) plus the completion allowance."""
+    return len(prompt) // 4 + LLM_COMPLETION_TOKENS
+
+
+class RateLimiter:
+    """
+    Token bucket holding per_minute tokens, refilled continuously; callers
+    are served first come, first served. per_minute 0 means unlimited.
+    """
+
+    def __init__(self, per_minute):
+        self.per_minute = per_minute
+        self.available = float(per_minute)
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.available = min(self.per_minute, self.available + (now - self.updated) * self.per_minute / 60)
+        self.updated = now
+
+    async def acquire(self, amount=1):
+        if not self.per_minute:
+            return
+        amount = min(amount, self.per_minute)
+        async with self.lock:
+            self._refill()
+            while self.available < amount:
+                await asyncio.sleep((amount - self.available) * 60 / self.per_minute)
+                self._refill()
+            self.available -= amount
+
+    def adjust(self, amount):
+        """Give back (or take, if negative) tokens once the real usage is known."""
+        if self.per_minute:
+            self._refill()
+            self.available = min(self.per_minute, self.available + amount)
+
+
+class _Provider:
+    """Limits and upstream threads of one provider; created on the gateway's loop."""
+
+    def __init__(self, provider, concurrency, rpm, tpm):
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.requests = RateLimiter(_provider_limit("LLM_RPM", provider, rpm))
+        self.tokens = RateLimiter(_provider_limit("LLM_TPM", provider, tpm))
+        self.executor = ThreadPoolExecutor(concurrency, thread_name_prefix=f"llm-{provider.lower()}")
+        self.waiting = 0
+
+
+class LLMGateway:
+    """
+    Asyncio front for LLM calls, running its event loop in a background
+    thread. Per provider it lets at most concurrency calls go upstream at
+    once, paces them to the RPM and TPM limits, and turns requests away
+    once max_queue are already waiting instead of piling up blocked request
+    threads. Identical prompts in flight share one upstream call, and a
+    call every caller has given up on is dropped before it goes upstream.
+
+    upstream(prompt, provider, **options) makes the actual call and returns
+    the provider's response dict or {"error": ...} (llm_service.generate_response).
+    It runs on a per-provider thread pool over the pooled llm_client
+    sessions. ask() is the blocking adapter for Flask routes; async code can
+    await complete() on the gateway's loop.
+    """
+
+    def __init__(self, upstream, concurrency=LLM_MAX_CONCURRENCY, rpm=LLM_RPM, tpm=LLM_TPM,
+                 max_queue=LLM_MAX_QUEUE):
+        self.upstream = upstream
+        self.concurrency = concurrency
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_queue = max_queue
+        self._providers = {}
+        self._inflight = {}
+        self._waiters = {}
+        self._loop = None
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "coalesced": 0, "upstream_calls": 0, "rejected": 0, "timeouts": 0,
+                       "abandoned": 0}
+
+    def _count(self, counter):
+        with self._lock:
+            self._stats[counter] += 1
+
+    def loop(self):
+        """The gateway's event loop, started on first use."""
+        if self._loop is None:
+            with self._lock:
+                if self._loop is None:
+                    loop = asyncio.new_event_loop()
+                    threading.Thread(target=loop.run_forever, name="llm-gateway", daemon=True).start()
+                    self._loop = loop
+        return self._loop
+
+    async def complete(self, prompt, provider="Grok", **options):
+        """
+        The provider's response dict for prompt, sharing an identical call
+        (same prompt and options, e.g. system and temperature) already in flight.
+        """
+        self._count("requests")
+        key = (provider, prompt, tuple(sorted(options.items())))
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._call(prompt, provider, options))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self._count("coalesced")
+        self._waiters[key] = self._waiters.get(key, 0) + 1
+        try:
+            # A caller that gives up must not cancel the call for the others sharing it
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            # ...but once nobody is left waiting, the call is dropped
+            if self._waiters[key] == 1 and not task.done():
+                task.cancel()
+                self._count("abandoned")
+            raise
+        finally:
+            self._waiters[key] -= 1
+            if not self._waiters[key]:
+                del self._waiters[key]
+
+    async def _call(self, prompt, provider, options):
+        if provider not in llm_client.PROVIDERS:
+            return {"error": f"Unknown provider: {provider}"}
+        state = self._providers.get(provider)
+        if state is None:
+            state = self._providers[provider] = _Provider(provider, self.concurrency, self.rpm, self.tpm)
+        if state.waiting >= self.max_queue:
+            self._count("rejected")
+            return {"error": f"LLM gateway busy: {state.waiting} requests already waiting for {provider}",
+                    "status": "busy"}
+
+        estimate = estimate_tokens(prompt + (options.get("system") or ""))
+        state.waiting += 1
+        try:
+            await state.requests.acquire()
+            await state.tokens.acquire(estimate)
+            await state.semaphore.acquire()
+        finally:
+            state.waiting -= 1
+        loop = asyncio.get_running_loop()
+        try:
+            upstream = state.executor.submit(functools.partial(self.upstream, prompt, provider, **options))
+        except BaseException:
+            state.semaphore.release()
+            raise
+        # The slot is held until the thread is done, even if this call is
+        # cancelled meanwhile (a request already sent can't be called back)
+        upstream.add_done_callback(lambda _: loop.call_soon_threadsafe(state.semaphore.release))
+        self._count("upstream_calls")
+        response = await asyncio.wrap_future(upstream)
+
+        usage = response.get("usage") if isinstance(response, dict) else None
+        if isinstance(usage, dict) and isinstance(usage.get("total_tokens"), int):
+            state.tokens.adjust(estimate - usage["total_tokens"])
+        return response
+
+    def ask(self, prompt, provider="Grok", timeout=LLM_GATEWAY_TIMEOUT, **options):
+        """Blocking complete() for request threads; {"error": ...} after timeout seconds."""
+        future = asyncio.run_coroutine_threadsafe(self.complete(prompt, provider, **options), self.loop())
+        try:
+            return future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            self._count("timeouts")
+            return {"error": f"LLM request timed out after {timeout:g}s", "status": "timeout"}
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats["waiting"] = {provider: state.waiting for provider, state in list(self._providers.items())}
+        return stats
+
+
+def benchmark(n_requests=200, distinct=50, latency_ms=200, capacity=8, concurrency=LLM_MAX_CONCURRENCY,
+              max_queue=LLM_MAX_QUEUE):
+    """
+    n_requests concurrent ask_llm-style calls (distinct different prompts)
+    from as many threads against a local fake provider that takes
+    latency_ms per call and answers 429 beyond capacity calls at once.
+    Compares calling generate_response directly, as ask_llm did, with going
+    through a gateway. Latency percentiles are over the calls that got an
+    answer; errors counts the rest (429s after retries, or turned away).
+    """
+    from services import llm_service
+
+    tmp_dir = tempfile.mkdtemp()
+    server, url, verify = llm_client.start_mock_provider(tmp_dir, tls=False)
+    grok = llm_client.PROVIDERS["Grok"]
+    llm_client.PROVIDERS["Grok"] = {"url": url, "key_env": "XAI_API_KEY", "verify": verify}
+    llm_client.close_sessions()
+    prompts = [f"Write a tagline for campaign {i % distinct}" for i in range(n_requests)]
+
+    def run(call):
+        llm_client.MockProvider.reset(latency_ms, max_inflight=capacity)
+        barrier = threading.Barrier(n_requests)
+        latencies = [0.0] * n_requests
+        errors = [False] * n_requests
+
+        def worker(i):
+            barrier.wait()
+            start = time.perf_counter()
+            response = call(prompts[i])
+            latencies[i] = (time.perf_counter() - start) * 1000
+            errors[i] = not isinstance(response, dict) or "error" in response
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(n_requests)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        answered = [latency for latency, error in zip(latencies, errors) if not error] or [0.0]
+        return {
+            "answered_per_s": round((n_requests - sum(errors)) / elapsed, 1),
+            "p50_ms": round(float(np.percentile(answered, 50)), 1),
+            "p95_ms": round(float(np.percentile(answered, 95)), 1),
+            "p99_ms": round(float(np.percentile(answered, 99)), 1),
+            "max_ms": round(max(answered), 1),
+            "errors": sum(errors),
+            "upstream_calls": llm_client.MockProvider.count,
+            "throttled_429": llm_client.MockProvider.throttled,
+        }
+
+    gateway = LLMGateway(llm_service.generate_response, concurrency=concurrency, max_queue=max_queue)
+    try:
+        report = [
+            {"path": "direct", **run(lambda prompt: llm_service.generate_response(prompt, "Grok"))},
+            {"path": "gateway", **run(lambda prompt: gateway.ask(prompt, "Grok"))},
+            {"gateway_stats": gateway.stats()},
+        ]
+    finally:
+        llm_client.PROVIDERS["Grok"] = grok
+        llm_client.close_sessions()
+        server.shutdown()
+        server.server_close()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrent LLM calls against a fake provider, with and without the gateway")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--distinct", type=int, default=50, help="Different prompts among the requests")
+    parser.add_argument("--latency-ms", type=float, default=200, help="Time the fake provider takes per call")
+    parser.add_argument("--capacity", type=int, default=8, help="Calls the fake provider serves at once before 429s")
+    parser.add_argument("--concurrency", type=int, default=LLM_MAX_CONCURRENCY)
+    parser.add_argument("--max-queue", type=int, default=LLM_MAX_QUEUE)
+    args = parser.parse_args()
+
+    for row in benchmark(args.requests, args.distinct, args.latency_ms, args.capacity, args.concurrency,
+                         args.max_queue):
+        print(row)
@@ -1,59 +1,108 @@
 import os
+import time
+
 import requests
 
+from services import llm_client, llm_gateway
+from services.llm_cache import LLM_CACHE_SIZE, CompletionCache
+
 GROK_API_KEY = os.getenv("XAI_API_KEY")
 DOODLE_API_KEY = os.getenv("GOOGLE_API_KEY")
+GROK_MODEL = "grok-beta"
+# Model behind each provider, part of the completion cache key
+MODELS = {"Grok": GROK_MODEL, "Doodle": None}
 
-def call_grok(prompt):
+def grok_request(prompt, temperature=None, system=None):
+    """
+    POST a chat completion to Grok through the pooled client and return the
+    Response. Raises requests exceptions for connection errors and timeouts.
+    """
+    messages = [{"role": "user", "content": prompt}]
+    if system:
+        messages.insert(0, {"role": "system", "content": system})
+    payload = {
+        "model": GROK_MODEL,
+        "messages": messages
+    }
+    if temperature is not None:
+        payload["temperature"] = temperature
+    return llm_client.post("Grok", payload)
+
+def call_grok(prompt, system=None, temperature=None):
+    """Response dict, or {"error", "status"} with status api_error, connection_error, timeout or error."""
     try:
-        response = requests.post(
-            "https://api.x.ai/v1/chat/completions",
-            headers={
-                "Authorization": f"Bearer {GROK_API_KEY}",
-                "Content-Type": "application/json"
-            },
-            json={
-                "model": "grok-beta",
-                "messages": [{"role": "user", "content": prompt}]
-            },
-            timeout=10
-        )
+        response = grok_request(prompt, temperature, system)
         if response.status_code == 200:
             return response.json()
         else:
-            return {"error": f"API returned {response.status_code}"}
+            return {"error": f"API returned {response.status_code}", "status": "api_error"}
+    except requests.exceptions.ConnectionError as e:
+        return {"error": str(e), "status": "connection_error"}
+    except requests.exceptions.Timeout as e:
+        return {"error": str(e), "status": "timeout"}
     except Exception as e:
-        return {"error": str(e)}
+        return {"error": str(e), "status": "error"}
 
-def call_doodle(prompt):
+def call_doodle(prompt, system=None, temperature=None):
     try:
-        response = requests.post(
-            "https://api.doodle.com/v1/chat",
-            headers={
-                "Authorization": f"Bearer {DOODLE_API_KEY}",
-                "Content-Type": "application/json"
-            },
-            json={"prompt": prompt},
-            timeout=10
-        )
-        return response.json()
+        payload = {"prompt": f"{system}\n\n{prompt}" if system else prompt}
+        if temperature is not None:
+            payload["temperature"] = temperature
+        response = llm_client.post("Doodle", payload)
+        if response.status_code == 200:
+            return response.json()
+        else:
+            return {"error": f"API returned {response.status_code}", "status": "api_error"}
+    except requests.exceptions.ConnectionError as e:
+        return {"error": str(e), "status": "connection_error"}
+    except requests.exceptions.Timeout as e:
+        return {"error": str(e), "status": "timeout"}
     except Exception as e:
-        return {"error": str(e)}
+        return {"error": str(e), "status": "error"}
 
-def generate_response(prompt, provider):
+def generate_response(prompt, provider, system=None, temperature=None):
     if provider == "Grok":
-        return call_grok(prompt)
+        return call_grok(prompt, system, temperature)
     elif provider == "Doodle":
-        return call_doodle(prompt)
+        return call_doodle(prompt, system, temperature)
     else:
         return {"error": f"Unknown provider: {provider}"}
 
-def ask_llm(prompt, provider="Grok"):
+# ask_llm calls share one gateway: per-provider concurrency and rate limits,
+# identical prompts in flight coalesced
+gateway = llm_gateway.LLMGateway(generate_response)
+
+# Provider responses cached by provider, model, temperature and prompt
+# (None when LLM_CACHE_SIZE is 0)
+completion_cache = CompletionCache() if LLM_CACHE_SIZE > 0 else None
+
+def complete(prompt, provider="Grok", system=None, temperature=None, use_cache=True):
+    """
+    (response dict, cache tier) for prompt: from the completion cache when an
+    equivalent prompt was answered before (tier "exact" or "semantic"),
+    otherwise through the gateway (tier None). use_cache=False skips the
+    lookup but still caches the fresh answer. Successful responses are
+    cached; errors never are.
+    """
+    model = MODELS.get(provider)
+    if completion_cache is not None and use_cache:
+        cached, tier = completion_cache.get(provider, model, temperature, prompt, system)
+        if cached is not None:
+            return cached, tier
+
+    start = time.perf_counter()
+    response = gateway.ask(prompt, provider, system=system, temperature=temperature)
+    if completion_cache is not None and isinstance(response, dict) and "error" not in response:
+        completion_cache.set(provider, model, temperature, prompt, response, system,
+                             latency_ms=(time.perf_counter() - start) * 1000)
+    return response, None
+
+def ask_llm(prompt, provider="Grok", system=None, temperature=None):
     """
     Ask LLM a question using the specified provider.
     Returns the response text or error message.
     """
-    response = generate_response(prompt, provider)
+    response, _ = complete(prompt, provider, system, temperature)
     
     if isinstance(response, dict) and "error" in response:
         return response["error"]
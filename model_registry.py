@@ -0,0 +1,202 @@
+import hashlib
+import os
+import threading
+import time
+from datetime import datetime
+
+import joblib
+
+from services.compiled_model import CompiledModel
+
+# Directory holding the model files, and how often (seconds) loaded models
+# are checked for changes on disk; 0 turns hot-reload off
+MODEL_DIR = os.getenv("MODEL_DIR", os.path.join(os.path.dirname(__file__), "..", "models"))
+MODEL_RELOAD_INTERVAL = float(os.getenv("MODEL_RELOAD_INTERVAL", "5"))
+
+MODEL_FILES = {
+    "lead": "lead_model.pkl",
+    "churn": "churn_model.pkl",
+    "sales": "trained_model.pkl",
+}
+
+
+def file_checksum(path, length=16):
+    """Short SHA-256 of a file."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()[:length]
+
+
+class LoadedModel:
+    """
+    One immutable version of a model. Requests hold on to the snapshot they
+    started with, so a reload never changes a model mid-request.
+    """
+
+    def __init__(self, name, path):
+        stat = os.stat(path)
+        self.name = name
+        self.path = path
+        self.mtime = stat.st_mtime
+        self.size = stat.st_size
+        self.checksum = file_checksum(path)
+        self.version = f"{datetime.fromtimestamp(self.mtime):%Y%m%d%H%M%S}-{self.checksum[:8]}"
+        self.loaded_at = time.time()
+        self.model = joblib.load(path)
+
+        # Linear pipelines also get the pandas-free scorer
+        try:
+            self.compiled = CompiledModel.from_pipeline(self.model)
+        except Exception:
+            self.compiled = None
+
+    def changed_on_disk(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return False
+        return stat.st_mtime != self.mtime or stat.st_size != self.size
+
+    def info(self):
+        return {
+            "name": self.name,
+            "loaded": True,
+            "version": self.version,
+            "checksum": self.checksum,
+            "path": self.path,
+            "loaded_at": self.loaded_at,
+            "compiled": self.compiled is not None,
+        }
+
+
+class ModelRegistry:
+    """
+    Loads named models lazily from model_dir and swaps in new versions when
+    their files change.
+
+    get() returns the current LoadedModel (or None if the model can't be
+    loaded). A background thread polls the files of models that have been
+    loaded; a changed file is loaded off to the side and only swapped in
+    once it has deserialised cleanly, so a half-written file never replaces
+    a working model.
+    """
+
+    def __init__(self, model_dir=MODEL_DIR, files=None, reload_interval=MODEL_RELOAD_INTERVAL):
+        self.model_dir = model_dir
+        self.files = dict(files or MODEL_FILES)
+        self.reload_interval = reload_interval
+        self.models = {}
+        self.errors = {}
+        self.failed_stats = {}
+        self.listeners = {}
+        self.lock = threading.Lock()
+        self.load_locks = {name: threading.Lock() for name in self.files}
+        self.watcher = None
+
+    def path(self, name):
+        return os.path.join(self.model_dir, self.files[name])
+
+    def get(self, name):
+        """Current version of a model, loading it on first use."""
+        loaded = self.models.get(name)
+        if loaded is not None:
+            return loaded
+        if name not in self.files:
+            return None
+
+        # Only one thread deserialises a given model; the rest wait for it
+        with self.load_locks[name]:
+            loaded = self.models.get(name)
+            if loaded is None:
+                loaded = self._load(name)
+                if loaded is not None:
+                    self._swap(name, loaded)
+        self._start_watcher()
+        return loaded
+
+    def _load(self, name):
+        path = self.path(name)
+        try:
+            stat = os.stat(path)
+            file_stat = (stat.st_mtime, stat.st_size)
+        except OSError:
+            file_stat = None
+        # Don't retry a broken file on every request, only once it changes
+        if name in self.failed_stats and self.failed_stats[name] == file_stat:
+            return None
+
+        try:
+            loaded = LoadedModel(name, path)
+        except Exception as e:
+            self.errors[name] = str(e)
+            self.failed_stats[name] = file_stat
+            print(f"Error loading {name} model from {path}: {e}")
+            return None
+        self.errors.pop(name, None)
+        self.failed_stats.pop(name, None)
+        print(f"Loaded {name} model version {loaded.version}")
+        return loaded
+
+    def _swap(self, name, loaded):
+        with self.lock:
+            self.models[name] = loaded
+            listeners = list(self.listeners.get(name, []))
+        for callback in listeners:
+            try:
+                callback(loaded)
+            except Exception as e:
+                print(f"Model listener for {name} failed: {e}")
+
+    def subscribe(self, name, callback):
+        """Call callback(loaded_model) whenever a new version of `name` is swapped in."""
+        with self.lock:
+            self.listeners.setdefault(name, []).append(callback)
+
+    def reload_changed(self):
+        """Reload every loaded model whose file changed. Returns the names swapped."""
+        swapped = []
+        for name, current in list(self.models.items()):
+            if not current.changed_on_disk():
+                continue
+            with self.load_locks[name]:
+                if self.models.get(name) is not current:
+                    continue
+                loaded = self._load(name)
+                if loaded is None:
+                    continue
+                if loaded.checksum == current.checksum:
+                    # Touched but not changed - keep the current version
+                    current.mtime, current.size = loaded.mtime, loaded.size
+                    continue
+                self._swap(name, loaded)
+                swapped.append(name)
+        return swapped
+
+    def _start_watcher(self):
+        if self.reload_interval <= 0 or self.watcher is not None:
+            return
+        with self.lock:
+            if self.watcher is not None:
+                return
+            self.watcher = threading.Thread(target=self._watch, name="model-registry", daemon=True)
+            self.watcher.start()
+
+    def _watch(self):
+        while True:
+            time.sleep(self.reload_interval)
+            try:
+                self.reload_changed()
+            except Exception as e:
+                print(f"Model reload check failed: {e}")
+
+    def status(self):
+        return {
+            name: (self.models[name].info() if name in self.models
+                   else {"name": name, "loaded": False, "error": self.errors.get(name)})
+            for name in self.files
+        }
+
+
+registry = ModelRegistry()
@@ -1,78 +1,293 @@
+import argparse
+import itertools
+import json
+import os
+import tempfile
+import time
+
 import joblib
-from sklearn.model_selection import train_test_split
-from sklearn.linear_model import LogisticRegression
+import numpy as np
+from joblib import Parallel, delayed
+from sklearn.model_selection import StratifiedKFold, train_test_split
+from sklearn.linear_model import LogisticRegression, SGDClassifier
 from sklearn.pipeline import Pipeline
-from sklearn.metrics import classification_report
+from sklearn.metrics import classification_report, f1_score, roc_auc_score
+from sklearn.utils.class_weight import compute_sample_weight
 import pandas as pd
-from sklearn.compose import ColumnTransformer
-from sklearn.preprocessing import OneHotEncoder, StandardScaler
-
-def load_data(filepath):
-    # Use dtype='object' to avoid StringDtype issues
-    df = pd.read_csv(filepath, sep=';', dtype=object)
-    
-    # Safely convert target
-    df['y'] = pd.to_numeric(df['y'].map({'yes': 1, 'no': 0}), errors='coerce').astype('int64')
-    
-    # Convert numeric columns to float, keeping as object for string columns
-    numeric_cols = ['age', 'balance', 'day_of_week', 'duration', 'campaign', 'pdays', 'previous', 'emp.var.rate', 'cons.price.idx', 'cons.conf.idx', 'euribor3m', 'nr.employed']
-    for col in numeric_cols:
-        if col in df.columns:
-            df[col] = pd.to_numeric(df[col], errors='coerce')
-    
-    return df
-
-
-def create_preprocessor(df):
 
-    X = df.drop("y", axis=1)
+# Same preprocessing module the serving code uses; keeps the one-hot
+# design matrix sparse (CSR) from the encoder into the classifier
+from services.preprocessing import create_preprocessor, iter_data, load_data
+
+DATA_PATH = "C:/ai/MarketMind/data/bank_marketing.csv"
+MODEL_PATH = "C:/ai/MarketMind/backend/models/lead_model.pkl"
 
-    # Identify numeric and categorical columns more carefully
-    numeric_cols = X.select_dtypes(include=['int64', 'int32', 'float64', 'float32']).columns
-    categorical_cols = X.select_dtypes(include=['object']).columns
+# Search space. Encoder options change the design matrix, so they are fitted
+# once per fold; regularisation and class weights only change the classifier
+# and are tried on the cached matrices.
+GRID = {
+    "C": [0.01, 0.1, 1.0, 10.0],
+    "class_weight": ["balanced", None],
+    "min_frequency": [None, 0.05],
+}
 
-    preprocessor = ColumnTransformer(
-        transformers=[
-            ("num", StandardScaler(), numeric_cols),
-            ("cat", OneHotEncoder(handle_unknown="ignore", sparse_output=False), categorical_cols)
-        ],
-        remainder='drop'
+def create_classifier(C=1.0, class_weight='balanced'):
+    return LogisticRegression(
+        C=C,
+        class_weight=class_weight,
+        max_iter=1000,
+        random_state=42
     )
 
-    return preprocessor
 
-# Load dataset
-df = load_data("C:/ai/MarketMind/data/bank_marketing.csv")
+def create_online_classifier(classifier, alpha=1e-4, eta0=1e-4):
+    """
+    SGDClassifier that carries on from a fitted linear classifier.
 
-X = df.drop("y", axis=1)
-y = df["y"]
+    The weights are copied over, so the first predictions are identical to
+    the batch model; partial_fit then nudges them with a small constant step.
+    An SGDClassifier passed in is reused as-is.
+    """
+    if isinstance(classifier, SGDClassifier):
+        return classifier
 
-# Split
-X_train, X_test, y_train, y_test = train_test_split(
-    X, y, test_size=0.2, random_state=42
-)
+    online = SGDClassifier(loss="log_loss", alpha=alpha, learning_rate="constant",
+                           eta0=eta0, random_state=42)
+    # A zero-weight step sets up classes_ and the coefficient shapes
+    n_features = classifier.coef_.shape[1]
+    online.partial_fit(np.zeros((1, n_features)), classifier.classes_[:1],
+                       classes=classifier.classes_, sample_weight=[0.0])
+    online.coef_ = classifier.coef_.copy()
+    online.intercept_ = classifier.intercept_.copy()
+    # partial_fit doesn't accept class_weight='balanced'; remember it and
+    # balance each mini-batch with sample weights instead
+    online.balanced_batches_ = getattr(classifier, "class_weight", None) == "balanced"
+    return online
 
-# Create preprocessor
-preprocessor = create_preprocessor(df)
 
-# 🔥 Professional ML Pipeline
-pipeline = Pipeline(steps=[
-    ("preprocessor", preprocessor),
-    ("classifier", LogisticRegression(
-        class_weight='balanced',
-        max_iter=1000,
-        random_state=42
-    ))
-])
+def save_model(pipeline, model_path):
+    """
+    Write the pipeline atomically: dump next to the target, then rename over
+    it, so the model registry never reads a half-written file.
+    """
+    directory = os.path.dirname(os.path.abspath(model_path))
+    fd, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=directory)
+    os.close(fd)
+    try:
+        joblib.dump(pipeline, tmp_path)
+        os.replace(tmp_path, model_path)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+
+
+def build_candidates(search="grid", n_iter=20, random_state=42):
+    """List of parameter dicts to evaluate."""
+    if search == "grid":
+        keys = list(GRID)
+        return [dict(zip(keys, values)) for values in itertools.product(*GRID.values())]
+
+    rng = np.random.default_rng(random_state)
+    return [
+        {
+            "C": float(10 ** rng.uniform(-3, 2)),
+            "class_weight": GRID["class_weight"][rng.integers(len(GRID["class_weight"]))],
+            "min_frequency": GRID["min_frequency"][rng.integers(len(GRID["min_frequency"]))],
+        }
+        for _ in range(n_iter)
+    ]
+
+
+def evaluate_fold(X, y, train_idx, val_idx, min_frequency, candidates, deadline):
+    """
+    Fit the preprocessor for one fold and encoder setting once, then fit
+    and score every classifier candidate on the cached matrices.
+    """
+    start = time.perf_counter()
+    preprocessor = create_preprocessor(X, min_frequency=min_frequency)
+    X_train = preprocessor.fit_transform(X.iloc[train_idx])
+    X_val = preprocessor.transform(X.iloc[val_idx])
+    preprocess_time = time.perf_counter() - start
+
+    rows = []
+    for candidate_id, candidate in candidates:
+        if time.time() > deadline:
+            break
+        classifier = create_classifier(candidate["C"], candidate["class_weight"])
+
+        start = time.perf_counter()
+        classifier.fit(X_train, y.iloc[train_idx])
+        fit_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        scores = classifier.predict_proba(X_val)[:, 1]
+        score_time = time.perf_counter() - start
+
+        rows.append({
+            "candidate": candidate_id,
+            "roc_auc": roc_auc_score(y.iloc[val_idx], scores),
+            "f1": f1_score(y.iloc[val_idx], scores > 0.5),
+            "fit_time": fit_time,
+            "score_time": score_time,
+            "preprocess_time": preprocess_time,
+        })
+    return rows
+
+
+def search(X, y, candidates, folds=5, n_jobs=-1, budget=None, random_state=42):
+    """
+    Cross-validate every candidate, running (encoder setting, fold) tasks in
+    parallel. Candidates not reached before the wall-clock budget runs out
+    are skipped. Returns one row per candidate, best roc_auc first.
+    """
+    deadline = time.time() + budget if budget else float("inf")
+    splits = list(StratifiedKFold(folds, shuffle=True, random_state=random_state).split(X, y))
+
+    by_encoder = {}
+    for candidate_id, candidate in enumerate(candidates):
+        by_encoder.setdefault(candidate["min_frequency"], []).append((candidate_id, candidate))
+
+    tasks = [
+        delayed(evaluate_fold)(X, y, train_idx, val_idx, min_frequency, group, deadline)
+        for min_frequency, group in by_encoder.items()
+        for train_idx, val_idx in splits
+    ]
+    fold_rows = [row for rows in Parallel(n_jobs=n_jobs)(tasks) for row in rows]
+    if not fold_rows:
+        return pd.DataFrame()
+
+    results = (
+        pd.DataFrame(fold_rows)
+        .groupby("candidate")
+        .agg(
+            roc_auc=("roc_auc", "mean"),
+            roc_auc_std=("roc_auc", "std"),
+            f1=("f1", "mean"),
+            fit_time=("fit_time", "mean"),
+            score_time=("score_time", "mean"),
+            preprocess_time=("preprocess_time", "mean"),
+            folds=("roc_auc", "size"),
+        )
+    )
+    params = pd.DataFrame(candidates).loc[results.index].astype(object)
+    results = pd.concat([params, results], axis=1).reset_index()
+    # Only rank candidates that were scored on every fold
+    results["complete"] = results["folds"] == folds
+    return results.sort_values(["complete", "roc_auc"], ascending=False).reset_index(drop=True)
+
+
+def train(data_path=DATA_PATH, model_path=MODEL_PATH, results_path="search_results.csv",
+          search_type="grid", n_iter=20, folds=5, n_jobs=-1, budget=None):
+    df = load_data(data_path)
+
+    X = df.drop("y", axis=1)
+    y = df["y"]
+
+    # Split
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y, test_size=0.2, random_state=42
+    )
+
+    start = time.perf_counter()
+    candidates = build_candidates(search_type, n_iter)
+    results = search(X_train, y_train, candidates, folds=folds, n_jobs=n_jobs, budget=budget)
+    print(f"Evaluated {len(results)} of {len(candidates)} candidates in {time.perf_counter() - start:.1f}s")
+
+    if results.empty:
+        raise RuntimeError("No candidate finished within the time budget")
+    results.to_csv(results_path, index=False)
+    print(f"Search results written to {results_path}")
+
+    best = candidates[results.loc[0, "candidate"]]
+    print(f"Best candidate: {json.dumps(best)} (CV ROC AUC {results.loc[0, 'roc_auc']:.4f})")
+
+    # 🔥 Professional ML Pipeline
+    pipeline = Pipeline(steps=[
+        ("preprocessor", create_preprocessor(df, min_frequency=best["min_frequency"])),
+        ("classifier", create_classifier(best["C"], best["class_weight"]))
+    ])
+
+    # Train
+    pipeline.fit(X_train, y_train)
+
+    # Evaluate
+    preds = pipeline.predict(X_test)
+    print(classification_report(y_test, preds))
+    print(f"Holdout ROC AUC: {roc_auc_score(y_test, pipeline.predict_proba(X_test)[:, 1]):.4f}")
+
+    # Save full pipeline (IMPORTANT)
+    save_model(pipeline, model_path)
+
+    print("Professional ML pipeline trained and saved.")
+    return pipeline, results
+
+
+def train_incremental(outcomes_path, model_path=MODEL_PATH, batch_size=1000, checkpoint_every=10,
+                      alpha=1e-4, eta0=1e-4):
+    """
+    Update the served model from a file of new lead outcomes (bank_marketing
+    format, 'y' = yes/no) without retraining from scratch.
+
+    The fitted preprocessor is kept frozen, so the feature space doesn't
+    change; only the classifier learns, one mini-batch at a time. The model
+    file is rewritten every `checkpoint_every` batches and once at the end,
+    and the model registry picks each checkpoint up on its next poll.
+    """
+    pipeline = joblib.load(model_path)
+    preprocessor = pipeline.named_steps["preprocessor"]
+    classifier = create_online_classifier(pipeline.named_steps["classifier"], alpha, eta0)
+    pipeline.steps[-1] = ("classifier", classifier)
+    balanced = getattr(classifier, "balanced_batches_", False)
+
+    start = time.perf_counter()
+    batches = rows = checkpoints = 0
+    for batch in iter_data(outcomes_path, chunk_size=batch_size):
+        if batch.empty:
+            continue
+        X = preprocessor.transform(batch.drop("y", axis=1))
+        y = batch["y"].to_numpy()
+
+        sample_weight = compute_sample_weight("balanced", y) if balanced else None
+        classifier.partial_fit(X, y, sample_weight=sample_weight)
+        batches += 1
+        rows += len(batch)
+
+        if batches % checkpoint_every == 0:
+            save_model(pipeline, model_path)
+            checkpoints += 1
+            print(f"Checkpoint {checkpoints}: {rows} outcomes in {batches} batches")
+
+    if batches % checkpoint_every:
+        save_model(pipeline, model_path)
+        checkpoints += 1
 
-# Train
-pipeline.fit(X_train, y_train)
+    elapsed = time.perf_counter() - start
+    print(f"Incremental update: {rows} outcomes, {batches} batches, {checkpoints} checkpoints "
+          f"in {elapsed:.1f}s ({rows / elapsed if elapsed else 0:.0f} rows/s)")
+    return pipeline
 
-# Evaluate
-preds = pipeline.predict(X_test)
-print(classification_report(y_test, preds))
 
-# Save full pipeline (IMPORTANT)
-joblib.dump(pipeline, "C:/ai/MarketMind/backend/models/lead_model.pkl")
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the lead scoring model with a cross-validated search")
+    parser.add_argument("--data", default=DATA_PATH)
+    parser.add_argument("--output", default=MODEL_PATH)
+    parser.add_argument("--results", default="search_results.csv", help="Per-candidate metrics and timings")
+    parser.add_argument("--search", choices=["grid", "random"], default="grid")
+    parser.add_argument("--n-iter", type=int, default=20, help="Candidates for random search")
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--jobs", type=int, default=-1, help="Parallel fold workers (-1 = all cores)")
+    parser.add_argument("--budget", type=float, default=None, help="Wall-clock budget in seconds")
+    parser.add_argument("--incremental", metavar="OUTCOMES_CSV",
+                        help="Update the model in --output from new outcomes instead of retraining")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Outcomes per partial_fit step")
+    parser.add_argument("--checkpoint-every", type=int, default=10, help="Batches between model file writes")
+    parser.add_argument("--alpha", type=float, default=1e-4, help="SGD regularisation")
+    parser.add_argument("--eta0", type=float, default=1e-4, help="SGD step size")
+    args = parser.parse_args()
 
-print("Professional ML pipeline trained and saved.")
+    if args.incremental:
+        train_incremental(args.incremental, args.output, args.batch_size, args.checkpoint_every,
+                          args.alpha, args.eta0)
+    else:
+        train(args.data, args.output, args.results, args.search, args.n_iter,
+              args.folds, args.jobs, args.budget)
@@ -0,0 +1,199 @@
+import hashlib
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from services.preprocessing import NUMERIC_COLS
+
+# Entries kept in memory (0 disables the cache) and optional SQLite file
+# that keeps scores across restarts
+PREDICTION_CACHE_SIZE = int(os.getenv("PREDICTION_CACHE_SIZE", "100000"))
+PREDICTION_CACHE_PATH = os.getenv("PREDICTION_CACHE_PATH")
+# Rows the SQLite file may hold; least recently used ones are pruned past it
+PREDICTION_CACHE_DISK_SIZE = int(os.getenv("PREDICTION_CACHE_DISK_SIZE", "1000000"))
+
+
+def canonical_key(lead, columns, fingerprint):
+    """
+    Hash of the typed feature vector the model will see, prefixed with the
+    model fingerprint. "30", 30 and 30.0 give the same key; extra fields are
+    ignored. Returns None for leads that can't be typed - those are never
+    cached, so the scorer reports their errors.
+    """
+    if not isinstance(lead, dict):
+        return None
+
+    values = []
+    for col in columns:
+        value = lead.get(col)
+        missing = value is None or (isinstance(value, float) and math.isnan(value))
+        if col in NUMERIC_COLS:
+            try:
+                value = float(value)
+            except (TypeError, ValueError):
+                return None
+            if math.isnan(value):
+                return None
+        else:
+            value = None if missing else str(value)
+        values.append(value)
+
+    payload = json.dumps(values, separators=(",", ":")).encode()
+    return f"{fingerprint}:{hashlib.blake2b(payload, digest_size=16).hexdigest()}"
+
+
+class PredictionCache:
+    """
+    Thread-safe LRU of lead key -> probability, optionally backed by SQLite.
+
+    Memory misses fall through to the disk store when one is configured,
+    which is bounded to disk_size rows (least recently used pruned first).
+    Entries from other model versions are dropped by retain().
+    """
+
+    def __init__(self, maxsize=PREDICTION_CACHE_SIZE, path=None, disk_size=PREDICTION_CACHE_DISK_SIZE):
+        self.maxsize = maxsize
+        self.disk_size = disk_size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_hits = 0
+
+        self.db = None
+        if path:
+            self.db = sqlite3.connect(path, check_same_thread=False)
+            self.db.execute("CREATE TABLE IF NOT EXISTS predictions (key TEXT PRIMARY KEY, score REAL)")
+            # Files from before the size bound have no access times yet
+            columns = [row[1] for row in self.db.execute("PRAGMA table_info(predictions)")]
+            if "accessed" not in columns:
+                self.db.execute("ALTER TABLE predictions ADD COLUMN accessed REAL DEFAULT 0")
+            self.db.execute("CREATE INDEX IF NOT EXISTS predictions_accessed ON predictions (accessed)")
+            self.db.commit()
+            self._unpruned_writes = 0
+
+    def _remember(self, key, score):
+        self.entries[key] = score
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def get_many(self, keys):
+        """Return {key: score} for the keys that are cached."""
+        found = {}
+        with self.lock:
+            missing = []
+            for key in keys:
+                if key in self.entries:
+                    self.entries.move_to_end(key)
+                    found[key] = self.entries[key]
+                else:
+                    missing.append(key)
+
+            if self.db is not None and missing:
+                for start in range(0, len(missing), 500):
+                    batch = missing[start:start + 500]
+                    rows = self.db.execute(
+                        f"SELECT key, score FROM predictions WHERE key IN ({','.join('?' * len(batch))})",
+                        batch
+                    ).fetchall()
+                    for key, score in rows:
+                        found[key] = score
+                        self._remember(key, score)
+                        self.disk_hits += 1
+                    if rows:
+                        self.db.execute(
+                            f"UPDATE predictions SET accessed = ? WHERE key IN ({','.join('?' * len(rows))})",
+                            [time.time()] + [key for key, _ in rows]
+                        )
+                        self.db.commit()
+
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def set_many(self, items):
+        if not items:
+            return
+        with self.lock:
+            for key, score in items.items():
+                self._remember(key, score)
+            if self.db is not None:
+                now = time.time()
+                self.db.executemany("INSERT OR REPLACE INTO predictions (key, score, accessed) VALUES (?, ?, ?)",
+                                    [(key, score, now) for key, score in items.items()])
+                self._unpruned_writes += len(items)
+                # Prune once a tenth of the bound has been written, not on every batch
+                if self._unpruned_writes >= max(self.disk_size // 10, 1):
+                    self._prune()
+                self.db.commit()
+
+    def _prune(self):
+        """Delete the least recently used rows beyond disk_size. Caller holds the lock."""
+        self._unpruned_writes = 0
+        excess = self.db.execute("SELECT COUNT(*) FROM predictions").fetchone()[0] - self.disk_size
+        if excess > 0:
+            self.db.execute("DELETE FROM predictions WHERE key IN "
+                            "(SELECT key FROM predictions ORDER BY accessed LIMIT ?)", (excess,))
+            self.evictions += excess
+
+    def retain(self, fingerprint):
+        """Drop every entry that wasn't produced by the model `fingerprint`."""
+        prefix = f"{fingerprint}:"
+        with self.lock:
+            for key in [k for k in self.entries if not k.startswith(prefix)]:
+                del self.entries[key]
+            if self.db is not None:
+                self.db.execute("DELETE FROM predictions WHERE key NOT LIKE ?", (f"{prefix}%",))
+                self.db.commit()
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            if self.db is not None:
+                self.db.execute("DELETE FROM predictions")
+                self.db.commit()
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self.entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "disk_hits": self.disk_hits,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "persistent": self.db is not None,
+            }
+
+
+def score_with_cache(cache, score, leads, columns, fingerprint):
+    """
+    Wrap a bulk scorer (same contract as scoring_service.score_records) so
+    only the leads that miss the cache are scored.
+    """
+    keys = [canonical_key(lead, columns, fingerprint) for lead in leads]
+    cached = cache.get_many(list({key for key in keys if key is not None}))
+
+    misses = [i for i, key in enumerate(keys) if key not in cached]
+    predictions = [cached.get(key) for key in keys]
+    if not misses:
+        return predictions, []
+
+    scores, errors = score([leads[i] for i in misses])
+    fresh = {}
+    for k, i in enumerate(misses):
+        predictions[i] = scores[k]
+        if scores[k] is not None and keys[i] is not None:
+            fresh[keys[i]] = scores[k]
+    cache.set_many(fresh)
+
+    return predictions, [{"index": misses[e["index"]], "error": e["error"]} for e in errors]
@@ -1,59 +1,82 @@
-from flask import Blueprint, request, jsonify
-import joblib
-import pandas as pd
+from flask import Blueprint, request, jsonify, Response, stream_with_context
+from functools import partial
+from services.model_registry import registry
+from services.churn_service import CHURN_THRESHOLD, score_customers
+from services.scoring_service import (
+    DEFAULT_CHUNK_SIZE, prepare_frame, required_columns,
+    stream_csv_scores, stream_ndjson_scores
+)
+from services.scoring_pool import score_rows
+from services.ingest import lead_schema
+from services.prediction_cache import (
+    PREDICTION_CACHE_PATH, PREDICTION_CACHE_SIZE, PredictionCache,
+    canonical_key, score_with_cache
+)
 
 prediction_bp = Blueprint("prediction", __name__)
 
-# Load pipeline once when server starts
-try:
-    model = joblib.load("C:/ai/MarketMind/backend/models/lead_model.pkl")
-    print("Model loaded successfully")
-except Exception as e:
-    print(f"Error loading model: {e}")
-    print("Using fallback scoring method")
-    model = None
+# The lead model is loaded on first use and hot-swapped by the registry when
+# lead_model.pkl changes. Each request works on the LoadedModel it fetched,
+# so a swap never changes the model under an in-flight request.
+
+# Cache keys include the model checksum, so scores from a previous
+# lead_model.pkl are never served after a retrain
+prediction_cache = None
+if PREDICTION_CACHE_SIZE > 0:
+    prediction_cache = PredictionCache(PREDICTION_CACHE_SIZE, PREDICTION_CACHE_PATH)
+
+def on_new_lead_model(lead_model):
+    """Drop cached scores from the previous model version."""
+    if prediction_cache is not None:
+        prediction_cache.retain(lead_model.checksum)
+
+registry.subscribe("lead", on_new_lead_model)
+
+def score_leads_cached(lead_model, leads):
+    """score_rows, but only for the leads that aren't already cached."""
+    if prediction_cache is None:
+        return score_rows(lead_model, leads)
+    return score_with_cache(
+        prediction_cache, partial(score_rows, lead_model), leads,
+        required_columns(lead_model.model), lead_model.checksum
+    )
 
 @prediction_bp.route("/predict-lead", methods=["POST"])
 def predict_single_lead():
     try:
-        if model is None:
+        lead_model = registry.get("lead")
+        if lead_model is None:
             return jsonify({"error": "Model not loaded"})
+        model = lead_model.model
 
         data = request.json
 
-        # Convert JSON input to DataFrame
-        input_df = pd.DataFrame([data])
-
-        # Define numeric columns for type conversion
-        numeric_cols = ['age', 'balance', 'day_of_week', 'duration', 'campaign', 
-                       'pdays', 'previous', 'emp.var.rate', 'cons.price.idx', 
-                       'cons.conf.idx', 'euribor3m', 'nr.employed']
-        
-        # Convert numeric columns to float
-        for col in numeric_cols:
-            if col in input_df.columns:
-                input_df[col] = pd.to_numeric(input_df[col], errors='coerce')
-        
-        # Ensure all other columns are strings (object dtype)
-        for col in input_df.columns:
-            if col not in numeric_cols:
-                input_df[col] = input_df[col].astype(str)
-
         # Predict probability
         try:
-            if model is not None:
+            key = canonical_key(data, required_columns(model), lead_model.checksum) if prediction_cache else None
+            cached = prediction_cache.get_many([key]) if key else {}
+            if key in cached:
+                probability = cached[key]
+            elif lead_model.compiled is not None:
+                probability = lead_model.compiled.predict_one(data)
+            elif model is not None:
+                # Convert JSON input to a typed DataFrame
+                input_df, _ = prepare_frame([data])
                 probability = model.predict_proba(input_df)[0][1]
             else:
                 # Fallback scoring
                 age = float(data.get('age', 30))
                 balance = float(data.get('balance', 0))
                 probability = min(0.9, max(0.1, (age * 0.01) + (balance * 0.00001) + 0.3))
+            if key and key not in cached:
+                prediction_cache.set_many({key: float(probability)})
         except Exception as e:
             probability = 0.5
 
         return jsonify({
             "conversion_probability": float(probability),
-            "message": "High Potential Lead" if probability > 0.5 else "Low Potential Lead"
+            "message": "High Potential Lead" if probability > 0.5 else "Low Potential Lead",
+            "model_version": lead_model.version
         })
 
     except Exception as e:
@@ -62,7 +85,8 @@ def predict_single_lead():
 @prediction_bp.route("/predict", methods=["POST"])
 def predict_leads_bulk():
     try:
-        if model is None:
+        lead_model = registry.get("lead")
+        if lead_model is None:
             return jsonify({"error": "Model not loaded"})
 
         data = request.json
@@ -71,46 +95,108 @@ def predict_leads_bulk():
         if not leads:
             return jsonify({"error": "No leads provided"})
 
-        scores = []
-
-        for lead in leads:
-            # Convert single lead to DataFrame
-            input_df = pd.DataFrame([lead])
-
-            # Define numeric columns for type conversion
-            numeric_cols = ['age', 'balance', 'day_of_week', 'duration', 'campaign', 
-                           'pdays', 'previous', 'emp.var.rate', 'cons.price.idx', 
-                           'cons.conf.idx', 'euribor3m', 'nr.employed']
-            
-            # Convert numeric columns to float
-            for col in numeric_cols:
-                if col in input_df.columns:
-                    input_df[col] = pd.to_numeric(input_df[col], errors='coerce')
-            
-            # Ensure all other columns are strings (object dtype)
-            for col in input_df.columns:
-                if col not in numeric_cols:
-                    input_df[col] = input_df[col].astype(str)
-
-            # Predict probability
-            try:
-                if model is not None:
-                    probability = model.predict_proba(input_df)[0][1]
-                else:
-                    # Fallback scoring: simple heuristic based on age and balance
-                    age = float(lead.get('age', 30))
-                    balance = float(lead.get('balance', 0))
-                    # Simple scoring formula
-                    probability = min(0.9, max(0.1, (age * 0.01) + (balance * 0.00001) + 0.3))
-                scores.append(float(probability))
-            except Exception as e:
-                # If prediction fails, return a default score
-                scores.append(0.5)
+        # Cached leads are answered directly, the rest are scored in one
+        # vectorised pass. Rows that fail validation get None in
+        # "predictions" and an entry in "errors"
+        scores, errors = score_leads_cached(lead_model, leads)
 
         return jsonify({
             "predictions": scores,
-            "message": f"Scored {len(scores)} leads successfully"
+            "errors": errors,
+            "message": f"Scored {len(scores) - len(errors)} of {len(scores)} leads successfully",
+            "model_version": lead_model.version
         })
 
     except Exception as e:
         return jsonify({"error": str(e)})
+
+@prediction_bp.route("/predict-churn", methods=["POST"])
+def predict_single_churn():
+    try:
+        data = request.json
+        predictions, errors, version = score_customers([data])
+
+        if errors:
+            return jsonify({"error": errors[0]["error"], "model_version": version})
+
+        probability = predictions[0]
+        return jsonify({
+            "churn_probability": probability,
+            "message": "High Churn Risk" if probability >= CHURN_THRESHOLD else "Low Churn Risk",
+            "model_version": version
+        })
+
+    except Exception as e:
+        return jsonify({"error": str(e)})
+
+@prediction_bp.route("/predict-churn/bulk", methods=["POST"])
+def predict_churn_bulk():
+    try:
+        data = request.json
+        customers = data.get('customers', [])
+
+        if not customers:
+            return jsonify({"error": "No customers provided"})
+
+        # Same vectorised, chunked engine as /predict
+        predictions, errors, version = score_customers(customers)
+
+        return jsonify({
+            "predictions": predictions,
+            "errors": errors,
+            "message": f"Scored {len(predictions) - len(errors)} of {len(predictions)} customers successfully",
+            "model_version": version
+        })
+
+    except Exception as e:
+        return jsonify({"error": str(e)})
+
+@prediction_bp.route("/prediction-cache", methods=["GET"])
+def prediction_cache_stats():
+    if prediction_cache is None:
+        return jsonify({"enabled": False})
+    return jsonify({"enabled": True, **prediction_cache.stats()})
+
+@prediction_bp.route("/models", methods=["GET"])
+def model_status():
+    """Version, checksum and load state of every registered model."""
+    return jsonify(registry.status())
+
+@prediction_bp.route("/lead-schema", methods=["GET"])
+def get_lead_schema():
+    """Columns and category vocabularies uploads are validated against."""
+    lead_model = registry.get("lead")
+    schema = lead_schema(lead_model.model if lead_model else None)
+    return jsonify({**schema.to_dict(), "model_version": lead_model.version if lead_model else None})
+
+@prediction_bp.route("/predict-stream", methods=["POST"])
+def predict_leads_stream():
+    """
+    Stream-score a large lead file without buffering it.
+
+    The body is CSV (';'-separated by default, override with ?sep=) or
+    NDJSON when sent as application/x-ndjson. Rows are scored chunk_size at
+    a time and streamed back in the same format with lead_score and error
+    fields added. The model version is sent in the X-Model-Version header.
+    """
+    lead_model = registry.get("lead")
+    if lead_model is None:
+        return jsonify({"error": "Model not loaded"})
+    score = partial(score_rows, lead_model)
+
+    chunk_size = request.args.get("chunk_size", DEFAULT_CHUNK_SIZE, type=int)
+    if chunk_size <= 0:
+        return jsonify({"error": "chunk_size must be positive"}), 400
+
+    if request.mimetype == "application/x-ndjson":
+        body = stream_ndjson_scores(score, request.stream, chunk_size)
+        mimetype = "application/x-ndjson"
+    else:
+        sep = request.args.get("sep", ";")
+        body = stream_csv_scores(score, request.stream, sep, chunk_size)
+        mimetype = "text/csv"
+
+    return Response(
+        stream_with_context(body), mimetype=mimetype,
+        headers={"X-Model-Version": lead_model.version}
+    )
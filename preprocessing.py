@@ -1,28 +1,131 @@
+import sys
+import time
+import tracemalloc
+
+import numpy as np
 import pandas as pd
+from scipy import sparse
 from sklearn.compose import ColumnTransformer
 from sklearn.preprocessing import OneHotEncoder, StandardScaler
 
-def load_data(filepath):
-    df = pd.read_csv(filepath, sep=';')
+from services.data_cache import load_csv
+
+# Lead features that must be coerced to float; everything else is categorical
+NUMERIC_COLS = ['age', 'balance', 'day_of_week', 'duration', 'campaign',
+                'pdays', 'previous', 'emp.var.rate', 'cons.price.idx',
+                'cons.conf.idx', 'euribor3m', 'nr.employed']
 
-    # Convert target
-    df['y'] = df['y'].map({'yes': 1, 'no': 0})
+
+def coerce_types(df):
+    """Typed lead frame: 'y' as 0/1, numeric columns as numbers, the rest left as objects."""
+    if 'y' in df.columns:
+        # Safely convert target; outcome feeds may send 1/0 instead of yes/no
+        target = pd.to_numeric(df['y'].map({'yes': 1, 'no': 0, '1': 1, '0': 0, 1: 1, 0: 0}), errors='coerce')
+        # Rows without a usable label can't be trained on
+        df = df[target.notna()].copy()
+        df['y'] = target[target.notna()].astype('int64')
+
+    # Convert numeric columns to float, keeping as object for string columns
+    for col in NUMERIC_COLS:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce')
 
     return df
 
 
-def create_preprocessor(df):
+def load_data(filepath):
+    # Parsed once into the columnar cache; strings come back as objects to
+    # avoid StringDtype issues
+    return coerce_types(load_csv(filepath, sep=';', numeric=NUMERIC_COLS))
+
+
+def iter_data(filepath, chunk_size=10000):
+    """load_data for files too big to read at once: yields typed chunks."""
+    for chunk in pd.read_csv(filepath, sep=';', dtype=object, chunksize=chunk_size):
+        yield coerce_types(chunk)
 
-    X = df.drop("y", axis=1)
 
+def create_preprocessor(df, min_frequency=None, sparse_output=True):
+    """
+    Scaler + one-hot encoder shared by training and serving.
+
+    With sparse_output the design matrix stays CSR all the way into the
+    classifier: the encoder emits sparse columns and sparse_threshold=1.0
+    stops the ColumnTransformer from densifying the stacked result.
+    """
+    X = df.drop("y", axis=1, errors="ignore")
+
+    # Identify numeric and categorical columns more carefully
+    numeric_cols = X.select_dtypes(include=['int64', 'int32', 'float64', 'float32']).columns
     categorical_cols = X.select_dtypes(include=['object']).columns
-    numerical_cols = X.select_dtypes(exclude=['object']).columns
 
     preprocessor = ColumnTransformer(
         transformers=[
-            ("num", StandardScaler(), numerical_cols),
-            ("cat", OneHotEncoder(handle_unknown="ignore"), categorical_cols)
-        ]
+            ("num", StandardScaler(), numeric_cols),
+            ("cat", OneHotEncoder(handle_unknown="ignore", sparse_output=sparse_output,
+                                  min_frequency=min_frequency), categorical_cols)
+        ],
+        remainder='drop',
+        sparse_threshold=1.0 if sparse_output else 0.0
     )
 
     return preprocessor
+
+
+def matrix_nbytes(X):
+    if sparse.issparse(X):
+        X = X.tocsr()
+        return X.data.nbytes + X.indices.nbytes + X.indptr.nbytes
+    return X.nbytes
+
+
+def upscale(df, factor, random_state=42):
+    """Synthetic copy of df, factor times as long, with jittered numeric columns."""
+    rng = np.random.default_rng(random_state)
+    big = pd.concat([df] * factor, ignore_index=True)
+    for col in big.columns:
+        if col != 'y' and pd.api.types.is_numeric_dtype(big[col]):
+            big[col] = big[col] + rng.normal(0, big[col].std() * 0.05 or 1.0, len(big)).round()
+    return big
+
+
+def compare_dense_sparse(df):
+    """Design-matrix memory, peak allocation and fit times for dense vs sparse."""
+    from sklearn.linear_model import LogisticRegression
+
+    X = df.drop("y", axis=1)
+    y = df["y"]
+    rows = []
+    for sparse_output in (False, True):
+        tracemalloc.start()
+        start = time.perf_counter()
+        matrix = create_preprocessor(df, sparse_output=sparse_output).fit_transform(X)
+        transform_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        LogisticRegression(class_weight='balanced', max_iter=1000, random_state=42).fit(matrix, y)
+        fit_time = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        rows.append({
+            "layout": "sparse" if sparse_output else "dense",
+            "rows": len(df),
+            "matrix_mb": matrix_nbytes(matrix) / 1e6,
+            "peak_mb": peak / 1e6,
+            "transform_s": transform_time,
+            "fit_s": fit_time,
+        })
+    return pd.DataFrame(rows)
+
+
+if __name__ == "__main__":
+    # python -m services.preprocessing bank_marketing.csv [upscale_factor]
+    if len(sys.argv) not in (2, 3):
+        print("Usage: python -m services.preprocessing <bank_marketing.csv> [upscale_factor]")
+        sys.exit(1)
+
+    data = load_data(sys.argv[1])
+    factor = int(sys.argv[2]) if len(sys.argv) == 3 else 10
+    print(compare_dense_sparse(data).to_string(index=False))
+    print(compare_dense_sparse(upscale(data, factor)).to_string(index=False))
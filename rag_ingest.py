@@ -0,0 +1,187 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import time
+
+from services import rag_service
+from services.rag_service import RAG_INDEX_DIR, chunk_id
+
+# Words per chunk, and words repeated from the end of one chunk at the start of the next
+RAG_CHUNK_SIZE = int(os.getenv("RAG_CHUNK_SIZE", "200"))
+RAG_CHUNK_OVERLAP = int(os.getenv("RAG_CHUNK_OVERLAP", "40"))
+# Chunks sent to the encoder at once
+RAG_EMBED_BATCH = int(os.getenv("RAG_EMBED_BATCH", "64"))
+
+DOCUMENT_EXTENSIONS = (".txt", ".md", ".rst")
+# Bumped when chunk ids or metadata change; an index saved in another format is rebuilt
+MANIFEST_FORMAT = 3
+
+# A leading block of "key: value" lines between --- markers
+FRONT_MATTER = re.compile(r"\A---[ \t]*\r?\n(.*?)\r?\n---[ \t]*(?:\r?\n|\Z)", re.S)
+
+
+def _front_matter_value(raw):
+    raw = raw.strip().strip("\"'")
+    if raw.startswith("[") and raw.endswith("]"):
+        return [_front_matter_value(part) for part in raw[1:-1].split(",") if part.strip()]
+    for cast in (int, float):
+        try:
+            return cast(raw)
+        except ValueError:
+            pass
+    return raw
+
+
+def parse_front_matter(text):
+    """
+    (metadata, body) of a document. Metadata comes from front matter such as
+    "product: Widget", "region: EU", "date: 2024-03-01" or "tags: [a, b]"
+    and is what /rag/search filters match on; dates are kept as ISO text.
+    """
+    match = FRONT_MATTER.match(text)
+    if not match:
+        return {}, text
+    fields = {}
+    for line in match.group(1).splitlines():
+        key, sep, value = line.partition(":")
+        if sep and key.strip() and not key.startswith("#"):
+            fields[key.strip()] = _front_matter_value(value)
+    return fields, text[match.end():]
+
+
+def chunk_text(text, chunk_size=RAG_CHUNK_SIZE, overlap=RAG_CHUNK_OVERLAP):
+    """
+    Overlapping windows of chunk_size words. Whitespace is normalised, so a
+    passage hashes the same however it was wrapped.
+    """
+    words = text.split()
+    step = max(chunk_size - overlap, 1)
+    chunks = []
+    for start in range(0, len(words), step):
+        chunks.append(" ".join(words[start:start + chunk_size]))
+        if start + chunk_size >= len(words):
+            break
+    return chunks
+
+
+def collect_files(paths):
+    """Absolute paths of the documents under paths (files as given, directories walked)."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, names in os.walk(path):
+                dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+                files += [os.path.join(root, name) for name in sorted(names)
+                          if name.lower().endswith(DOCUMENT_EXTENSIONS)]
+        elif os.path.isfile(path):
+            files.append(path)
+    return [os.path.abspath(f) for f in files]
+
+
+def _within(source, roots):
+    return any(source == root or source.startswith(root + os.sep) for root in roots)
+
+
+def ingest(paths, directory=RAG_INDEX_DIR, chunk_size=RAG_CHUNK_SIZE, overlap=RAG_CHUNK_OVERLAP,
+           batch_size=RAG_EMBED_BATCH):
+    """
+    Bring the knowledge base in line with the files under paths.
+
+    New and changed files are chunked; only chunks that aren't already
+    indexed are embedded, batch_size at a time, with their file's front matter
+    and the files it appears in ("source", a list) as metadata. A passage
+    repeated in several files is one chunk listing all of them; when a file
+    is edited or deleted it drops out of its chunks' source lists, and
+    chunks no file refers to any more are removed from the index by id. The manifest saved with the index records every file's
+    size, mtime, hash and chunk ids, so an unchanged file is skipped on
+    stat alone and a restart redoes nothing. Returns stats.
+    """
+    start = time.perf_counter()
+    stats = {"files": 0, "unchanged": 0, "updated": 0, "removed_files": 0, "chunks": 0,
+             "duplicates": 0, "embedded": 0, "removed_chunks": 0}
+
+    manifest = rag_service.load_manifest(directory) if rag_service.load_index(directory) else None
+    if manifest is None or manifest.get("format") != MANIFEST_FORMAT or manifest.get("encoder") != rag_service.RAG_ENCODER:
+        rag_service.clear_store()
+        manifest = {"format": MANIFEST_FORMAT, "encoder": rag_service.RAG_ENCODER, "sources": {}}
+    sources = manifest["sources"]
+    chunking = [chunk_size, overlap]
+
+    indexed = {int(i) for i in rag_service.ids}
+    pending = {}
+    touched = False
+    files = collect_files(paths)
+    for path in files:
+        stats["files"] += 1
+        stat = os.stat(path)
+        entry = sources.get(path)
+        if entry and entry["chunking"] == chunking and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime:
+            stats["unchanged"] += 1
+            continue
+        with open(path, "rb") as f:
+            data = f.read()
+        checksum = hashlib.sha256(data).hexdigest()
+        if entry and entry["chunking"] == chunking and entry["sha256"] == checksum:
+            # Touched but not edited
+            entry["mtime"] = stat.st_mtime
+            stats["unchanged"] += 1
+            touched = True
+            continue
+
+        fields, body = parse_front_matter(data.decode("utf-8", errors="replace"))
+        # Front matter is part of a chunk's identity, so editing it replaces the chunks
+        fields_key = "\0" + json.dumps(fields, sort_keys=True) if fields else ""
+        chunk_ids = []
+        for text in chunk_text(body, chunk_size, overlap):
+            i = chunk_id(text + fields_key)
+            stats["chunks"] += 1
+            if i in indexed or i in pending:
+                stats["duplicates"] += 1
+            else:
+                pending[i] = (text, fields)
+            chunk_ids.append(i)
+        sources[path] = {"size": stat.st_size, "mtime": stat.st_mtime, "sha256": checksum,
+                         "chunking": chunking, "chunks": list(dict.fromkeys(chunk_ids))}
+        stats["updated"] += 1
+
+    # Files that were under paths before but are gone now
+    roots = [os.path.abspath(path) for path in paths]
+    found = set(files)
+    for source in [s for s in sources if _within(s, roots) and s not in found]:
+        del sources[source]
+        stats["removed_files"] += 1
+
+    # Every file a chunk appears in; a chunk is removed once this is empty
+    referenced = {}
+    for source in sorted(sources):
+        for i in sources[source]["chunks"]:
+            referenced.setdefault(i, []).append(source)
+    stats["removed_chunks"] = rag_service.remove_chunks([i for i in indexed if i not in referenced])
+    rag_service.update_metadata({i: {"source": referenced[i]} for i in indexed if i in referenced})
+
+    new_ids = [i for i in pending if i in referenced]
+    for batch_start in range(0, len(new_ids), batch_size):
+        batch_ids = new_ids[batch_start:batch_start + batch_size]
+        texts = [pending[i][0] for i in batch_ids]
+        stats["embedded"] += rag_service.add_chunks(batch_ids, texts, rag_service.encode(texts),
+                                                    [{**pending[i][1], "source": referenced[i]} for i in batch_ids])
+
+    if touched or stats["updated"] or stats["removed_files"]:
+        rag_service.save_index(directory, manifest)
+    stats["indexed_chunks"] = len(rag_service.documents)
+    stats["seconds"] = round(time.perf_counter() - start, 3)
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Add new and changed documents to the RAG index")
+    parser.add_argument("paths", nargs="+", help="Files or directories (.txt, .md, .rst)")
+    parser.add_argument("--index-dir", default=RAG_INDEX_DIR)
+    parser.add_argument("--chunk-size", type=int, default=RAG_CHUNK_SIZE, help="Words per chunk")
+    parser.add_argument("--overlap", type=int, default=RAG_CHUNK_OVERLAP, help="Words shared by neighbouring chunks")
+    parser.add_argument("--batch-size", type=int, default=RAG_EMBED_BATCH, help="Chunks per encoder call")
+    args = parser.parse_args()
+
+    print(ingest(args.paths, args.index_dir, args.chunk_size, args.overlap, args.batch_size))
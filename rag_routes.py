@@ -0,0 +1,37 @@
+from flask import Blueprint, request, jsonify
+from services.rag_service import RAG_SEARCH_MODE, RAG_TOP_K, search_documents, search_documents_batch
+
+rag_bp = Blueprint("rag", __name__)
+
+@rag_bp.route("/rag/search", methods=["POST"])
+def rag_search():
+    """
+    Body: {"query", "k" (default 3), "mode": "hybrid" | "vector" | "lexical",
+    "filters": {"<metadata field>": value, [values] or {"gte"/"gt"/"lte"/"lt":
+    bound}, ...}}. Returns the k best chunks whose metadata matches every
+    filter, with their score, bm25, distance and the path that matched them.
+    "queries": [...] instead of "query" searches them as one batch and
+    returns a list of results per query.
+    """
+    data = request.json or {}
+    query = data.get("query")
+    queries = data.get("queries")
+    if queries is not None and (not isinstance(queries, list) or not queries
+                                or not all(isinstance(q, str) and q for q in queries)):
+        return jsonify({"error": "queries must be a non-empty list of strings"}), 400
+    if not query and not queries:
+        return jsonify({"error": "No query provided"}), 400
+
+    try:
+        args = (data.get("k", RAG_TOP_K), data.get("filters"), data.get("mode", RAG_SEARCH_MODE))
+        if queries:
+            results = search_documents_batch(queries, *args)
+        else:
+            results = search_documents(query, *args)
+        return jsonify({"results": results})
+
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
@@ -1,49 +1,704 @@
+import hashlib
+import json
+import operator
+import os
+import queue
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
 import numpy as np
 
+from services import vector_index
+from services.lexical_index import LexicalIndex, TOKEN_PATTERN, is_identifier, tokenize
+from services.vector_index import RAG_INDEX_TYPE
+
 # Note: faiss and sentence_transformers are not installed by default
 # They are optional dependencies. To enable RAG functionality, install:
 # pip install faiss-cpu sentence_transformers
+# Without faiss the embeddings are searched with NumPy (see vector_index).
+
+# Sentence-transformers model, or "stub" for the offline hashing encoder
+RAG_ENCODER = os.getenv("RAG_ENCODER", "all-MiniLM-L6-v2")
+# Where the index, documents and embeddings are saved and reloaded from
+RAG_INDEX_DIR = os.getenv("RAG_INDEX_DIR", os.path.join(os.path.dirname(__file__), "..", "rag_index"))
+RAG_TOP_K = 3
+RAG_MAX_K = 100
+# "hybrid" (BM25 and vector rankings fused), "vector" or "lexical"
+RAG_SEARCH_MODE = os.getenv("RAG_SEARCH_MODE", "hybrid")
+SEARCH_MODES = ("hybrid", "vector", "lexical")
+# Reciprocal rank fusion constant, and candidates taken from each ranking per result
+RAG_RRF_K = 60
+RAG_FUSION_DEPTH = 4
+# Queries of at most this many terms that contain an identifier (SKU-1042,
+# INV2024-77) are answered from the BM25 index alone
+RAG_EXACT_MAX_TERMS = 4
+# Concurrent single searches are collected for up to this long (0 disables
+# batching) and run together, at most RAG_BATCH_MAX at a time
+RAG_BATCH_WAIT_MS = float(os.getenv("RAG_BATCH_WAIT_MS", "2"))
+RAG_BATCH_MAX = int(os.getenv("RAG_BATCH_MAX", "32"))
+
+RANGE_OPERATORS = {"gte": operator.ge, "gt": operator.gt, "lte": operator.le, "lt": operator.lt}
 
-# Stub implementation for RAG service
+# Row i of the store: documents[i], metadata[i], embeddings[i] and its
+# stable chunk id ids[i]
 documents = []
+metadata = []
 embeddings = None
+ids = None
 index = None
+index_kind = None
+_norms = None
+_rows = {}
+# Built on first use after every change: BM25 index of documents, and
+# metadata field -> value -> rows for filters
+_lexical = None
+_field_rows = None
+# Held while the store changes or is searched, since FAISS indexes can't be
+# searched while vectors are being added or removed
+_store_lock = threading.RLock()
+
+_encoder = None
+_encoder_lock = threading.Lock()
+
+
+class StubEncoder:
+    """
+    Offline stand-in for SentenceTransformer: hashed bag of words, L2
+    normalised. Texts sharing words land close together, which is enough to
+    exercise indexing and retrieval without downloading a model.
+    """
+
+    def __init__(self, dimension=384):
+        self.dimension = dimension
+
+    def encode(self, texts, batch_size=None, show_progress_bar=False):
+        vectors = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for token in re.findall(r"\w+", str(text).lower()):
+                digest = int.from_bytes(hashlib.blake2b(token.encode(), digest_size=8).digest(), "little")
+                vectors[row, digest % self.dimension] += 1.0 if digest >> 63 else -1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms > 0, norms, 1.0)
+
+
+def get_encoder():
+    """The process-wide encoder, loaded on first use. Raises ImportError without sentence_transformers."""
+    global _encoder
+    if _encoder is not None:
+        return _encoder
+    # Only one thread loads the model; the rest wait for it
+    with _encoder_lock:
+        if _encoder is None:
+            if RAG_ENCODER == "stub":
+                _encoder = StubEncoder()
+            else:
+                from sentence_transformers import SentenceTransformer
+                _encoder = SentenceTransformer(RAG_ENCODER)
+    return _encoder
+
+
+def encode(texts):
+    return np.ascontiguousarray(get_encoder().encode(list(texts)), dtype=np.float32)
+
+
+def chunk_id(text):
+    """Stable 63-bit id of a chunk, from a hash of its text."""
+    return int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little") & (2 ** 63 - 1)
+
+
+def _set_store(new_documents, new_metadata, new_embeddings, new_ids, new_index, new_kind, new_lexical=None):
+    global documents, metadata, embeddings, ids, index, index_kind, _norms, _rows, _lexical, _field_rows
+    with _store_lock:
+        documents, metadata, embeddings, ids = new_documents, new_metadata, new_embeddings, new_ids
+        index, index_kind = new_index, new_kind
+        _norms = (new_embeddings ** 2).sum(axis=1) if new_embeddings is not None else None
+        _rows = {int(i): row for row, i in enumerate(new_ids)}
+        _lexical, _field_rows = new_lexical, None
+
+
+def _lexical_index():
+    global _lexical
+    with _store_lock:
+        if _lexical is None:
+            _lexical = LexicalIndex.build(documents)
+        return _lexical
+
+
+def _field_index():
+    """field -> value -> rows; a list value is indexed under each of its elements."""
+    global _field_rows
+    with _store_lock:
+        if _field_rows is None:
+            fields = {}
+            for row, meta in enumerate(metadata):
+                for field, value in meta.items():
+                    for v in value if isinstance(value, list) else [value]:
+                        if isinstance(v, (str, int, float, bool)) or v is None:
+                            fields.setdefault(field, {}).setdefault(v, []).append(row)
+            _field_rows = {field: {v: np.array(rows, dtype=np.int64) for v, rows in values.items()}
+                           for field, values in fields.items()}
+        return _field_rows
+
+
+def _set_indexed_store(new_documents, new_metadata, new_embeddings, new_ids):
+    """Store with a freshly built index of RAG_INDEX_TYPE."""
+    new_index, new_kind = vector_index.build(RAG_INDEX_TYPE, new_embeddings, new_ids)
+    _set_store(new_documents, new_metadata, new_embeddings, new_ids, new_index, new_kind)
+
+
+def clear_store():
+    _set_store([], [], None, np.empty(0, dtype=np.int64), None, None)
+
 
-def build_index(text_chunks):
-    """Build FAISS index from text chunks. Requires: pip install faiss-cpu sentence_transformers"""
-    global embeddings, index, documents
+def add_chunks(chunk_ids, texts, vectors, metadatas=None):
+    """
+    Append chunks with precomputed vectors (and optional metadata dicts);
+    ids already in the store are skipped. The index is rebuilt instead of
+    appended to when the store grows past the size its type needs.
+    """
+    with _store_lock:
+        keep = [k for k, i in enumerate(chunk_ids) if int(i) not in _rows]
+        if not keep:
+            return 0
+        new_ids = np.asarray(chunk_ids, dtype=np.int64)[keep]
+        new_vectors = np.ascontiguousarray(np.asarray(vectors, dtype=np.float32)[keep])
+        new_documents = [texts[k] for k in keep]
+        new_metadata = [dict(metadatas[k]) if metadatas else {} for k in keep]
+        if embeddings is None or not len(embeddings):
+            _set_indexed_store(new_documents, new_metadata, new_vectors, new_ids)
+            return len(keep)
+
+        all_embeddings = np.vstack([embeddings, new_vectors])
+        all_ids = np.concatenate([ids, new_ids])
+        if vector_index.effective_kind(RAG_INDEX_TYPE, len(all_ids)) != index_kind:
+            _set_indexed_store(documents + new_documents, metadata + new_metadata, all_embeddings, all_ids)
+        else:
+            vector_index.add(index, new_vectors, new_ids)
+            _set_store(documents + new_documents, metadata + new_metadata, all_embeddings, all_ids,
+                       index, index_kind)
+        return len(keep)
+
+
+def remove_chunks(chunk_ids):
+    """Drop chunks by id; unknown ids are ignored."""
+    with _store_lock:
+        drop = np.asarray([_rows[int(i)] for i in chunk_ids if int(i) in _rows], dtype=np.int64)
+        if embeddings is None or not len(drop):
+            return 0
+        keep = np.ones(len(ids), dtype=bool)
+        keep[drop] = False
+        kept_documents = [doc for doc, kept in zip(documents, keep) if kept]
+        kept_metadata = [meta for meta, kept in zip(metadata, keep) if kept]
+        if vector_index.effective_kind(RAG_INDEX_TYPE, int(keep.sum())) == index_kind and \
+                vector_index.remove(index, index_kind, ids[drop], keep):
+            _set_store(kept_documents, kept_metadata, embeddings[keep], ids[keep], index, index_kind)
+        else:
+            # HNSW can't delete, or the store shrank below the ANN threshold
+            _set_indexed_store(kept_documents, kept_metadata, embeddings[keep], ids[keep])
+        return len(drop)
+
+
+def update_metadata(updates):
+    """
+    Merge fields into the metadata of stored chunks (id -> {field: value});
+    unknown ids are ignored. Returns how many chunks changed.
+    """
+    with _store_lock:
+        new_metadata = list(metadata)
+        changed = 0
+        for i, fields in updates.items():
+            row = _rows.get(int(i))
+            if row is not None and any(new_metadata[row].get(k) != v for k, v in fields.items()):
+                new_metadata[row] = {**new_metadata[row], **fields}
+                changed += 1
+        if changed:
+            _set_store(documents, new_metadata, embeddings, ids, index, index_kind, _lexical)
+        return changed
+
+
+def save_index(directory=RAG_INDEX_DIR, manifest=None):
+    """
+    Write documents, metadata, embeddings, ids and the index (plus the
+    ingestion manifest, if given) to directory. Files are written to a temporary
+    folder and swapped in, so a crash never leaves a half-saved index to be
+    loaded at startup.
+    """
+    if embeddings is None:
+        return
+    parent = os.path.dirname(os.path.abspath(directory))
+    os.makedirs(parent, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(prefix=".rag_index.", dir=parent)
     try:
-        from sentence_transformers import SentenceTransformer
-        import faiss
-        
-        model = SentenceTransformer('all-MiniLM-L6-v2')
-        documents = text_chunks
-        embeddings = model.encode(text_chunks)
-        dimension = embeddings.shape[1]
-        index = faiss.IndexFlatL2(dimension)
-        index.add(np.array(embeddings))
+        with open(os.path.join(tmp_dir, "documents.json"), "w", encoding="utf-8") as f:
+            json.dump(documents, f)
+        np.save(os.path.join(tmp_dir, "embeddings.npy"), embeddings)
+        np.save(os.path.join(tmp_dir, "ids.npy"), ids)
+        with open(os.path.join(tmp_dir, "metadata.json"), "w", encoding="utf-8") as f:
+            json.dump(metadata, f)
+        if manifest is not None:
+            with open(os.path.join(tmp_dir, "manifest.json"), "w", encoding="utf-8") as f:
+                json.dump(manifest, f)
+        vector_index.save(index, tmp_dir)
+        _lexical_index().save(tmp_dir)
+        meta = {"encoder": RAG_ENCODER, "dimension": int(embeddings.shape[1]), "documents": len(documents),
+                "index_type": index_kind}
+        with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+            json.dump(meta, f)
+
+        old_dir = None
+        if os.path.exists(directory):
+            old_dir = tempfile.mkdtemp(prefix=".rag_index.old.", dir=parent)
+            os.replace(directory, os.path.join(old_dir, "index"))
+        os.replace(tmp_dir, directory)
+        if old_dir:
+            shutil.rmtree(old_dir, ignore_errors=True)
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+
+def load_index(directory=RAG_INDEX_DIR):
+    """
+    Reload a saved index. Skipped (returns False) when it was built with a
+    different encoder, since its vectors wouldn't match new queries. The
+    index is rebuilt from the saved embeddings - never re-encoded - when it
+    is missing or RAG_INDEX_TYPE has changed; the BM25 index is rebuilt on
+    first search if it wasn't saved.
+    """
+    meta_path = os.path.join(directory, "meta.json")
+    if not os.path.exists(meta_path):
+        return False
+    with open(meta_path) as f:
+        meta = json.load(f)
+    if meta.get("encoder") != RAG_ENCODER:
+        print(f"RAG index in {directory} was built with {meta.get('encoder')}, not {RAG_ENCODER}; rebuild it")
+        return False
+
+    with open(os.path.join(directory, "documents.json"), encoding="utf-8") as f:
+        loaded_documents = json.load(f)
+    loaded_embeddings = np.load(os.path.join(directory, "embeddings.npy"))
+    ids_path = os.path.join(directory, "ids.npy")
+    if os.path.exists(ids_path):
+        loaded_ids = np.load(ids_path)
+    else:
+        loaded_ids = np.array([chunk_id(doc) for doc in loaded_documents], dtype=np.int64)
+    metadata_path = os.path.join(directory, "metadata.json")
+    if os.path.exists(metadata_path):
+        with open(metadata_path, encoding="utf-8") as f:
+            loaded_metadata = json.load(f)
+    else:
+        loaded_metadata = [{} for _ in loaded_documents]
+
+    kind = vector_index.effective_kind(RAG_INDEX_TYPE, len(loaded_ids))
+    loaded_index = None
+    if meta.get("index_type") == kind and os.path.exists(ids_path):
+        loaded_index = vector_index.load(directory, kind, len(loaded_ids))
+    if loaded_index is None:
+        loaded_index, kind = vector_index.build(RAG_INDEX_TYPE, loaded_embeddings, loaded_ids)
+    _set_store(loaded_documents, loaded_metadata, loaded_embeddings, loaded_ids, loaded_index, kind,
+               LexicalIndex.load(directory, len(loaded_documents)))
+    return True
+
+
+def load_manifest(directory=RAG_INDEX_DIR):
+    """Ingestion manifest saved with the index, or None."""
+    path = os.path.join(directory, "manifest.json")
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def build_index(text_chunks, directory=RAG_INDEX_DIR):
+    """
+    Replace the store with text_chunks (duplicates dropped), index them and
+    save everything to directory. To add documents to an existing store use
+    services.rag_ingest instead. Requires: pip install sentence_transformers
+    """
+    unique = list(dict.fromkeys(text_chunks))
+    try:
+        vectors = encode(unique)
     except ImportError as e:
         print(f"RAG dependencies not installed: {e}")
         print("Install with: pip install faiss-cpu sentence_transformers")
+        return
+    chunk_ids = np.array([chunk_id(text) for text in unique], dtype=np.int64)
+    _set_indexed_store(unique, [{} for _ in unique], vectors, chunk_ids)
+    if directory:
+        save_index(directory)
+
 
-def retrieve(query):
-    """Retrieve similar documents. Requires: pip install faiss-cpu sentence_transformers"""
-    if index is None or embeddings is None:
-        return []
-    
+def _in_range(value, bounds):
+    """value within {"gte", "gt", "lte", "lt"} bounds; values that don't compare (text vs number) never are."""
     try:
-        from sentence_transformers import SentenceTransformer
-        model = SentenceTransformer('all-MiniLM-L6-v2')
-        query_embedding = model.encode([query])
-        distances, indices = index.search(query_embedding, k=3)
-        return [documents[i] for i in indices[0] if i < len(documents)]
+        return all(RANGE_OPERATORS[op](value, bound) for op, bound in bounds.items())
+    except TypeError:
+        return False
+
+
+def _filter_mask(filters):
+    """
+    Boolean mask of the rows whose metadata matches every filter: a value,
+    a list of accepted values, or a range such as {"gte": "2024-01-01"}
+    (ISO dates compare correctly as text). Built from the field index, so
+    it costs a lookup per value rather than a pass over the store.
+    """
+    fields = _field_index()
+    mask = np.ones(len(documents), dtype=bool)
+    for field, wanted in filters.items():
+        values = fields.get(field, {})
+        selected = np.zeros(len(documents), dtype=bool)
+        if isinstance(wanted, dict):
+            for value, rows in values.items():
+                if _in_range(value, wanted):
+                    selected[rows] = True
+        else:
+            for value in wanted if isinstance(wanted, (list, tuple, set)) else [wanted]:
+                if (isinstance(value, (str, int, float, bool)) or value is None) and value in values:
+                    selected[values[value]] = True
+        mask &= selected
+    return mask
+
+
+def _check_request(k, filters, mode):
+    if isinstance(k, bool) or not isinstance(k, int) or not 1 <= k <= RAG_MAX_K:
+        raise ValueError(f"k must be an integer between 1 and {RAG_MAX_K}")
+    if mode not in SEARCH_MODES:
+        raise ValueError(f"mode must be one of {', '.join(SEARCH_MODES)}")
+    if filters is None:
+        return
+    if not isinstance(filters, dict):
+        raise ValueError("filters must be an object of metadata field -> value, list of values or range")
+    for field, wanted in filters.items():
+        if isinstance(wanted, dict) and (not wanted or set(wanted) - set(RANGE_OPERATORS)):
+            raise ValueError(f"range filter on {field} takes {', '.join(RANGE_OPERATORS)}")
+
+
+def _exact_terms(query):
+    """
+    Terms an exact-match query must contain - those of its quoted phrases,
+    or the identifiers of a short query - or None for a natural-language one.
+    """
+    quoted = re.findall(r'"([^"]+)"', query)
+    if quoted:
+        return [term for phrase in quoted for term in tokenize(phrase)] or None
+    words = TOKEN_PATTERN.findall(query.lower())
+    if len(words) <= RAG_EXACT_MAX_TERMS and any(is_identifier(word) for word in words):
+        return [word for word in words if is_identifier(word)]
+    return None
+
+
+def _distances(query_embedding, rows):
+    return ((embeddings[rows] - query_embedding) ** 2).sum(axis=1)
+
+
+def _hit(row, score, bm25, distance, match):
+    # Text and metadata are copied in while the store is locked, since rows
+    # move when chunks are removed
+    return {"row": int(row), "content": documents[row], "metadata": metadata[row], "score": float(score),
+            "bm25": float(bm25), "distance": None if distance is None else float(distance), "match": match}
+
+
+def _filters_key(filters):
+    return json.dumps(filters, sort_keys=True, default=str) if filters else None
+
+
+def _lexical_hits(lexical, query, k, mask, exact, mode):
+    rows, scores = lexical.search(tokenize(query), k, allowed=mask, required=exact)
+    if len(rows) or mode == "lexical":
+        match = "exact" if exact else "lexical"
+        return [_hit(row, score, score, None, match) for row, score in zip(rows, scores)]
+    return None
+
+
+def _ranked_hits(query, query_embedding, k, mode, mask, distances, rows, lexical):
+    """Hits for one query from its row of a batched vector search (fused with BM25 unless mode is vector)."""
+    terms = tokenize(query)
+    bm25 = lexical.scores(terms)
+    found = [(int(row), float(distance)) for row, distance in zip(rows, distances) if row >= 0]
+    if mode == "vector":
+        return [_hit(row, 1 / (1 + max(distance, 0.0)), bm25[row], distance, "vector")
+                for row, distance in found[:k]]
+
+    depth = k * RAG_FUSION_DEPTH
+    if mask is not None:
+        bm25[~mask] = 0
+    lexical_rows, _ = lexical.top(bm25, depth)
+    fused = {}
+    for ranking in ([row for row, _ in found[:depth]], lexical_rows):
+        for rank, row in enumerate(ranking):
+            fused[int(row)] = fused.get(int(row), 0.0) + 1 / (RAG_RRF_K + rank + 1)
+    best = sorted(fused, key=lambda row: -fused[row])[:k]
+    exact_distances = _distances(query_embedding, best)
+    return [_hit(row, fused[row], bm25[row], distance, "hybrid")
+            for row, distance in zip(best, exact_distances)]
+
+
+def _search_many(requests):
+    """
+    Hits for every (query, k, filters, mode) request. Exact-term and lexical
+    queries are answered from BM25; the rest are encoded in one forward pass
+    and searched with one index call per distinct filter.
+    """
+    results = [[] for _ in requests]
+    if not documents:
+        return results
+
+    pending = []
+    with _store_lock:
+        lexical = _lexical_index()
+        masks = {}
+        for i, (query, k, filters, mode) in enumerate(requests):
+            key = _filters_key(filters)
+            if key not in masks:
+                masks[key] = _filter_mask(filters) if filters else None
+            mask = masks[key]
+            if mask is not None and not mask.any():
+                continue
+            exact = _exact_terms(query) if mode != "vector" else None
+            hits = _lexical_hits(lexical, query, k, mask, exact, mode) if exact or mode == "lexical" else None
+            if hits is None:
+                pending.append(i)
+            else:
+                results[i] = hits
+    if not pending:
+        return results
+
+    try:
+        query_embeddings = encode([requests[i][0] for i in pending])
     except ImportError:
-        return []
+        lexical_requests = [(query, k, filters, "lexical") for query, k, filters, mode in
+                            (requests[i] for i in pending)]
+        for i, hits in zip(pending, _search_many(lexical_requests)):
+            results[i] = hits if requests[i][3] != "vector" else []
+        return results
+
+    with _store_lock:
+        # Again, in case the store changed while the queries were encoded
+        lexical = _lexical_index()
+        groups = {}
+        for position, i in enumerate(pending):
+            groups.setdefault(_filters_key(requests[i][2]), []).append(position)
+        for positions in groups.values():
+            filters = requests[pending[positions[0]]][2]
+            mask = _filter_mask(filters) if filters else None
+            if mask is not None and not mask.any():
+                continue
+            allowed_rows = np.flatnonzero(mask) if mask is not None else None
+            n = len(documents) if allowed_rows is None else len(allowed_rows)
+            depth = min(max(k if mode == "vector" else k * RAG_FUSION_DEPTH
+                            for _, k, _, mode in (requests[pending[p]] for p in positions)), n)
+            distances, rows = vector_index.search(index, query_embeddings[positions], depth, embeddings, _norms,
+                                                  _rows, allowed_rows, index_kind, ids)
+            for batch_row, position in enumerate(positions):
+                query, k, _, mode = requests[pending[position]]
+                results[pending[position]] = _ranked_hits(query, query_embeddings[position], k, mode, mask,
+                                                          distances[batch_row], rows[batch_row], lexical)
+    return results
+
+
+class QueryBatcher:
+    """
+    Micro-batches single searches from concurrent request threads. A worker
+    thread takes the first queued search and, when other callers are
+    waiting too, collects more for up to wait_ms, then runs them all through
+    one _search_many call: one encoder forward pass and one index search
+    instead of one of each per request. A lone caller isn't held back.
+    """
+
+    def __init__(self, wait_ms=RAG_BATCH_WAIT_MS, max_batch=RAG_BATCH_MAX):
+        self.wait = wait_ms / 1000
+        self.max_batch = max_batch
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.thread = None
+        self.active = 0
+        self.batches = 0
+        self.requests = 0
+
+    def submit(self, request):
+        """Hits for one (query, k, filters, mode) request, once its batch has run."""
+        future = Future()
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="rag-query-batcher", daemon=True)
+                self.thread.start()
+            self.active += 1
+        try:
+            self.queue.put((request, future))
+            return future.result()
+        finally:
+            with self.lock:
+                self.active -= 1
+
+    def _collect(self):
+        batch = [self.queue.get()]
+        deadline = time.monotonic() + self.wait
+        while len(batch) < self.max_batch:
+            with self.lock:
+                alone = self.active <= len(batch)
+            remaining = deadline - time.monotonic()
+            try:
+                if alone or remaining <= 0:
+                    batch.append(self.queue.get_nowait())
+                else:
+                    batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                if alone or remaining <= 0:
+                    break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            try:
+                results = _search_many([request for request, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+            else:
+                for (_, future), hits in zip(batch, results):
+                    future.set_result(hits)
+            with self.lock:
+                self.batches += 1
+                self.requests += len(batch)
+
+    def stats(self):
+        with self.lock:
+            return {"batches": self.batches, "requests": self.requests,
+                    "mean_batch": round(self.requests / self.batches, 2) if self.batches else 0.0}
+
 
-def search_documents(query):
+_batcher = QueryBatcher() if RAG_BATCH_WAIT_MS > 0 else None
+
+
+def search(query, k=RAG_TOP_K, filters=None, mode=RAG_SEARCH_MODE):
+    """
+    The k best chunks for query whose metadata matches filters, as dicts of
+    row, content, metadata, score, bm25 (the chunk's BM25 score for the query), distance
+    (squared L2 to the query embedding; None when the query wasn't encoded)
+    and match, the path that answered it:
+
+    - "exact": quoted phrases, or a short query with an identifier such as
+      a SKU code, is looked up in the BM25 index only - no encoding and no
+      vector scan - among chunks containing all of those terms; score is
+      BM25. Falls through to hybrid if no chunk contains them.
+    - "hybrid": the vector and BM25 rankings, RAG_FUSION_DEPTH * k deep, are
+      fused by reciprocal rank; score is the fused score.
+    - "vector": score is 1 / (1 + distance).
+    - "lexical": BM25 only; score is BM25.
+
+    Filters are resolved to a row mask first and both searches run only over
+    those rows, so a selective filter still returns k results. Without
+    sentence_transformers hybrid degrades to lexical. Concurrent calls are
+    batched together (see QueryBatcher).
+    """
+    _check_request(k, filters, mode)
+    if _batcher is not None:
+        return _batcher.submit((query, k, filters, mode))
+    return _search_many([(query, k, filters, mode)])[0]
+
+
+def search_batch(queries, k=RAG_TOP_K, filters=None, mode=RAG_SEARCH_MODE):
+    """search() for a list of queries sharing k, filters and mode, in one encoder pass and one index search."""
+    _check_request(k, filters, mode)
+    return _search_many([(query, k, filters, mode) for query in queries])
+
+
+def retrieve(query, k=RAG_TOP_K, filters=None, mode=RAG_SEARCH_MODE):
+    """Retrieve similar documents. Requires: pip install sentence_transformers"""
+    return [hit["content"] for hit in search(query, k, filters, mode)]
+
+
+def search_documents(query, k=RAG_TOP_K, filters=None, mode=RAG_SEARCH_MODE):
     """Search documents by query."""
     if not documents:
         return [{"content": "No documents indexed", "score": 0}]
-    
-    results = retrieve(query)
-    return [{"content": doc, "score": 1.0/(i+1)} for i, doc in enumerate(results)]
+
+    return _documents_for(search(query, k, filters, mode))
+
+
+def _documents_for(hits):
+    return [{"content": hit["content"], "score": hit["score"], "bm25": hit["bm25"], "distance": hit["distance"],
+             "match": hit["match"], "metadata": hit["metadata"]} for hit in hits]
+
+
+def search_documents_batch(queries, k=RAG_TOP_K, filters=None, mode=RAG_SEARCH_MODE):
+    """search_documents() for a list of queries, searched as one batch; a list of results per query."""
+    return [_documents_for(hits) for hits in search_batch(queries, k, filters, mode)]
+
+
+def benchmark(queries, directory=RAG_INDEX_DIR, threads=16):
+    """
+    Startup (index reload), first query (encoder load) and warm query
+    latency in ms, the per-query cost of search_batch, and throughput of
+    the queries sent one at a time from concurrent threads.
+    """
+    global _encoder
+    _encoder = None
+    start = time.perf_counter()
+    load_index(directory)
+    load_ms = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    retrieve(queries[0])
+    cold_ms = (time.perf_counter() - start) * 1000
+
+    times = []
+    for query in queries:
+        start = time.perf_counter()
+        retrieve(query)
+        times.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    search_batch(queries)
+    batch_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+    repeated = queries * max(1, 200 // len(queries))
+    batches_before = _batcher.stats() if _batcher else None
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        list(pool.map(search, repeated))
+    concurrent_qps = len(repeated) / (time.perf_counter() - start)
+    batches = _batcher.stats()["batches"] - batches_before["batches"] if _batcher else len(repeated)
+    return {
+        "documents": len(documents),
+        "index_type": index_kind,
+        "backend": "numpy" if isinstance(index, vector_index.NumpyIndex) else "faiss",
+        "index_load_ms": round(load_ms, 2),
+        "cold_query_ms": round(cold_ms, 2),
+        "warm_query_ms": round(float(np.median(times)), 2),
+        "batch_query_ms": round(batch_ms, 2),
+        "concurrent_qps": round(concurrent_qps, 1),
+        "concurrent_mean_batch": round(len(repeated) / max(batches, 1), 2),
+    }
+
+
+# Pick up the index saved by the last build, so a restart doesn't re-encode the corpus
+try:
+    load_index()
+except Exception as e:
+    print(f"Could not load RAG index from {RAG_INDEX_DIR}: {e}")
+
+
+if __name__ == "__main__":
+    # python -m services.rag_service build <file.txt>...  - one chunk per paragraph
+    # python -m services.rag_service bench "<query>"...
+    if len(sys.argv) < 3 or sys.argv[1] not in ("build", "bench"):
+        print("Usage: python -m services.rag_service build <file.txt>... | bench <query>...")
+        sys.exit(1)
+    if sys.argv[1] == "build":
+        chunks = []
+        for path in sys.argv[2:]:
+            with open(path, encoding="utf-8") as f:
+                chunks += [part.strip() for part in f.read().split("\n\n") if part.strip()]
+        start = time.perf_counter()
+        build_index(chunks)
+        print(f"Indexed {len(chunks)} chunks in {time.perf_counter() - start:.2f}s -> {RAG_INDEX_DIR}")
+    else:
+        print(benchmark(sys.argv[2:]))
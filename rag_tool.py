@@ -1,9 +1,13 @@
-from services.rag_service import search_documents
+from services.rag_service import RAG_SEARCH_MODE, RAG_TOP_K, search_documents, search_documents_batch
 
-def rag_search(query):
-    results = search_documents(query)
+def rag_search(query, k=RAG_TOP_K, filters=None, mode=RAG_SEARCH_MODE):
+    results = search_documents(query, k, filters, mode)
     return results
 
+def rag_search_batch(queries, k=RAG_TOP_K, filters=None, mode=RAG_SEARCH_MODE):
+    """Results per query for a list of questions, encoded and searched as one batch."""
+    return search_documents_batch(queries, k, filters, mode)
+
 # Langchain tools temporarily disabled due to missing dependencies
 # To enable, install: pip install langchain sentence_transformers faiss-cpu
 
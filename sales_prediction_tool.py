@@ -1,21 +1,16 @@
-import joblib
 import numpy as np
-import os
-
-# Load model safely - fallback if not found
-model = None
-model_path = os.path.join(os.path.dirname(__file__), "..", "models", "trained_model.pkl")
-if os.path.exists(model_path):
-    model = joblib.load(model_path)
+from services.model_registry import registry
 
 def predict_sales(features):
     """
     features: list of numerical values
     """
-    if model is None:
+    # Loaded on first use and hot-swapped when trained_model.pkl changes
+    sales_model = registry.get("sales")
+    if sales_model is None:
         # Return a mock prediction if model not available
         return np.mean(features) * 10.0
     
-    prediction = model.predict([features])
+    prediction = sales_model.model.predict([features])
     return float(prediction[0])
 
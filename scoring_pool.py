@@ -0,0 +1,220 @@
+import multiprocessing
+import os
+import pickle
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import joblib
+import numpy as np
+
+from services.compiled_model import CompiledModel
+from services.scoring_service import (
+    DEFAULT_CHUNK_SIZE, numeric_columns, prepare_frame, predict_frame,
+    required_columns, score_records
+)
+
+# Worker count and rows per task, overridable from the environment
+SCORING_WORKERS = int(os.getenv("SCORING_WORKERS", "0"))
+SCORING_CHUNK_SIZE = int(os.getenv("SCORING_CHUNK_SIZE", str(DEFAULT_CHUNK_SIZE)))
+
+# Per-process model state, filled in by _init_worker
+_model = None
+_compiled = None
+
+
+def _init_worker(model):
+    """Load the model (a path, or the fitted pipeline itself) once per worker process."""
+    global _model, _compiled
+    # Every worker keeps its own copy; the lead model is a few KB, so there
+    # is nothing worth sharing
+    _model = joblib.load(model) if isinstance(model, str) else model
+    try:
+        _compiled = CompiledModel.from_pipeline(_model)
+    except Exception:
+        _compiled = None
+
+
+def _score_columns(columns):
+    """Score one chunk of columns in a worker. Returns (probabilities, errors)."""
+    if _compiled is not None:
+        return _compiled.predict_columns(columns)
+
+    n = len(next(iter(columns.values()))) if columns else 0
+    records = [{col: values[i] for col, values in columns.items()} for i in range(n)]
+    df, errors = prepare_frame(records, list(columns), numeric_columns(_model))
+    scored, failed = predict_frame(_model, df)
+    errors.update(failed)
+    probabilities = np.full(n, np.nan)
+    for i, p in scored.items():
+        probabilities[i] = p
+    return probabilities, errors
+
+
+class ScoringExecutor:
+    """
+    Splits large batches across a pool of scoring processes.
+
+    Each worker loads the model once, from a path or from the fitted
+    pipeline handed to it; batches are cut into chunk_size rows and sent to
+    the workers as columns, which is much cheaper to pickle than a list of
+    dicts. Cutting the rows into columns and pickling them stays serial in
+    the calling process, which caps the speedup (see benchmark()).
+    """
+
+    def __init__(self, model, columns, workers=None, chunk_size=SCORING_CHUNK_SIZE):
+        self.columns = list(columns)
+        self.chunk_size = chunk_size
+        self.workers = workers or os.cpu_count() or 1
+        # spawn rather than fork: the Flask worker may already be running threads
+        self.pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(model,),
+        )
+
+    def score_records(self, records):
+        """Same contract as scoring_service.score_records."""
+        errors = {}
+        positions = []
+        rows = []
+        for i, record in enumerate(records):
+            if isinstance(record, dict):
+                positions.append(i)
+                rows.append(record)
+            else:
+                errors[i] = "Row must be a JSON object"
+
+        futures = []
+        for start in range(0, len(rows), self.chunk_size):
+            chunk = rows[start:start + self.chunk_size]
+            columns = {col: [row.get(col) for row in chunk] for col in self.columns}
+            futures.append((start, self.pool.submit(_score_columns, columns)))
+
+        predictions = [None] * len(records)
+        for start, future in futures:
+            probabilities, failed = future.result()
+            for k, p in enumerate(probabilities.tolist()):
+                i = positions[start + k]
+                if k in failed:
+                    errors[i] = failed[k]
+                else:
+                    predictions[i] = p
+
+        return predictions, [{"index": i, "error": errors[i]} for i in sorted(errors)]
+
+    def shutdown(self, wait=True):
+        self.pool.shutdown(wait=wait)
+
+
+# One pool per (model name, version) -> [executor, requests using it]. The
+# newest version loaded is the current one per name; an older version's pool
+# is shut down once the last request using it lets go.
+_executors = {}
+_current = {}
+_executors_lock = threading.Lock()
+
+
+def _retire_idle(name):
+    """Shut down pools of name's non-current versions that no request is using. Caller holds the lock."""
+    for key, (executor, refs) in list(_executors.items()):
+        if key[0] == name and key[1] != _current[name][1] and refs == 0:
+            executor.shutdown(wait=False)
+            del _executors[key]
+
+
+def acquire_executor(loaded):
+    """
+    Process pool whose workers hold this version of a registry model, or
+    None for a snapshot older than the current version that has no pool
+    left (the caller scores in-process). Pair with release_executor().
+    """
+    key = (loaded.name, loaded.version)
+    with _executors_lock:
+        current = _current.get(loaded.name)
+        if current is None or (current[1] != loaded.version and loaded.loaded_at > current[0]):
+            _current[loaded.name] = (loaded.loaded_at, loaded.version)
+            _retire_idle(loaded.name)
+        entry = _executors.get(key)
+        if entry is None:
+            if _current[loaded.name][1] != loaded.version:
+                return None
+            # Workers get this snapshot's own pipeline, not whatever the file holds now
+            executor = ScoringExecutor(loaded.model, required_columns(loaded.model), workers=SCORING_WORKERS)
+            entry = _executors[key] = [executor, 0]
+        entry[1] += 1
+        return entry[0]
+
+
+def release_executor(loaded):
+    with _executors_lock:
+        entry = _executors.get((loaded.name, loaded.version))
+        if entry is not None:
+            entry[1] -= 1
+            _retire_idle(loaded.name)
+
+
+def score_rows(loaded, rows):
+    """
+    Score row dicts with a registry LoadedModel, picking the fastest path:
+    the process pool for batches bigger than one chunk (when SCORING_WORKERS
+    is set), then the compiled NumPy scorer, then the sklearn pipeline.
+    """
+    if SCORING_WORKERS > 0 and len(rows) > SCORING_CHUNK_SIZE:
+        executor = acquire_executor(loaded)
+        if executor is not None:
+            try:
+                return executor.score_records(rows)
+            finally:
+                release_executor(loaded)
+    if loaded.compiled is not None:
+        return loaded.compiled.score_records(rows)
+    return score_records(loaded.model, rows)
+
+
+def benchmark(model_path, data_path, repeat=1, worker_counts=None, chunk_size=SCORING_CHUNK_SIZE):
+    """
+    Replay a ';'-separated lead CSV through the executor and print rows/second
+    per worker count, next to in-process scoring. Also prints the serial
+    work the parent does per batch (building and pickling the column
+    chunks): no number of workers gets the batch done faster than that.
+    """
+    import pandas as pd
+
+    df = pd.read_csv(data_path, sep=";", dtype=object).drop("y", axis=1, errors="ignore")
+    records = df.to_dict("records") * repeat
+    model = joblib.load(model_path)
+    columns = list(model.feature_names_in_)
+
+    compiled = CompiledModel.from_pipeline(model)
+    start = time.perf_counter()
+    compiled.score_records(records)
+    elapsed = time.perf_counter() - start
+    print(f"in-process: {len(records)} rows in {elapsed:.2f}s ({len(records) / elapsed:,.0f} rows/s)")
+
+    start = time.perf_counter()
+    for chunk_start in range(0, len(records), chunk_size):
+        chunk = records[chunk_start:chunk_start + chunk_size]
+        pickle.dumps({col: [row.get(col) for row in chunk] for col in columns})
+    serial = time.perf_counter() - start
+    print(f"parent serial work: {serial:.2f}s per batch (at most {elapsed / serial:.1f}x in-process, "
+          f"{os.cpu_count()} CPUs)")
+
+    for workers in worker_counts or sorted({1, 2, 4, os.cpu_count() or 1}):
+        executor = ScoringExecutor(model_path, columns, workers=workers, chunk_size=chunk_size)
+        executor.score_records(records[:workers * chunk_size])  # warm up the workers
+        start = time.perf_counter()
+        executor.score_records(records)
+        elapsed = time.perf_counter() - start
+        executor.shutdown()
+        print(f"{workers} workers: {len(records)} rows in {elapsed:.2f}s ({len(records) / elapsed:,.0f} rows/s)")
+
+
+if __name__ == "__main__":
+    # python -m services.scoring_pool lead_model.pkl bank_marketing.csv [repeat]
+    if len(sys.argv) not in (3, 4):
+        print("Usage: python -m services.scoring_pool <model.pkl> <leads.csv> [repeat]")
+        sys.exit(1)
+    benchmark(sys.argv[1], sys.argv[2], repeat=int(sys.argv[3]) if len(sys.argv) == 4 else 1)
@@ -0,0 +1,191 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+# Lead schema shared with training
+from services.preprocessing import NUMERIC_COLS
+
+# Rows per predict_proba call - large enough to amortise the
+# ColumnTransformer overhead, small enough to keep memory bounded
+DEFAULT_CHUNK_SIZE = 5000
+
+
+def required_columns(model):
+    """Columns the fitted pipeline was trained on (empty if unknown)."""
+    names = getattr(model, "feature_names_in_", None)
+    return list(names) if names is not None else []
+
+
+def numeric_columns(model):
+    """Numeric inputs of a fitted pipeline, falling back to the lead schema."""
+    try:
+        for name, _, columns in model.named_steps["preprocessor"].transformers_:
+            if name == "num":
+                return [str(c) for c in columns]
+    except (AttributeError, KeyError):
+        pass
+    return NUMERIC_COLS
+
+
+def prepare_frame(records, columns=None, numeric_cols=NUMERIC_COLS):
+    """
+    Coerce a list of lead (or customer) dicts into one typed DataFrame.
+
+    Returns (frame, errors): frame is indexed by each record's position in
+    `records` and only holds rows that passed validation, errors maps the
+    position of every rejected row to a message.
+    """
+    errors = {}
+    positions = []
+    rows = []
+    for i, record in enumerate(records):
+        if isinstance(record, dict):
+            positions.append(i)
+            rows.append(record)
+        else:
+            errors[i] = "Row must be a JSON object"
+
+    df = pd.DataFrame.from_records(rows, index=positions)
+    columns = list(columns) if columns is not None else []
+
+    # Make sure every column the model expects exists, even if no row sent it
+    for col in columns:
+        if col not in df.columns:
+            df[col] = np.nan
+
+    # Convert numeric columns to float, remembering which rows could not be parsed
+    for col in numeric_cols:
+        if col not in df.columns:
+            continue
+        raw = df[col]
+        df[col] = pd.to_numeric(raw, errors='coerce')
+        for i in df.index[df[col].isna() & raw.notna()]:
+            errors.setdefault(i, f"Invalid numeric value for '{col}': {raw[i]!r}")
+        if col in columns:
+            for i in df.index[raw.isna()]:
+                errors.setdefault(i, f"Missing value for '{col}'")
+
+    # Ensure all other columns are strings (object dtype), keeping missing
+    # values as NaN so they match the encoder's missing category
+    for col in df.columns:
+        if col not in numeric_cols:
+            df[col] = df[col].where(df[col].isna(), df[col].astype(str)).astype(object)
+
+    if columns:
+        df = df[columns]
+
+    return df.drop(index=list(errors), errors='ignore'), errors
+
+
+def predict_frame(model, df, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Score a prepared frame in large chunks.
+
+    Returns (probabilities, errors) keyed by the frame's index. If a whole
+    chunk fails, its rows are retried one by one so that only the offending
+    rows are reported as errors.
+    """
+    probabilities = {}
+    errors = {}
+    for start in range(0, len(df), chunk_size):
+        chunk = df.iloc[start:start + chunk_size]
+        try:
+            scores = model.predict_proba(chunk)[:, 1]
+            probabilities.update(zip(chunk.index, scores.tolist()))
+        except Exception:
+            for i in chunk.index:
+                try:
+                    probabilities[i] = float(model.predict_proba(chunk.loc[[i]])[0][1])
+                except Exception as e:
+                    errors[i] = str(e)
+    return probabilities, errors
+
+
+def score_records(model, records, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Score a list of lead dicts with one vectorised pass over the batch.
+
+    Returns (predictions, errors): predictions is aligned with `records`
+    and holds None for every row that could not be scored, errors is a list
+    of {"index", "error"} dicts for those rows.
+    """
+    df, errors = prepare_frame(records, required_columns(model), numeric_columns(model))
+    probabilities, failed = predict_frame(model, df, chunk_size)
+    errors.update(failed)
+
+    predictions = [probabilities.get(i) for i in range(len(records))]
+    return predictions, [{"index": i, "error": errors[i]} for i in sorted(errors)]
+
+
+def stream_csv_scores(score, stream, sep=';', chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Score a CSV stream chunk by chunk and yield the scored rows as CSV text.
+
+    `score` takes a list of lead dicts and returns (predictions, errors) like
+    score_records. Each output row is the input row plus lead_score and error
+    columns, so only one chunk is ever held in memory. If scoring fails part
+    way, the stream ends with a row whose only value is the error, prefixed
+    "Stream aborted:", so a truncated result can be told from a complete one.
+    """
+    columns = None
+    header = True
+    try:
+        reader = pd.read_csv(stream, sep=sep, dtype=object, chunksize=chunk_size)
+        for chunk in reader:
+            columns = list(chunk.columns) + ['lead_score', 'error']
+            predictions, errors = score(chunk.to_dict('records'))
+            chunk['lead_score'] = predictions
+            chunk['error'] = None
+            for e in errors:
+                chunk.iat[e['index'], chunk.columns.get_loc('error')] = e['error']
+            yield chunk.to_csv(sep=sep, index=False, header=header)
+            header = False
+    except pd.errors.EmptyDataError:
+        return
+    except Exception as e:
+        # The status line is already sent, so the error goes in a last row
+        print(f"Error while streaming CSV scores: {e}")
+        columns = columns or ['lead_score', 'error']
+        marker = pd.DataFrame([{'error': f"Stream aborted: {e}"}], columns=columns)
+        yield marker.to_csv(sep=sep, index=False, header=header)
+
+
+def stream_ndjson_scores(score, stream, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Score an NDJSON stream (one lead object per line) in chunks of
+    chunk_size and yield one scored object per line, with lead_score and
+    error fields added. If scoring fails part way, the last line is
+    {"error": "Stream aborted: ...", "aborted": true}.
+    """
+    def flush(leads):
+        predictions, errors = score(leads)
+        messages = {e['index']: e['error'] for e in errors}
+        lines = []
+        for i, lead in enumerate(leads):
+            row = dict(lead) if isinstance(lead, dict) else {"input": lead}
+            row['lead_score'] = predictions[i]
+            row['error'] = messages.get(i)
+            lines.append(json.dumps(row))
+        return "\n".join(lines) + "\n"
+
+    leads = []
+    try:
+        for line in stream:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                leads.append(json.loads(line))
+            except ValueError:
+                # Keep the row so the output stays aligned; it is reported as an error
+                leads.append(line.decode('utf-8', 'replace') if isinstance(line, bytes) else line)
+            if len(leads) >= chunk_size:
+                yield flush(leads)
+                leads = []
+        if leads:
+            yield flush(leads)
+    except Exception as e:
+        # The status line is already sent, so the error goes in a last line
+        print(f"Error while streaming NDJSON scores: {e}")
+        yield json.dumps({"error": f"Stream aborted: {e}", "aborted": True}) + "\n"
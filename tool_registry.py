@@ -1,6 +1,7 @@
 from tools.sales_prediction_tool import predict_sales
 from tools.rag_tool import rag_search
 from tools.image_tool import create_marketing_image
+from tools.churn_tool import churn_report
 
 TOOLS = {
     "sales_prediction": {
@@ -17,6 +18,13 @@ TOOLS = {
             "query": "User query string"
         }
     },
+    "churn_prediction": {
+        "function": churn_report,
+        "description": "Score customers for churn risk",
+        "parameters": {
+            "path": "Customer CSV file (optional)"
+        }
+    },
     "image_generation": {
         "function": create_marketing_image,
         "description": "Generate marketing image",
@@ -0,0 +1,363 @@
+import json
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+from services.lexical_index import tokenize
+
+# Lowest share of the probability the top tool must get for a query to be
+# routed locally; below it agent_decision asks the LLM (0 never asks, 1 always does).
+# Unset, it is calibrated from the leave-one-out accuracy when the router is fitted
+ROUTER_CONFIDENCE = float(os.getenv("ROUTER_CONFIDENCE")) if os.getenv("ROUTER_CONFIDENCE") else None
+# Accuracy the calibrated threshold must reach on the queries it routes locally
+ROUTER_TARGET_ACCURACY = float(os.getenv("ROUTER_TARGET_ACCURACY", "0.95"))
+# Extra labelled queries, one {"query": ..., "tool": ...} JSON object per line
+ROUTER_EXAMPLES_PATH = os.getenv("ROUTER_EXAMPLES_PATH", "")
+# Sharpness of the softmax that turns centroid similarities into confidences
+ROUTER_SCALE = 12.0
+
+TOOL_NAMES = ["sales_prediction", "churn_prediction", "rag_search", "image_generation", "general_chat"]
+
+# Labelled queries the router is fitted on
+EXAMPLES = {
+    "sales_prediction": [
+        "Predict sales for next month",
+        "What will our revenue be next quarter?",
+        "Forecast sales if we spend 1000 on ads",
+        "How many units will we sell next week?",
+        "Estimate sales for the new campaign budget",
+        "Give me a sales forecast",
+        "Project our revenue for Q3",
+        "What sales can we expect with a 10% discount?",
+        "Predict the sales volume for this store",
+        "How much will we sell if we raise the marketing spend?",
+        "Expected revenue for the holiday season",
+        "Run the sales prediction model",
+        "Sales outlook for next year",
+        "Will sales go up next month?",
+        "Estimate monthly sales from our ad budget",
+    ],
+    "churn_prediction": [
+        "Which customers are likely to churn?",
+        "Show me the churn risk report",
+        "Who is at risk of leaving us?",
+        "Predict customer churn",
+        "List customers likely to cancel their subscription",
+        "What is our churn rate?",
+        "Score customers for churn risk",
+        "Which accounts might not renew?",
+        "Identify customers we are about to lose",
+        "Give me the top churn risks",
+        "How many customers will cancel this month?",
+        "Run a churn analysis on our customer base",
+        "Customer retention risk",
+        "Find at-risk customers",
+        "Which clients are unhappy and may leave?",
+    ],
+    "rag_search": [
+        "What does our refund policy say?",
+        "Search the company documents for pricing terms",
+        "Find the onboarding guide",
+        "What is the warranty on SKU-1042?",
+        "Look up the discount policy in our docs",
+        "What do our sales playbooks say about objections?",
+        "Find information about product specifications",
+        "According to the handbook, how many vacation days do we get?",
+        "Where is the shipping policy documented?",
+        "Search the knowledge base for return procedures",
+        "What are the contract terms for enterprise customers?",
+        "Find the case study about the retail client",
+        "What does the documentation say about API limits?",
+        "Look up the price list for the premium plan",
+        "Which regions does our distribution agreement cover?",
+        "What do we know about the lead from Acme?",
+        "Find the notes on our latest leads",
+        "Which leads came from the trade show?",
+        "Look up the contact details for this prospect",
+        "What did the client say in the last meeting notes?",
+        "Which deals are in the pipeline for the Berlin account?",
+    ],
+    "image_generation": [
+        "Create a marketing image for our summer sale",
+        "Generate a banner for the product launch",
+        "Design a poster for the new campaign",
+        "Make an image of a happy customer using our app",
+        "Draw an illustration for the newsletter",
+        "Generate a social media graphic for Black Friday",
+        "Create a picture of our product on a beach",
+        "Make a promotional visual for the holiday offer",
+        "Design an ad creative with a red background",
+        "Generate a logo concept for the new brand",
+        "Create a thumbnail image for the webinar",
+        "I need a flyer image for the store opening",
+        "Render a photo of the new sneakers",
+        "Make an Instagram post image for the launch",
+        "Generate artwork for the email header",
+    ],
+    "general_chat": [
+        "Hello",
+        "Hi there, how are you?",
+        "Thanks for your help",
+        "What can you do?",
+        "Tell me a joke",
+        "Write a catchy tagline for our brand",
+        "Draft an email to a prospect",
+        "Give me tips for a cold call",
+        "How do I handle a price objection?",
+        "Summarise the benefits of CRM software",
+        "Write a LinkedIn post about teamwork",
+        "What is a good follow-up message after a demo?",
+        "Explain what a sales funnel is",
+        "Good morning",
+        "Suggest a subject line for our newsletter",
+        "Write a blog article about the product update",
+        "Draft a press release for the launch",
+        "Write the copy for our new landing page",
+        "Write an Instagram caption for the new collection",
+        "Compose a thank-you note to a new customer",
+        "Write a product description for the summer range",
+    ],
+}
+
+
+# Words too common in requests to say anything about the tool
+STOP_WORDS = set("a an the of for to in on our we us me my i you your is are be will what which who how "
+                 "do does can with and or this that it at by from about give show".split())
+
+
+def _stem(word):
+    """Crude suffix stripping so forecast/forecasts/forecasting share a feature."""
+    for suffix in ("ing", "ers", "ed", "es", "er", "s"):
+        if len(word) > len(suffix) + 2 and word.endswith(suffix):
+            return word[:-len(suffix)]
+    return word
+
+
+def _features(text):
+    """Stemmed words, compounds and their parts, plus adjacent word pairs; stop words dropped."""
+    terms = [_stem(term) for term in tokenize(text) if term not in STOP_WORDS]
+    words = [t for t in terms if t.isalnum()]
+    return terms + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+class ToolRouter:
+    """
+    Nearest-centroid intent classifier over TF-IDF features. Each tool's
+    centroid is the normalised mean of its examples' unit TF-IDF vectors;
+    a query scores the cosine similarity to each, and a softmax over those
+    gives the confidence. Scoring one query is a vocabulary lookup and a
+    small matrix-vector product, well under a millisecond.
+    """
+
+    def __init__(self, examples, confidence):
+        self.confidence = confidence
+        self.tools = [tool for tool in TOOL_NAMES if examples.get(tool)]
+        documents = [(_features(query), tool) for tool in self.tools for query in examples[tool]]
+
+        self.vocabulary = {}
+        df = {}
+        for features, _ in documents:
+            for feature in set(features):
+                self.vocabulary.setdefault(feature, len(self.vocabulary))
+                df[feature] = df.get(feature, 0) + 1
+        self.idf = np.zeros(len(self.vocabulary), dtype=np.float32)
+        for feature, column in self.vocabulary.items():
+            self.idf[column] = np.log((1 + len(documents)) / (1 + df[feature])) + 1
+
+        self.centroids = np.zeros((len(self.tools), len(self.vocabulary)), dtype=np.float32)
+        for features, tool in documents:
+            self.centroids[self.tools.index(tool)] += self.vector(features)
+        self.centroids /= np.maximum(np.linalg.norm(self.centroids, axis=1, keepdims=True), 1e-12)
+
+    def vector(self, features):
+        """Unit TF-IDF vector (sublinear tf) of features; zero if none are known."""
+        vector = np.zeros(len(self.vocabulary), dtype=np.float32)
+        for feature in features:
+            column = self.vocabulary.get(feature)
+            if column is not None:
+                vector[column] += 1
+        nonzero = vector > 0
+        vector[nonzero] = (1 + np.log(vector[nonzero])) * self.idf[nonzero]
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def predict(self, query):
+        """(tool, confidence); confidence is 0 when the query shares no terms with the examples."""
+        vector = self.vector(_features(query))
+        if not vector.any():
+            return self.tools[-1], 0.0
+        similarity = self.centroids @ vector
+        weights = np.exp(ROUTER_SCALE * (similarity - similarity.max()))
+        best = int(np.argmax(similarity))
+        return self.tools[best], float(weights[best] / weights.sum())
+
+    def route(self, query):
+        """The tool for query, or None when the router isn't confident enough."""
+        tool, confidence = self.predict(query)
+        return tool if confidence >= self.confidence else None
+
+
+def parse_tool(answer):
+    """Tool named in an LLM routing answer (general_chat if it names none)."""
+    answer = str(answer).strip().lower()
+    for tool in TOOL_NAMES:
+        if tool in answer:
+            return tool
+    return "general_chat"
+
+
+def load_examples(path=ROUTER_EXAMPLES_PATH):
+    """EXAMPLES plus the labelled queries in path (JSON lines), if any."""
+    examples = {tool: list(queries) for tool, queries in EXAMPLES.items()}
+    if path and os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                if line.strip():
+                    item = json.loads(line)
+                    if item["tool"] not in TOOL_NAMES:
+                        raise ValueError(f"Unknown tool in {path}: {item['tool']}")
+                    examples[item["tool"]].append(item["query"])
+    return examples
+
+
+def leave_one_out(examples):
+    """
+    (correct, confidence) for each labelled query routed by a router fitted
+    on all the others. Same arithmetic as ToolRouter, but the refits share
+    one term-count matrix, so it costs a few small matrix products per
+    query rather than rebuilding the vocabulary.
+    """
+    labelled = [(query, tool) for tool in TOOL_NAMES for query in examples.get(tool, [])]
+    features = [_features(query) for query, _ in labelled]
+    vocabulary = {}
+    for terms in features:
+        for term in terms:
+            vocabulary.setdefault(term, len(vocabulary))
+    counts = np.zeros((len(labelled), len(vocabulary)))
+    for row, terms in enumerate(features):
+        for term in terms:
+            counts[row, vocabulary[term]] += 1
+    present = counts > 0
+    tf = np.where(present, 1 + np.log(np.maximum(counts, 1)), 0)
+    labels = np.eye(len(TOOL_NAMES))[[TOOL_NAMES.index(tool) for _, tool in labelled]]
+
+    outcomes = []
+    for i in range(len(labelled)):
+        rest = np.arange(len(labelled)) != i
+        df = present[rest].sum(axis=0)
+        # Terms only the held-out query uses are outside the rest's vocabulary
+        idf = np.where(df > 0, np.log(len(labelled) / (1 + df)) + 1, 0)
+        weighted = tf * idf
+        unit = weighted / np.maximum(np.linalg.norm(weighted, axis=1, keepdims=True), 1e-12)
+        tools = np.flatnonzero(labels[rest].sum(axis=0))
+        centroids = labels[rest][:, tools].T @ unit[rest]
+        centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+        if not unit[i].any():
+            outcomes.append((TOOL_NAMES[tools[-1]] == labelled[i][1], 0.0))
+            continue
+        similarity = centroids @ unit[i]
+        weights = np.exp(ROUTER_SCALE * (similarity - similarity.max()))
+        best = int(np.argmax(similarity))
+        outcomes.append((TOOL_NAMES[tools[best]] == labelled[i][1], float(weights[best] / weights.sum())))
+    return outcomes
+
+
+def calibrate(outcomes, target=ROUTER_TARGET_ACCURACY):
+    """Lowest confidence at which the leave-one-out queries routed locally are at least target accurate."""
+    for threshold in sorted({score for _, score in outcomes if score > 0}):
+        routed = [correct for correct, score in outcomes if score >= threshold]
+        if sum(routed) >= target * len(routed):
+            return threshold
+    return 1.0
+
+
+def evaluate(examples, confidence, outcomes=None):
+    """
+    Leave-one-out routing accuracy over labelled examples. Reports overall
+    accuracy, the share routed locally at this confidence, accuracy on
+    those, and the mean time to route one query.
+    """
+    if outcomes is None:
+        outcomes = leave_one_out(examples)
+    labelled = [query for queries in examples.values() for query in queries]
+    correct = sum(c for c, _ in outcomes)
+    routed = [c for c, score in outcomes if score >= confidence]
+    confident, confident_correct = len(routed), sum(routed)
+
+    router = ToolRouter(examples, confidence)
+    start = time.perf_counter()
+    for query in labelled:
+        router.predict(query)
+    route_ms = (time.perf_counter() - start) * 1000 / max(len(labelled), 1)
+    return {
+        "examples": len(labelled),
+        "confidence": round(confidence, 4),
+        "accuracy": round(correct / max(len(labelled), 1), 3),
+        "local_share": round(confident / max(len(labelled), 1), 3),
+        "local_accuracy": round(confident_correct / confident, 3) if confident else None,
+        "route_ms": round(route_ms, 4),
+    }
+
+
+def build_router(examples):
+    """
+    Router over examples, its threshold ROUTER_CONFIDENCE or, when that is
+    unset, calibrated on their leave-one-out accuracy (which is logged).
+    """
+    outcomes = leave_one_out(examples)
+    confidence = ROUTER_CONFIDENCE if ROUTER_CONFIDENCE is not None else calibrate(outcomes)
+    print(f"Tool router fitted; leave-one-out {evaluate(examples, confidence, outcomes)}")
+    return ToolRouter(examples, confidence)
+
+
+# Fitted at import so no request pays for it
+_router = build_router(load_examples())
+_stats = {"local": 0, "fallback": 0, "fallback_agreed": 0}
+_stats_lock = threading.Lock()
+
+
+def get_router():
+    return _router
+
+
+def decide(query, fallback):
+    """
+    Tool for query: the local router's pick when it is confident, otherwise
+    parse_tool(fallback(query)) (the LLM). Fallbacks record whether the
+    router's own guess agreed, so its accuracy on the queries it hands off
+    shows up in stats().
+    """
+    router = get_router()
+    guess, confidence = router.predict(query)
+    if confidence >= router.confidence:
+        with _stats_lock:
+            _stats["local"] += 1
+        return guess
+
+    tool = parse_tool(fallback(query))
+    with _stats_lock:
+        _stats["fallback"] += 1
+        _stats["fallback_agreed"] += guess == tool
+    print(f"Tool router fallback: {tool!r} (router guessed {guess!r} at {confidence:.2f}) for {query[:80]!r}")
+    return tool
+
+
+def stats():
+    with _stats_lock:
+        stats = dict(_stats)
+    routed = stats["local"] + stats["fallback"]
+    stats["local_rate"] = stats["local"] / routed if routed else 0.0
+    stats["fallback_agreement"] = stats["fallback_agreed"] / stats["fallback"] if stats["fallback"] else None
+    stats["confidence"] = _router.confidence
+    return stats
+
+
+if __name__ == "__main__":
+    # python -m services.tool_router [labelled.jsonl] - leave-one-out accuracy at several confidences
+    examples = load_examples(sys.argv[1] if len(sys.argv) > 1 else ROUTER_EXAMPLES_PATH)
+    outcomes = leave_one_out(examples)
+    for threshold in (0.0, 0.4, 0.5, 0.6, 0.7, 0.8, calibrate(outcomes)):
+        print(evaluate(examples, threshold, outcomes))
@@ -0,0 +1,361 @@
+import argparse
+import os
+import time
+import tracemalloc
+
+import numpy as np
+from scipy import sparse
+
+# Note: faiss is optional (pip install faiss-cpu). Without it flat and IVF
+# search run in NumPy, and HNSW/PQ requests get the NumPy IVF index.
+
+# flat (exact scan), ivf (inverted file), hnsw (graph) or pq (IVF + product quantization)
+RAG_INDEX_TYPE = os.getenv("RAG_INDEX_TYPE", "flat")
+# Inverted lists for ivf/pq (0: 4 * sqrt(chunks)) and how many are scanned per query
+RAG_NLIST = int(os.getenv("RAG_NLIST", "0"))
+RAG_NPROBE = int(os.getenv("RAG_NPROBE", "16"))
+# HNSW neighbours per node and search breadth
+RAG_HNSW_M = int(os.getenv("RAG_HNSW_M", "32"))
+RAG_HNSW_EF_SEARCH = int(os.getenv("RAG_HNSW_EF_SEARCH", "64"))
+# PQ sub-quantizers (bytes per vector); must divide the dimension
+RAG_PQ_M = int(os.getenv("RAG_PQ_M", "16"))
+# Below this many chunks every type is a flat scan: too little to train on, and a scan is fast anyway
+RAG_ANN_MIN_SIZE = int(os.getenv("RAG_ANN_MIN_SIZE", "20000"))
+# Filtered searches that leave at most this many chunks scan them exactly instead of using the index
+RAG_PREFILTER_SCAN = int(os.getenv("RAG_PREFILTER_SCAN", "20000"))
+
+INDEX_TYPES = ("flat", "ivf", "hnsw", "pq")
+# Rows per block in NumPy scans, to bound the temporary distance matrix
+SCAN_BLOCK_SIZE = 65536
+
+
+def _faiss():
+    try:
+        import faiss
+        return faiss
+    except ImportError:
+        return None
+
+
+def effective_kind(kind, n):
+    """Index type actually built for n vectors of the requested kind."""
+    if kind not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type '{kind}'. Choose one of: {', '.join(INDEX_TYPES)}")
+    if n < RAG_ANN_MIN_SIZE:
+        return "flat"
+    if kind in ("hnsw", "pq") and _faiss() is None:
+        return "ivf"
+    return kind
+
+
+def _nlist(n):
+    return RAG_NLIST or max(1, min(int(4 * np.sqrt(n)), n // 39))
+
+
+def _sample(vectors, size=100000, seed=0):
+    if len(vectors) <= size:
+        return vectors
+    rows = np.random.default_rng(seed).choice(len(vectors), size, replace=False)
+    return vectors[np.sort(rows)]
+
+
+def _nearest_centroids(vectors, centroids, count=1, block_size=8192):
+    """Indices of the `count` closest centroids to every vector, closest first."""
+    centroid_norms = (centroids ** 2).sum(axis=1)
+    result = np.empty((len(vectors), count), dtype=np.int64)
+    for start in range(0, len(vectors), block_size):
+        block = vectors[start:start + block_size]
+        distances = centroid_norms[None, :] - 2 * block @ centroids.T
+        if count == 1:
+            result[start:start + len(block), 0] = distances.argmin(axis=1)
+        else:
+            nearest = np.argpartition(distances, count - 1, axis=1)[:, :count]
+            order = np.take_along_axis(distances, nearest, axis=1).argsort(axis=1)
+            result[start:start + len(block)] = np.take_along_axis(nearest, order, axis=1)
+    return result
+
+
+def kmeans(vectors, nlist, iterations=10, seed=0):
+    """Lloyd's k-means on (a sample of) the vectors; returns float32 centroids."""
+    data = _sample(vectors, max(nlist * 32, 20000), seed)
+    rng = np.random.default_rng(seed)
+    centroids = data[rng.choice(len(data), nlist, replace=False)].astype(np.float32)
+    for _ in range(iterations):
+        assign = _nearest_centroids(data, centroids)[:, 0]
+        members = sparse.csr_matrix((np.ones(len(data), dtype=np.float32), (assign, np.arange(len(data)))),
+                                    shape=(nlist, len(data)))
+        counts = np.asarray(members.sum(axis=1)).ravel()
+        filled = counts > 0
+        centroids[filled] = (members @ data)[filled] / counts[filled, None]
+    return centroids
+
+
+class NumpyIndex:
+    """
+    Flat or inverted-file search over the store's embedding matrix, for when
+    faiss isn't installed. It holds no vectors of its own: rows line up with
+    the store, and search() is handed the matrix.
+    """
+
+    def __init__(self, kind="flat", centroids=None, assign=None, nprobe=RAG_NPROBE):
+        self.kind = kind
+        self.centroids = centroids
+        self.assign = assign if assign is not None else np.empty(0, dtype=np.int32)
+        self.nprobe = nprobe
+        self._lists = None
+
+    @classmethod
+    def build(cls, kind, vectors):
+        if kind == "flat":
+            return cls("flat")
+        centroids = kmeans(vectors, _nlist(len(vectors)))
+        index = cls("ivf", centroids)
+        index.add(vectors)
+        return index
+
+    def add(self, vectors):
+        if self.kind == "ivf":
+            new = _nearest_centroids(vectors, self.centroids)[:, 0].astype(np.int32)
+            self.assign = np.concatenate([self.assign, new])
+            self._lists = None
+
+    def remove(self, keep):
+        if self.kind == "ivf":
+            self.assign = self.assign[keep]
+            self._lists = None
+
+    def _inverted_lists(self):
+        """Rows grouped by list (order) and where each list starts (offsets)."""
+        if self._lists is None:
+            order = np.argsort(self.assign, kind="stable")
+            offsets = np.concatenate([[0], np.cumsum(np.bincount(self.assign, minlength=len(self.centroids)))])
+            self._lists = order, offsets
+        return self._lists
+
+    def candidates(self, query):
+        """Rows in the nprobe lists closest to one query vector (ivf only)."""
+        order, offsets = self._inverted_lists()
+        probes = _nearest_centroids(query[None, :], self.centroids, min(self.nprobe, len(self.centroids)))[0]
+        return np.concatenate([order[offsets[p]:offsets[p + 1]] for p in probes])
+
+    def nbytes(self):
+        extra = self.centroids.nbytes + self.assign.nbytes if self.kind == "ivf" else 0
+        return extra
+
+
+def top_k(queries, vectors, norms, k, rows=None):
+    """
+    Exact k nearest rows (squared L2) of vectors for every query, scanning
+    in blocks. rows restricts the scan to those row numbers.
+    """
+    n = len(vectors) if rows is None else len(rows)
+    k = min(k, n)
+    best_d = np.full((len(queries), k), np.inf, dtype=np.float32)
+    best_r = np.full((len(queries), k), -1, dtype=np.int64)
+    if k == 0:
+        return best_d, best_r
+    for start in range(0, n, SCAN_BLOCK_SIZE):
+        block_rows = np.arange(start, min(start + SCAN_BLOCK_SIZE, n)) if rows is None else rows[start:start + SCAN_BLOCK_SIZE]
+        block = vectors[block_rows] if rows is not None else vectors[start:start + SCAN_BLOCK_SIZE]
+        distances = norms[block_rows][None, :] - 2 * queries @ block.T
+        merged_d = np.concatenate([best_d, distances], axis=1)
+        merged_r = np.concatenate([best_r, np.broadcast_to(block_rows, distances.shape)], axis=1)
+        nearest = np.argpartition(merged_d, k - 1, axis=1)[:, :k]
+        best_d = np.take_along_axis(merged_d, nearest, axis=1)
+        best_r = np.take_along_axis(merged_r, nearest, axis=1)
+    order = best_d.argsort(axis=1)
+    best_d = np.take_along_axis(best_d, order, axis=1) + (queries ** 2).sum(axis=1)[:, None]
+    return best_d, np.take_along_axis(best_r, order, axis=1)
+
+
+def build(kind, vectors, vector_ids):
+    """
+    (index, kind built) over the vectors: a faiss index addressed by id, or
+    a NumpyIndex when faiss isn't installed.
+    """
+    kind = effective_kind(kind, len(vectors))
+    faiss = _faiss()
+    if faiss is None:
+        return NumpyIndex.build(kind, vectors), kind
+
+    d = vectors.shape[1]
+    nlist = _nlist(len(vectors))
+    if kind == "pq":
+        m = RAG_PQ_M if d % RAG_PQ_M == 0 else max(m for m in range(1, RAG_PQ_M + 1) if d % m == 0)
+        spec = f"IVF{nlist},PQ{m}"
+    else:
+        spec = {"flat": "IDMap2,Flat", "ivf": f"IVF{nlist},Flat", "hnsw": f"IDMap2,HNSW{RAG_HNSW_M}"}[kind]
+    index = faiss.index_factory(d, spec)
+    if not index.is_trained:
+        index.train(_sample(vectors))
+    index.add_with_ids(vectors, vector_ids)
+    _set_search_params(index, kind)
+    return index, kind
+
+
+def _set_search_params(index, kind):
+    faiss = _faiss()
+    if kind in ("ivf", "pq"):
+        faiss.ParameterSpace().set_index_parameter(index, "nprobe", RAG_NPROBE)
+    elif kind == "hnsw":
+        faiss.ParameterSpace().set_index_parameter(index, "efSearch", RAG_HNSW_EF_SEARCH)
+
+
+def add(index, vectors, vector_ids):
+    if isinstance(index, NumpyIndex):
+        index.add(vectors)
+    else:
+        index.add_with_ids(vectors, vector_ids)
+
+
+def remove(index, kind, vector_ids, keep):
+    """Drop vectors by id (faiss) or row mask (NumPy). False if the index can't delete (HNSW) and needs a rebuild."""
+    if isinstance(index, NumpyIndex):
+        index.remove(keep)
+        return True
+    if kind == "hnsw":
+        return False
+    index.remove_ids(np.asarray(vector_ids, dtype=np.int64))
+    return True
+
+
+def search(index, queries, k, vectors, norms, rows_by_id, allowed_rows=None, kind=None, vector_ids=None):
+    """
+    (squared distances, store rows) of the k nearest chunks to every query;
+    -1 pads missing rows. allowed_rows limits the search to those rows
+    before it runs: a small set is scanned exactly, a larger one goes
+    through the index with every other row excluded (an ID selector in
+    faiss), so a filter never empties a result the index could have filled.
+    """
+    if allowed_rows is not None and (len(allowed_rows) <= RAG_PREFILTER_SCAN or
+                                     (isinstance(index, NumpyIndex) and index.kind == "flat")):
+        return top_k(queries, vectors, norms, k, rows=allowed_rows)
+
+    if isinstance(index, NumpyIndex):
+        if index.kind == "flat":
+            return top_k(queries, vectors, norms, k)
+        allowed = None
+        if allowed_rows is not None:
+            allowed = np.zeros(len(vectors), dtype=bool)
+            allowed[allowed_rows] = True
+        distances = np.full((len(queries), k), np.inf, dtype=np.float32)
+        rows = np.full((len(queries), k), -1, dtype=np.int64)
+        for q, query in enumerate(queries):
+            candidates = index.candidates(query)
+            if allowed is not None:
+                candidates = candidates[allowed[candidates]]
+            found_d, found_r = top_k(query[None, :], vectors, norms, k, rows=candidates)
+            distances[q, :found_d.shape[1]], rows[q, :found_r.shape[1]] = found_d[0], found_r[0]
+        return distances, rows
+
+    params = None
+    if allowed_rows is not None:
+        faiss = _faiss()
+        selector = faiss.IDSelectorBatch(np.ascontiguousarray(vector_ids[allowed_rows], dtype=np.int64))
+        if kind in ("ivf", "pq"):
+            params = faiss.SearchParametersIVF(sel=selector, nprobe=RAG_NPROBE)
+        elif kind == "hnsw":
+            params = faiss.SearchParametersHNSW(sel=selector, efSearch=RAG_HNSW_EF_SEARCH)
+        else:
+            params = faiss.SearchParameters(sel=selector)
+    distances, found = index.search(queries, k, params=params)
+    rows = np.array([[rows_by_id.get(int(i), -1) for i in row] for row in found], dtype=np.int64)
+    return distances, rows
+
+
+def nbytes(index, vectors):
+    """Memory of the index, including the raw vectors when it searches them (flat/ivf in NumPy)."""
+    if isinstance(index, NumpyIndex):
+        return vectors.nbytes + index.nbytes()
+    return int(_faiss().serialize_index(index).nbytes)
+
+
+def save(index, directory):
+    """Write the index beside the store's files."""
+    if isinstance(index, NumpyIndex):
+        if index.kind == "ivf":
+            np.savez(os.path.join(directory, "ivf.npz"), centroids=index.centroids, assign=index.assign)
+    elif index is not None:
+        _faiss().write_index(index, os.path.join(directory, "index.faiss"))
+
+
+def load(directory, kind, n):
+    """A saved index of the given kind for n vectors, or None if there is none to reuse."""
+    faiss = _faiss()
+    faiss_path = os.path.join(directory, "index.faiss")
+    if faiss is not None and os.path.exists(faiss_path):
+        index = faiss.read_index(faiss_path)
+        if index.ntotal == n:
+            _set_search_params(index, kind)
+            return index
+        return None
+    if faiss is None and kind == "flat":
+        return NumpyIndex("flat")
+    ivf_path = os.path.join(directory, "ivf.npz")
+    if faiss is None and kind == "ivf" and os.path.exists(ivf_path):
+        with np.load(ivf_path) as saved:
+            if len(saved["assign"]) == n:
+                return NumpyIndex("ivf", saved["centroids"], saved["assign"])
+    return None
+
+
+def synthetic_corpus(n, d=384, clusters=2000, spread=1.5, n_queries=200, seed=0):
+    """Unit vectors drawn around random cluster centres, plus held-out queries from the same mixture."""
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(size=(clusters, d)).astype(np.float32)
+    total = n + n_queries
+    vectors = centres[rng.integers(0, clusters, total)] + spread * rng.normal(size=(total, d)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return np.ascontiguousarray(vectors[:n]), np.ascontiguousarray(vectors[n:])
+
+
+def benchmark(n=100000, d=384, k=10, n_queries=200, kinds=INDEX_TYPES):
+    """recall@k against an exact scan, query latency percentiles, build time and memory per index type."""
+    vectors, queries = synthetic_corpus(n, d, n_queries=n_queries)
+    vector_ids = np.arange(n, dtype=np.int64)
+    norms = (vectors ** 2).sum(axis=1)
+    rows_by_id = dict(enumerate(range(n)))
+    truth = top_k(queries, vectors, norms, k)[1]
+
+    report = []
+    for kind in kinds:
+        tracemalloc.start()
+        start = time.perf_counter()
+        index, built = build(kind, vectors, vector_ids)
+        build_s = time.perf_counter() - start
+        build_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        latencies = []
+        hits = 0
+        for q in range(n_queries):
+            start = time.perf_counter()
+            _, rows = search(index, queries[q:q + 1], k, vectors, norms, rows_by_id)
+            latencies.append((time.perf_counter() - start) * 1000)
+            hits += len(np.intersect1d(rows[0], truth[q]))
+        report.append({
+            "requested": kind,
+            "built": built,
+            "backend": "numpy" if isinstance(index, NumpyIndex) else "faiss",
+            f"recall@{k}": round(hits / (n_queries * k), 4),
+            "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+            "p95_ms": round(float(np.percentile(latencies, 95)), 3),
+            "p99_ms": round(float(np.percentile(latencies, 99)), 3),
+            "build_s": round(build_s, 3),
+            "memory_mb": round(nbytes(index, vectors) / 1e6, 1),
+            "build_peak_mb": round(build_peak / 1e6, 1),
+        })
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare RAG index types on a synthetic corpus")
+    parser.add_argument("--n", type=int, default=100000, help="Vectors in the corpus")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--types", default=",".join(INDEX_TYPES))
+    args = parser.parse_args()
+
+    for row in benchmark(args.n, args.dim, args.k, args.queries, args.types.split(",")):
+        print(row)